@@ -0,0 +1,100 @@
+"""
+解码+校验微基准：每条消息从字节到可用对象的耗时
+legacy: body.decode + json.loads 成字典，再按旧的 validate_notice 校验
+legacy+reads: 另计下游各环节重复读取字典的开销(规范群名、解析 sendAt/expireAt)
+stdlib / orjson: model.decode_notice 一次完成解码、校验和构建 Notice，下游直接读属性
+未装 orjson 时一次解码并不更快(stdlib 10.84µs 对 legacy 10.54µs，在误差范围内)，提速来自 orjson；
+一次解码的作用是让下游不再各自重复读取和解析字典
+
+用法: python bench/bench_decode.py [--messages N] [--groups N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model  # noqa: E402
+from model import decode_notice, normalize_groups, parse_time  # noqa: E402
+
+
+def legacy_validate(data):
+    """改造前 retry.validate_notice 的逻辑"""
+    if not isinstance(data, dict):
+        return "消息体不是JSON对象"
+    groups = data.get('groupName')
+    if isinstance(groups, str):
+        groups = [groups]
+    if not isinstance(groups, list) or not groups:
+        return "groupName 缺失或为空"
+    if not all(isinstance(group, str) and group for group in groups):
+        return "groupName 含非字符串或空群名"
+    message = data.get('message')
+    if not isinstance(message, str) or not message:
+        return "message 缺失或不是字符串"
+    for field in ('sendAt', 'expireAt'):
+        try:
+            parse_time(data.get(field))
+        except (TypeError, ValueError, OverflowError):
+            return f"{field} 时间格式无效"
+    return None
+
+
+def legacy_decode(body: bytes):
+    data = json.loads(body.decode('utf-8'))
+    if legacy_validate(data):
+        raise ValueError
+    return data
+
+
+def legacy_pipeline(body: bytes):
+    data = legacy_decode(body)
+    groups = normalize_groups(data.get('groupName'))  # 调度器
+    parse_time(data.get('expireAt'))  # 执行器过期判断
+    parse_time(data.get('sendAt'))  # 定时堆
+    return groups, data.get('message')
+
+
+def notice_pipeline(body: bytes, properties):
+    notice = decode_notice(body, properties)
+    return notice.groups, notice.text, notice.expire_at, notice.send_at
+
+
+def measure(name: str, decode, bodies):
+    start = time.perf_counter()
+    for body in bodies:
+        decode(body)
+    elapsed = time.perf_counter() - start
+    return {'mode': name, 'messages': len(bodies), 'us_per_message': round(elapsed / len(bodies) * 1e6, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='解码+校验微基准')
+    parser.add_argument('--messages', type=int, default=50000)
+    parser.add_argument('--groups', type=int, default=5)
+    args = parser.parse_args()
+
+    bodies = [json.dumps({
+        'groupName': [f'拍卖群{g:02d}' for g in range(args.groups)],
+        'message': f'【拍卖通知{i}】标的已更新，请及时查看' * 3,
+        'expireAt': '2099-01-01 00:00:00'
+    }, ensure_ascii=False).encode('utf-8') for i in range(args.messages)]
+
+    class Properties:
+        message_id = 'bench'
+        priority = None
+
+    results = [measure('legacy', legacy_decode, bodies),
+               measure('legacy+reads', legacy_pipeline, bodies)]
+    model._loads = json.loads
+    results.append(measure('stdlib', lambda body: notice_pipeline(body, Properties), bodies))
+    if model.orjson is not None:
+        model._loads = model.orjson.loads
+        results.append(measure('orjson', lambda body: notice_pipeline(body, Properties), bodies))
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+"""
+端到端压测：真实的 RabbitMQManager/SSLRabbitMQConsumer 流水线 + 进程内代理替身 + 模拟界面
+生成拍卖通知负载(扇出分布、突发形态、重复投递、畸形消息、必然失败的群)，按计划注入断线，
+报告吞吐、端到端延迟分位数、重新投递和重试/死信计数，每次运行输出一个可对比的 JSON
+
+用法: python bench/bench_load.py [--messages 500] [--rate 100] [--shape steady|burst|ramp]
+                                 [--drops 2] [--downtime 0.5] [--ui-scale 0.05] [--batch]
+                                 [--concurrency 1] [--prefetch 100] [--seed 0] [--timeout 300]
+                                 [--output 报告.json]
+未在超时内结束时报告 unfinished 条数并以非零状态退出
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fakebroker  # noqa: E402
+
+broker = fakebroker.FakeBroker()
+fakebroker.install(broker)
+
+import main  # noqa: E402
+import processer  # noqa: E402
+from driver import DEFAULT_LATENCY, HeadlessDriver  # noqa: E402
+from journal import DeliveryJournal  # noqa: E402
+from metrics import registry  # noqa: E402
+from waiter import ReadinessWaiter  # noqa: E402
+
+QUEUE = 'bench.auction.notice'
+COMPONENT = {
+    'msg_area': (800, 900),
+    'search_area': (150, 60),
+    'choose_area': (150, 130),
+    'header_area': (700, 60)
+}
+POISON_GROUP = '已解散的群'  # 搜索该群时界面操作失败，消息经重试后进入死信队列
+
+
+class FlakyDriver(HeadlessDriver):
+    """模拟界面：按比例缩放的真实耗时，搜索到失效群时抛出异常"""
+
+    def paste(self, text: str):
+        super().paste(text)
+        if text == POISON_GROUP:
+            raise RuntimeError(f"未找到群: {text}")
+
+
+def percentile(values, q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def build_workload(args):
+    """生成 (发布时刻偏移, 消息体, 属性参数, 类型) 列表"""
+    rng = random.Random(args.seed)
+    names = [f'拍卖群{i:02d}' for i in range(args.groups)]
+    hot = names[:8]
+    items = []
+    for i in range(args.messages):
+        if args.shape == 'burst':
+            # 每秒开头集中发出 rate 条
+            at = (i // args.rate) + (i % args.rate) * 0.001
+        elif args.shape == 'ramp':
+            # 速率从 rate/4 线性升到 2*rate
+            progress = i / max(1, args.messages - 1)
+            at = (items[-1][0] if items else 0) + 1 / (args.rate * (0.25 + 1.75 * progress))
+        else:
+            at = i / args.rate
+        roll = rng.random()
+        message_id = f'load_{args.seed}_{i}'
+        if roll < args.invalid:
+            items.append((at, b'{"groupName": ["\xe6\x8b\x8d', {'message_id': message_id}, 'invalid'))
+            continue
+        pool = hot if rng.random() < 0.7 else names
+        groups = rng.sample(pool, min(len(pool), rng.choice([1, 1, 2, 3, 5, 8])))
+        kind = 'normal'
+        if roll < args.invalid + args.poison:
+            groups = [POISON_GROUP]
+            kind = 'poison'
+        body = json.dumps({'groupName': groups, 'message': f'【拍卖通知{i}】标的已更新，请及时查看'},
+                          ensure_ascii=False).encode('utf-8')
+        priority = 9 if rng.random() < args.urgent else 0
+        items.append((at, body, {'message_id': message_id, 'priority': priority}, kind))
+        if rng.random() < args.duplicates:
+            # 同一消息稍后被生产者重复发布
+            items.append((at + rng.uniform(0.05, 1.0), body, {'message_id': message_id, 'priority': priority},
+                          'duplicate'))
+    items.sort(key=lambda item: item[0])
+    return items
+
+
+class Tracker:
+    """按每份发布副本跟踪结局：完成、重复确认、重试、死信"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.published_at = {}
+        self.kinds = {}
+        self.rerouted = {}
+        self.latencies = {'normal': [], 'duplicate': []}
+        self.outcomes = {'completed': 0, 'duplicate_acked': 0, 'dead_lettered': 0, 'rejected': 0}
+        self.retried = 0
+        self.done = threading.Event()
+        self.expected = 0
+
+    def publish(self, seq: int, kind: str):
+        with self.lock:
+            self.published_at[seq] = time.perf_counter()
+            self.kinds[seq] = kind
+
+    def _terminal(self):
+        if sum(self.outcomes.values()) >= self.expected:
+            self.done.set()
+
+    def on_publish(self, routing_key: str, message):
+        seq = (message.properties.headers or {}).get('x-load-seq')
+        if seq is not None:
+            with self.lock:
+                self.rerouted[seq] = routing_key
+
+    def on_ack(self, message):
+        seq = (message.properties.headers or {}).get('x-load-seq')
+        if seq is None:
+            return
+        now = time.perf_counter()
+        with self.lock:
+            target = self.rerouted.pop(seq, None)
+            if target is not None and target.startswith('retry.'):
+                self.retried += 1
+                return
+            if target is not None:
+                self.outcomes['dead_lettered'] += 1
+            elif self.kinds[seq] == 'duplicate':
+                self.outcomes['duplicate_acked'] += 1
+                self.latencies['duplicate'].append(now - self.published_at[seq])
+            else:
+                self.outcomes['completed'] += 1
+                self.latencies['normal'].append(now - self.published_at[seq])
+            self._terminal()
+
+    def on_reject(self, message):
+        with self.lock:
+            self.outcomes['rejected'] += 1
+            self._terminal()
+
+
+def scaled_waiter(driver, scale: float) -> ReadinessWaiter:
+    """就绪等待的轮询间隔和各时限按界面耗时同比例缩放，否则真实的轮询等待会成为瓶颈"""
+    default = processer.waiter
+    return ReadinessWaiter(
+        driver.screenshot, clock=driver.now, sleep=driver.sleep,
+        poll_interval=default.poll_interval * scale, stable_frames=default.stable_frames,
+        default_timeout=default.default_timeout * scale, min_timeout=default.min_timeout * scale,
+        max_timeout=default.max_timeout * scale, settle=default.settle * scale,
+        fallback_delay=default.fallback_delay * scale
+    )
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='wecom-load-')
+    latency = {action: cost * args.ui_scale for action, cost in DEFAULT_LATENCY.items()}
+    driver = FlakyDriver(latency=latency, jitter=0.2, seed=args.seed, realtime=True)
+    processer.set_driver(driver)
+    processer.waiter = scaled_waiter(driver, args.ui_scale)
+    main.components = COMPONENT
+    main.journal = DeliveryJournal(os.path.join(workdir, 'journal.jsonl'))
+
+    tracker = Tracker()
+    broker.on_ack = tracker.on_ack
+    broker.on_reject = tracker.on_reject
+    broker.on_publish = tracker.on_publish
+
+    config = {
+        'host': 'fake-broker',
+        'listener': {'concurrency': args.concurrency, 'max_concurrency': max(args.concurrency, args.max_concurrency),
+                     'prefetch_count': args.prefetch, 'scale_interval': 1},
+        'batch': {'enabled': args.batch, 'window': 0.2, 'max_messages': 50},
+        'dedup': {'path': os.path.join(workdir, 'dedup.txt')},
+        'timers': {'path': os.path.join(workdir, 'scheduled.jsonl')},
+        'retry': {'base_delay': 0.1, 'multiplier': 2, 'levels': 3, 'max_attempts': 3},
+        'rate_limit': {'enabled': False},
+        'metrics_http': {'enabled': False},
+        'reconnect': {'initial_delay': 0.05, 'max_delay': 1, 'stable_after': 1},
+    }
+    manager = main.RabbitMQManager(config)
+
+    workload = build_workload(args)
+    tracker.expected = len(workload)
+    drop_times = [(i + 1) * workload[-1][0] / (args.drops + 1) for i in range(args.drops)]
+
+    manager.start(QUEUE, main.process_message, main.send_group, main.journal)
+    deadline = time.monotonic() + 10
+    while QUEUE not in broker.queues and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    start = time.perf_counter()
+    for seq, (at, body, props, kind) in enumerate(workload):
+        while drop_times and time.perf_counter() - start >= drop_times[0]:
+            drop_times.pop(0)
+            broker.drop(args.downtime)
+        delay = at - (time.perf_counter() - start)
+        if delay > 0:
+            time.sleep(delay)
+        tracker.publish(seq, kind)
+        broker.publish(QUEUE, body, fakebroker.BasicProperties(
+            headers={'x-load-seq': seq}, timestamp=int(time.time()), delivery_mode=2, **props))
+    published_in = time.perf_counter() - start
+
+    finished = tracker.done.wait(args.timeout)
+    elapsed = time.perf_counter() - start
+    consumer_metrics = manager.consumer.get_metrics() if manager.consumer else {}
+    manager.stop()
+    main.journal.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    normal = tracker.latencies['normal']
+    settled = sum(tracker.outcomes.values())
+    report = {
+        'run': {
+            'messages': args.messages, 'copies': len(workload), 'shape': args.shape, 'rate': args.rate,
+            'batch': args.batch, 'concurrency': args.concurrency, 'prefetch': args.prefetch,
+            'ui_scale': args.ui_scale, 'drops': args.drops, 'downtime': args.downtime, 'seed': args.seed,
+            'started_at': time.strftime('%Y-%m-%d %H:%M:%S')
+        },
+        'finished': finished,
+        'unfinished': tracker.expected - settled,
+        'elapsed_seconds': round(elapsed, 3),
+        'publish_seconds': round(published_in, 3),
+        'throughput_msgs_per_s': round(settled / elapsed, 2),
+        'latency_ms': {
+            'p50': None if not normal else round(percentile(normal, 50) * 1000, 1),
+            'p95': None if not normal else round(percentile(normal, 95) * 1000, 1),
+            'p99': None if not normal else round(percentile(normal, 99) * 1000, 1),
+            'max': None if not normal else round(max(normal) * 1000, 1)
+        },
+        'outcomes': dict(tracker.outcomes, retried=tracker.retried),
+        'broker': dict(broker.stats),
+        'consumer': {key: consumer_metrics.get(key) for key in (
+            'messages_received', 'messages_processed', 'messages_failed', 'messages_duplicate',
+            'reconnects', 'settles_lost', 'scale_ups', 'scale_downs')},
+        'ui': {'sends': sum(1 for _, name, keys in driver.actions if name == 'press' and keys == ('enter',)),
+               'actions': driver.count()},
+        'stages': {name: {key: histogram.snapshot()[key] for key in ('count', 'p50', 'p95', 'p99')}
+                   for name, histogram in registry.histograms.items()}
+    }
+    return report
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='端到端压测(进程内代理替身)')
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--rate', type=int, default=100, help='每秒发布条数')
+    parser.add_argument('--shape', choices=('steady', 'burst', 'ramp'), default='burst')
+    parser.add_argument('--groups', type=int, default=40)
+    parser.add_argument('--duplicates', type=float, default=0.05, help='重复发布比例')
+    parser.add_argument('--invalid', type=float, default=0.01, help='畸形消息比例')
+    parser.add_argument('--poison', type=float, default=0.01, help='必然发送失败的消息比例')
+    parser.add_argument('--urgent', type=float, default=0.05, help='高优先级消息比例')
+    parser.add_argument('--drops', type=int, default=2, help='运行期间注入的断线次数')
+    parser.add_argument('--downtime', type=float, default=0.5, help='每次断线后代理拒绝连接的时长(秒)')
+    parser.add_argument('--ui-scale', type=float, default=0.05, help='模拟界面耗时相对真实耗时的比例')
+    parser.add_argument('--batch', action='store_true', help='启用按群批量调度')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--max-concurrency', type=int, default=4)
+    parser.add_argument('--prefetch', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=300, help='等待全部消息结束的最长时间(秒)')
+    parser.add_argument('--output', help='JSON 报告路径，默认只打印')
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    main.setup_logging(getattr(logging, args.log_level.upper()))
+    report = run(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    if not report['finished']:
+        print(f"未在 {args.timeout} 秒内结束: {report['unfinished']}/{report['run']['copies']} 份投递未完成",
+              file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_cli()
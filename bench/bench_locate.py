@@ -0,0 +1,119 @@
+"""
+界面模板定位基准：在保存的整屏截图上检验定位精度和重新定位耗时
+样本为 <样本目录>/<名称>.png 和同名 .json({"expected": {"search_area": [x, y], ...}})；
+每张样本另外平移生成若干"窗口移动"的截图，按上次窗口区域(ROI)和整屏两种方式各定位一次
+任一锚点误差超出容忍度，或 ROI 定位 p95 超出预算时以非零状态退出
+
+用法: python bench/bench_locate.py --profile 1920x1080@96 [--samples bench/samples/layouts]
+                                   [--budget-ms 20] [--tolerance 4] [--rounds 5]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from locator import DEFAULT_TEMPLATE_DIR, LayoutNotFound, TemplateLocator, numpy, to_gray  # noqa: E402
+
+DEFAULT_SAMPLES = os.path.join(ROOT, 'bench', 'samples', 'layouts')
+SHIFTS = ((0, 0), (37, 0), (0, 52), (-80, 45), (120, -30))  # 模拟窗口移动(像素)
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def shifted(gray, dx: int, dy: int):
+    """整屏内容平移，空出的部分填充为黑色"""
+    height, width = gray.shape
+    result = numpy.zeros_like(gray)
+    src = gray[max(0, -dy):height - max(0, dy), max(0, -dx):width - max(0, dx)]
+    result[max(0, dy):max(0, dy) + src.shape[0], max(0, dx):max(0, dx) + src.shape[1]] = src
+    return result
+
+
+def roi(expected, margin: int, shape):
+    xs = [point[0] for point in expected.values()]
+    ys = [point[1] for point in expected.values()]
+    left, top = max(0, int(min(xs)) - margin), max(0, int(min(ys)) - margin)
+    right, bottom = min(shape[1], int(max(xs)) + margin), min(shape[0], int(max(ys)) + margin)
+    return left, top, right, bottom
+
+
+def main():
+    parser = argparse.ArgumentParser(description='界面模板定位基准')
+    parser.add_argument('--profile', required=True, help='模板配置名(templates/<profile>)')
+    parser.add_argument('--templates', default=DEFAULT_TEMPLATE_DIR)
+    parser.add_argument('--samples', default=DEFAULT_SAMPLES)
+    parser.add_argument('--budget-ms', type=float, default=20)
+    parser.add_argument('--tolerance', type=float, default=4, help='锚点最大误差(像素)')
+    parser.add_argument('--margin', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    if not TemplateLocator.available():
+        sys.exit("未安装 opencv/numpy，请安装 requirements-vision.txt")
+    locator = TemplateLocator.load(args.profile, args.templates)
+    if locator is None:
+        sys.exit(f"未找到模板: {os.path.join(args.templates, args.profile)}，请先标定")
+    import cv2
+
+    paths = sorted(glob.glob(os.path.join(args.samples, '*.png')))
+    if not paths:
+        sys.exit(f"样本目录为空: {args.samples}")
+
+    roi_times, full_times, errors, failures = [], [], [], []
+    for path in paths:
+        with open(os.path.splitext(path)[0] + '.json', encoding='utf-8') as f:
+            expected = {key: tuple(value) for key, value in json.load(f)['expected'].items()}
+        gray = to_gray(cv2.imdecode(numpy.fromfile(path, dtype=numpy.uint8), cv2.IMREAD_GRAYSCALE))
+        name = os.path.basename(path)
+
+        for dx, dy in SHIFTS:
+            screen = shifted(gray, dx, dy)
+            moved = {key: (x + dx, y + dy) for key, (x, y) in expected.items()}
+            # 上次窗口区域为移动前的位置
+            left, top, right, bottom = roi(expected, args.margin, screen.shape)
+            try:
+                for _ in range(args.rounds):
+                    start = time.perf_counter()
+                    found = locator.locate(screen[top:bottom, left:right], offset=(left, top))
+                    roi_times.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                locator.locate(screen)
+                full_times.append(time.perf_counter() - start)
+            except LayoutNotFound as e:
+                failures.append(f"{name} shift=({dx},{dy}): {e}")
+                continue
+            for key, point in found.items():
+                if key not in moved:
+                    continue
+                error = max(abs(point[0] - moved[key][0]), abs(point[1] - moved[key][1]))
+                errors.append(error)
+                if error > args.tolerance:
+                    failures.append(f"{name} shift=({dx},{dy}) {key}: 误差 {error}px")
+
+    report = {
+        'samples': len(paths),
+        'cases': len(paths) * len(SHIFTS),
+        'roi_ms': {'p50': round(percentile(roi_times, 50) * 1000, 2),
+                   'p95': round(percentile(roi_times, 95) * 1000, 2)} if roi_times else None,
+        'full_screen_ms': {'p50': round(percentile(full_times, 50) * 1000, 2),
+                           'p95': round(percentile(full_times, 95) * 1000, 2)} if full_times else None,
+        'max_error_px': max(errors) if errors else None,
+        'budget_ms': args.budget_ms,
+        'failures': failures
+    }
+    report['within_budget'] = bool(roi_times) and percentile(roi_times, 95) * 1000 <= args.budget_ms
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if failures or not report['within_budget']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+日志开销基准：测量每条消息热路径上日志调用在调用线程中的耗时
+legacy: 同步 StreamHandler + f-string 预先 json.dumps 的 debug 日志(改造前的写法)
+queued: setup_logging 的队列+后台监听线程 + 延迟格式化 + 采样
+
+用法: python bench/bench_logging.py [--messages N] [--format text|json]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logs import TEXT_FORMAT, DATE_FORMAT, lazy_json, sample, sampled, setup_logging, stats  # noqa: E402
+
+logger = logging.getLogger("Bench")
+
+MESSAGE = {
+    'groupName': [f'拍卖群{i:02d}' for i in range(5)],
+    'message': '【拍卖通知】标的已更新，请及时查看' * 4
+}
+
+
+def legacy_path(i: int):
+    message_id = f'msg_{i}'
+    logger.info(f"📨 收到消息 [ID: {message_id}]")
+    logger.debug(f"消息内容: {json.dumps(MESSAGE, ensure_ascii=False, indent=2)}")
+    for group in MESSAGE['groupName']:
+        logger.info(f"已向群:{group}发送1条信息.")
+    logger.info(f"✅ 消息处理成功: {message_id}")
+
+
+def queued_path(i: int):
+    message_id = f'msg_{i}'
+    if sampled('receive'):
+        logger.info("📨 收到消息 [ID: %s]", message_id, extra=sample('receive', message_id=message_id))
+    logger.debug("消息内容: %s", lazy_json(MESSAGE), extra={'message_id': message_id})
+    for group in MESSAGE['groupName']:
+        if sampled('group'):
+            logger.info("已向群:%s发送%d条信息.", group, 1, extra=sample('group', group=group, elapsed=0.8))
+    logger.info("✅ 消息处理成功: %s", message_id, extra={'message_id': message_id, 'elapsed': 1.2})
+
+
+def measure(name: str, path, count: int):
+    start = time.perf_counter()
+    for i in range(count):
+        path(i)
+    elapsed = time.perf_counter() - start
+    return {'mode': name, 'messages': count, 'us_per_message': round(elapsed / count * 1e6, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='日志开销基准')
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--format', choices=('text', 'json'), default='json')
+    args = parser.parse_args()
+
+    devnull = open(os.devnull, 'w', encoding='utf-8')
+    results = []
+
+    logging.basicConfig(level=logging.INFO, format=TEXT_FORMAT, datefmt=DATE_FORMAT, stream=devnull, force=True)
+    results.append(measure('legacy', legacy_path, args.messages))
+
+    listener = setup_logging(logging.INFO, args.format, queue_size=args.messages * 10, stream=devnull)
+    results.append(measure(f'queued-{args.format}', queued_path, args.messages))
+    drain_start = time.perf_counter()
+    listener.stop()
+    results[-1]['background_drain_seconds'] = round(time.perf_counter() - drain_start, 3)
+    results[-1].update(stats)
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
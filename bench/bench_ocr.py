@@ -0,0 +1,125 @@
+"""
+聊天标题 OCR 校验基准：在保存的标题区域截图上测量模型加载、单次识别和缓存命中耗时
+样本为 <样本目录>/<群名>.png(同一个群的多张截图可命名为 <群名>__2.png)，文件名即期望群名
+未缓存识别的 p95 超出预算或有样本校验不通过时以非零状态退出
+
+用法:
+  python bench/bench_ocr.py [--samples bench/samples/headers] [--budget 0.3] [--rounds 3]
+  python bench/bench_ocr.py --capture 拍卖群01 [--profile NAME]   # 截取当前打开聊天的标题区域作为样本
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from verify import ChatVerifier  # noqa: E402
+
+DEFAULT_SAMPLES = os.path.join(ROOT, 'bench', 'samples', 'headers')
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def capture(name: str, samples: str, profile: str = None):
+    """按标定的 header_area 截取当前聊天标题区域并保存为样本"""
+    import processer
+    from calibration import load_components
+
+    components = load_components(processer.get_driver(), name=profile)
+    region = processer.ui_regions(components)['chat_header']
+    if region is None:
+        sys.exit("标定配置中没有 header_area，无法截取标题区域")
+    os.makedirs(samples, exist_ok=True)
+    path = os.path.join(samples, f"{name}.png")
+    index = 2
+    while os.path.exists(path):
+        path = os.path.join(samples, f"{name}__{index}.png")
+        index += 1
+    processer.get_driver().screenshot(region).save(path)
+    print(f"已保存: {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='聊天标题 OCR 校验基准')
+    parser.add_argument('--samples', default=DEFAULT_SAMPLES)
+    parser.add_argument('--budget', type=float, default=0.3, help='单次未缓存识别的 p95 预算(秒)')
+    parser.add_argument('--rounds', type=int, default=3, help='每张样本重复识别的轮数')
+    parser.add_argument('--threads', type=int, help='CPU 推理线程数')
+    parser.add_argument('--capture', metavar='GROUP', help='截取当前聊天标题区域保存为该群的样本')
+    parser.add_argument('--profile', help='截取样本时使用的标定配置名')
+    args = parser.parse_args()
+
+    if args.capture:
+        capture(args.capture, args.samples, args.profile)
+        return
+
+    if not ChatVerifier.available():
+        sys.exit("未安装 OCR 依赖，请安装 requirements-vision.txt")
+    from PIL import Image
+
+    paths = sorted(glob.glob(os.path.join(args.samples, '*.png')))
+    if not paths:
+        sys.exit(f"样本目录为空: {args.samples}，可用 --capture 群名 截取")
+    samples = [(os.path.splitext(os.path.basename(path))[0].split('__')[0], Image.open(path).convert('RGB'))
+               for path in paths]
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    verifier = ChatVerifier(budget=args.budget)
+    start = time.perf_counter()
+    verifier.reader()
+    load_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    verifier.warm().join()
+    warmup_seconds = time.perf_counter() - start
+
+    # 未缓存识别：每轮清空缓存
+    uncached = []
+    failures = []
+    for _ in range(args.rounds):
+        for group, image in samples:
+            verifier._cache.clear()
+            start = time.perf_counter()
+            matched = verifier.verify(group, image)
+            uncached.append(time.perf_counter() - start)
+            if not matched:
+                failures.append(group)
+
+    # 缓存命中：同一标题再次校验
+    cached = []
+    for group, image in samples:
+        verifier.verify(group, image)
+        start = time.perf_counter()
+        verifier.verify(group, image)
+        cached.append(time.perf_counter() - start)
+
+    report = {
+        'samples': len(samples),
+        'model_load_seconds': round(load_seconds, 2),
+        'warmup_seconds': round(warmup_seconds, 3),
+        'uncached_ms': {'p50': round(percentile(uncached, 50) * 1000, 1),
+                        'p95': round(percentile(uncached, 95) * 1000, 1),
+                        'max': round(max(uncached) * 1000, 1)},
+        'cached_ms': {'p50': round(percentile(cached, 50) * 1000, 3),
+                      'max': round(max(cached) * 1000, 3)},
+        'budget_ms': args.budget * 1000,
+        'mismatches': sorted(set(failures)),
+        'metrics': dict(verifier.metrics)
+    }
+    report['within_budget'] = percentile(uncached, 95) <= args.budget
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if not report['within_budget'] or failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
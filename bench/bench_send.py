@@ -0,0 +1,144 @@
+"""
+发送吞吐基准：在无界面录制驱动上回放消息语料
+报告每条消息的界面动作数、每个群的模拟耗时和吞吐量；
+--desktops N 时另测 N 个桌面按群一致性哈希并行发送(各桌面独立模拟时钟，耗时取最慢的桌面)
+
+用法: python bench/bench_send.py [语料.jsonl] [--messages N] [--batch N] [--seed N] [--rate-limit] [--desktops N]
+语料每行一条通知: {"groupName": [...], "message": "..."}，不提供时生成拍卖通知样例
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import processer  # noqa: E402
+from desktops import DesktopPool, DesktopSession  # noqa: E402
+from driver import HeadlessDriver  # noqa: E402
+from model import Notice  # noqa: E402
+from ratelimit import RateLimiter  # noqa: E402
+from scheduler import GroupBatchScheduler  # noqa: E402
+
+COMPONENT = {
+    'msg_area': (800, 900),
+    'search_area': (150, 60),
+    'choose_area': (150, 130),
+    'header_area': (700, 60)
+}
+
+
+def load_corpus(path: str):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def generate_corpus(count: int, seed: int, groups: int = 40):
+    """生成突发式拍卖通知：热门群集中、扇出 1~8 个群"""
+    rng = random.Random(seed)
+    names = [f'拍卖群{i:02d}' for i in range(groups)]
+    hot = names[:8]
+    corpus = []
+    for i in range(count):
+        pool = hot if rng.random() < 0.7 else names
+        fanout = min(len(pool), rng.choice([1, 1, 2, 3, 5, 8]))
+        corpus.append({
+            'groupName': rng.sample(pool, fanout),
+            'message': f'【拍卖通知{i}】标的已更新，请及时查看'
+        })
+    return corpus
+
+
+def run_sequential(corpus, driver):
+    for data in corpus:
+        processer.process(data, COMPONENT)
+
+
+def run_batched(corpus, driver, batch: int):
+    scheduler = GroupBatchScheduler(
+        lambda group, messages: processer.process_group(group, messages, COMPONENT),
+        window=0, max_messages=batch, rate_limiter=processer.rate_limiter
+    )
+    for data in corpus:
+        if scheduler.submit(data, None, lambda result: None):
+            scheduler.flush()
+    scheduler.flush()
+
+
+def measure(name, corpus, runner, rate_limit: bool = False):
+    driver = HeadlessDriver(seed=0)
+    processer.set_driver(driver)
+    processer.set_rate_limiter(RateLimiter(clock=driver.now, sleep=driver.sleep) if rate_limit else None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        runner(corpus, driver)
+    group_sends = sum(len(notice.groups) for notice in corpus)
+    actions = driver.count()
+    elapsed = driver.elapsed
+    return {
+        'mode': name,
+        'messages': len(corpus),
+        'group_sends': group_sends,
+        'chat_switches': driver.count('hotkey'),  # 每次搜索群时 ctrl+a 一次
+        'actions': actions,
+        'actions_per_message': round(actions / len(corpus), 2),
+        'simulated_seconds': round(elapsed, 3),
+        'seconds_per_group': round(elapsed / group_sends, 3),
+        'throughput_msgs_per_s': round(len(corpus) / elapsed, 3) if elapsed else None
+    }
+
+
+def measure_desktops(corpus, count: int, batch: int):
+    """多桌面批量发送，限速按单桌面时钟无意义，此模式不启用"""
+    processer.set_rate_limiter(None)
+    drivers = [HeadlessDriver(seed=i) for i in range(count)]
+    pool = DesktopPool([DesktopSession(f'desktop{i}', driver, COMPONENT) for i, driver in enumerate(drivers)])
+    scheduler = GroupBatchScheduler(None, window=0, max_messages=batch, desktops=pool)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for data in corpus:
+            if scheduler.submit(data, None, lambda result: None):
+                scheduler.flush()
+        scheduler.flush()
+    pool.close()
+    elapsed = max(driver.elapsed for driver in drivers)
+    group_sends = sum(len(notice.groups) for notice in corpus)
+    actions = sum(driver.count() for driver in drivers)
+    return {
+        'mode': f'desktops x{count}',
+        'messages': len(corpus),
+        'group_sends': group_sends,
+        'chat_switches': sum(driver.count('hotkey') for driver in drivers),
+        'actions': actions,
+        'actions_per_message': round(actions / len(corpus), 2),
+        'simulated_seconds': round(elapsed, 3),
+        'seconds_per_group': round(elapsed / group_sends, 3),
+        'throughput_msgs_per_s': round(len(corpus) / elapsed, 3) if elapsed else None,
+        'groups_per_desktop': pool.metrics['groups']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='发送吞吐基准')
+    parser.add_argument('corpus', nargs='?')
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--rate-limit', action='store_true', help='按默认限速配置发送')
+    parser.add_argument('--desktops', type=int, default=0, help='并行桌面数')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else generate_corpus(args.messages, args.seed)
+    corpus = [Notice.from_dict(data) for data in corpus]
+    results = [
+        measure('sequential', corpus, run_sequential, args.rate_limit),
+        measure('batched', corpus, lambda c, d: run_batched(c, d, args.batch), args.rate_limit)
+    ]
+    if args.desktops:
+        results.append(measure_desktops(corpus, args.desktops, args.batch))
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+冷启动回归基准：用 -X importtime 在子进程中导入入口模块，统计累计导入耗时和内存峰值
+超出预算或热路径加载了重型依赖时以非零状态退出，可直接作为 CI 检查
+
+用法: python bench/bench_startup.py [--module main] [--budget-ms 1500] [--budget-rss-mb 120]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 热路径上不允许出现的重型依赖
+FORBIDDEN = ('torch', 'cv2', 'easyocr', 'scipy', 'skimage', 'numpy')
+
+CHILD = """
+import json, resource, sys
+import {module}
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == 'darwin':
+    rss //= 1024
+loaded = sorted(name for name in {forbidden!r} if name in sys.modules)
+print(json.dumps({{'rss_kb': rss, 'heavy_modules': loaded}}))
+"""
+
+
+def parse_importtime(stderr: str):
+    """解析 -X importtime 输出，返回(总耗时微秒, 最慢的顶层导入)"""
+    total = 0
+    top = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        total += int(self_us)
+        if not name.startswith('  '):  # 缩进一格为顶层导入
+            top.append((int(cumulative), name.strip()))
+    top.sort(reverse=True)
+    return total, top[:10]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='冷启动回归基准')
+    parser.add_argument('--module', default='main')
+    parser.add_argument('--budget-ms', type=float, default=1500)
+    parser.add_argument('--budget-rss-mb', type=float, default=120)
+    args = parser.parse_args()
+
+    child = CHILD.format(module=args.module, forbidden=FORBIDDEN)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', child],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:], file=sys.stderr)
+        sys.exit(proc.returncode)
+
+    stats = json.loads(proc.stdout.strip().splitlines()[-1])
+    total_us, top = parse_importtime(proc.stderr)
+    report = {
+        'module': args.module,
+        'import_ms': round(total_us / 1000, 1),
+        'rss_mb': round(stats['rss_kb'] / 1024, 1),
+        'heavy_modules': stats['heavy_modules'],
+        'slowest': [{'module': name, 'cumulative_ms': round(us / 1000, 1)} for us, name in top],
+        'budget_ms': args.budget_ms,
+        'budget_rss_mb': args.budget_rss_mb
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    failures = []
+    if report['import_ms'] > args.budget_ms:
+        failures.append(f"导入耗时 {report['import_ms']}ms 超出预算 {args.budget_ms}ms")
+    if report['rss_mb'] > args.budget_rss_mb:
+        failures.append(f"内存 {report['rss_mb']}MB 超出预算 {args.budget_rss_mb}MB")
+    if report['heavy_modules']:
+        failures.append(f"热路径加载了重型依赖: {', '.join(report['heavy_modules'])}")
+    if failures:
+        print('\n'.join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,481 @@
+"""
+进程内 AMQP 代理替身：实现消费者用到的 pika BlockingConnection/通道接口
+默认交换机按路由键投递到同名队列；支持预取、确认/拒绝、重新投递、
+x-message-ttl + 死信(延迟重试队列)、被动声明查询深度、线程安全回调和 call_later；
+drop() 模拟代理断开连接，未确认的投递重新入队并标记 redelivered
+
+用法: broker = FakeBroker(); install(broker) 后再 import main，
+main 中的 pika.BlockingConnection 即连接到该代理
+"""
+import heapq
+import itertools
+import sys
+import threading
+import time
+import types
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class AMQPError(Exception):
+    pass
+
+
+class AMQPConnectionError(AMQPError):
+    pass
+
+
+class ConnectionClosedByBroker(AMQPConnectionError):
+    def __init__(self, reply_code: int = 320, reply_text: str = 'CONNECTION_FORCED'):
+        super().__init__(reply_code, reply_text)
+        self.reply_code = reply_code
+        self.reply_text = reply_text
+
+
+class ConnectionWrongStateError(AMQPConnectionError):
+    pass
+
+
+class AMQPChannelError(AMQPError):
+    pass
+
+
+class ChannelWrongStateError(AMQPChannelError):
+    pass
+
+
+class NackError(AMQPError):
+    pass
+
+
+class UnroutableError(AMQPError):
+    pass
+
+
+class BasicProperties:
+    def __init__(self, content_type: str = None, delivery_mode: int = None, priority: int = None,
+                 message_id: str = None, timestamp: int = None, headers: Dict[str, Any] = None,
+                 reply_to: str = None, correlation_id: str = None, **kwargs):
+        self.content_type = content_type
+        self.delivery_mode = delivery_mode
+        self.priority = priority
+        self.message_id = message_id
+        self.timestamp = timestamp
+        self.headers = headers
+        self.reply_to = reply_to
+        self.correlation_id = correlation_id
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+
+class Message:
+    __slots__ = ('body', 'properties', 'redelivered', 'expires_at')
+
+    def __init__(self, body: bytes, properties: BasicProperties):
+        self.body = body
+        self.properties = properties
+        self.redelivered = False
+        self.expires_at = None
+
+
+class Queue:
+    def __init__(self, name: str, arguments: Dict[str, Any] = None):
+        self.name = name
+        self.arguments = dict(arguments or {})
+        self.messages: deque = deque()
+        self.consumers: List[Tuple['FakeChannel', str, Callable]] = []
+        self.next_consumer = 0
+
+
+class FakeBroker:
+    """内存代理，所有状态由一把锁保护，投递只在各连接的 process_data_events 中执行"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.wakeup = threading.Condition(self.lock)
+        self.queues: Dict[str, Queue] = {}
+        self.connections: List['FakeConnection'] = []
+        self.down_until = 0.0
+        self.on_ack: Optional[Callable[[Message], None]] = None  # 投递被确认
+        self.on_reject: Optional[Callable[[Message], None]] = None  # 投递被拒绝且不重新入队
+        self.on_publish: Optional[Callable[[str, Message], None]] = None  # 客户端发布
+
+        # 统计
+        self.stats = {
+            'published': 0,
+            'delivered': 0,
+            'redelivered': 0,
+            'acked': 0,
+            'requeued': 0,
+            'rejected': 0,
+            'expired': 0,
+            'connections': 0,
+            'drops': 0
+        }
+
+    # 代理侧
+
+    def declare(self, name: str, arguments: Dict[str, Any] = None, passive: bool = False) -> Queue:
+        with self.lock:
+            queue = self.queues.get(name)
+            if queue is None:
+                if passive:
+                    raise AMQPChannelError(404, f"NOT_FOUND - no queue '{name}'")
+                queue = self.queues[name] = Queue(name, arguments)
+            return queue
+
+    def publish(self, routing_key: str, body: bytes, properties: BasicProperties = None):
+        """发布到默认交换机，队列不存在时丢弃(与 RabbitMQ 的未路由行为一致)"""
+        message = Message(body, properties or BasicProperties())
+        with self.lock:
+            queue = self.queues.get(routing_key)
+            if queue is None:
+                return
+            ttl = queue.arguments.get('x-message-ttl')
+            if ttl is not None:
+                message.expires_at = time.monotonic() + ttl / 1000
+            queue.messages.append(message)
+            self.stats['published'] += 1
+            self.wakeup.notify_all()
+
+    def depth(self, name: str) -> int:
+        with self.lock:
+            queue = self.queues.get(name)
+            return len(queue.messages) if queue else 0
+
+    def expire(self):
+        """TTL 到期的消息按队列的死信参数转发，并记录 x-death"""
+        now = time.monotonic()
+        with self.lock:
+            for queue in list(self.queues.values()):
+                target = queue.arguments.get('x-dead-letter-routing-key')
+                while queue.messages and queue.messages[0].expires_at is not None \
+                        and queue.messages[0].expires_at <= now:
+                    message = queue.messages.popleft()
+                    self.stats['expired'] += 1
+                    if target:
+                        self._dead_letter(queue, message, target, 'expired')
+
+    def next_expiry(self) -> Optional[float]:
+        with self.lock:
+            times = [queue.messages[0].expires_at for queue in self.queues.values()
+                     if queue.messages and queue.messages[0].expires_at is not None]
+            return min(times) if times else None
+
+    def _dead_letter(self, queue: Queue, message: Message, target: str, reason: str):
+        properties = message.properties
+        headers = dict(properties.headers or {})
+        deaths = [dict(death) for death in headers.get('x-death') or []]
+        for death in deaths:
+            if death.get('queue') == queue.name and death.get('reason') == reason:
+                death['count'] = death.get('count', 1) + 1
+                break
+        else:
+            deaths.insert(0, {'queue': queue.name, 'reason': reason, 'count': 1})
+        headers['x-death'] = deaths
+        copy = BasicProperties(**vars(properties))
+        copy.headers = headers
+        self.publish(target, message.body, copy)
+
+    def drop(self, downtime: float = 0.0):
+        """断开所有连接，downtime 秒内拒绝新连接"""
+        with self.lock:
+            self.down_until = time.monotonic() + downtime
+            self.stats['drops'] += 1
+            for connection in list(self.connections):
+                connection._lost()
+            self.wakeup.notify_all()
+
+    def connect(self, parameters) -> 'FakeConnection':
+        with self.lock:
+            if time.monotonic() < self.down_until:
+                raise AMQPConnectionError("Connection refused (broker down)")
+            connection = FakeConnection(self, parameters)
+            self.connections.append(connection)
+            self.stats['connections'] += 1
+            return connection
+
+    def dispatch(self, connection: 'FakeConnection') -> List[Tuple[Callable, tuple]]:
+        """为该连接的消费者取出可投递的消息(受预取限制)，返回待调用的回调"""
+        calls = []
+        with self.lock:
+            for queue in self.queues.values():
+                while queue.messages:
+                    consumer = self._next_consumer(queue, connection)
+                    if consumer is None:
+                        break
+                    channel, tag, callback = consumer
+                    message = queue.messages.popleft()
+                    delivery_tag = channel._track(queue, message)
+                    self.stats['delivered'] += 1
+                    if message.redelivered:
+                        self.stats['redelivered'] += 1
+                    method = types.SimpleNamespace(delivery_tag=delivery_tag, redelivered=message.redelivered,
+                                                   routing_key=queue.name, exchange='', consumer_tag=tag)
+                    calls.append((callback, (channel, method, message.properties, message.body)))
+        return calls
+
+    def _next_consumer(self, queue: Queue, connection: 'FakeConnection'):
+        """轮询该队列上属于此连接、预取未满的消费者"""
+        count = len(queue.consumers)
+        for offset in range(count):
+            index = (queue.next_consumer + offset) % count
+            channel, tag, callback = queue.consumers[index]
+            if channel.connection is connection and channel.is_open and channel._has_capacity():
+                queue.next_consumer = index + 1
+                return queue.consumers[index]
+        return None
+
+    def requeue(self, queue: Queue, message: Message):
+        with self.lock:
+            message.redelivered = True
+            queue.messages.appendleft(message)
+            self.stats['requeued'] += 1
+            self.wakeup.notify_all()
+
+
+class FakeChannel:
+    def __init__(self, connection: 'FakeConnection', number: int):
+        self.connection = connection
+        self.broker = connection.broker
+        self.channel_number = number
+        self.is_open = True
+        self.prefetch_count = 0
+        self.confirming = False
+        self._tags = itertools.count(1)
+        self._unacked: Dict[int, Tuple[Queue, Message]] = {}
+        self._consumers: Dict[str, Queue] = {}
+
+    def _check(self):
+        if not self.is_open or not self.connection.is_open:
+            raise ChannelWrongStateError("Channel is closed.")
+
+    def _has_capacity(self) -> bool:
+        return not self.prefetch_count or len(self._unacked) < self.prefetch_count
+
+    def _track(self, queue: Queue, message: Message) -> int:
+        tag = next(self._tags)
+        self._unacked[tag] = (queue, message)
+        return tag
+
+    def basic_qos(self, prefetch_size: int = 0, prefetch_count: int = 0, global_qos: bool = False):
+        self._check()
+        self.prefetch_count = prefetch_count
+
+    def basic_consume(self, queue: str, on_message_callback: Callable, auto_ack: bool = False, **kwargs) -> str:
+        self._check()
+        target = self.broker.declare(queue, passive=True)
+        tag = f'ctag{self.channel_number}.{id(on_message_callback) & 0xffff}.{len(self._consumers)}'
+        with self.broker.lock:
+            target.consumers.append((self, tag, on_message_callback))
+            self._consumers[tag] = target
+        return tag
+
+    def basic_cancel(self, consumer_tag: str):
+        self._check()
+        with self.broker.lock:
+            queue = self._consumers.pop(consumer_tag, None)
+            if queue:
+                queue.consumers = [consumer for consumer in queue.consumers if consumer[1] != consumer_tag]
+
+    def basic_ack(self, delivery_tag: int = 0, multiple: bool = False):
+        self._check()
+        for queue, message in self._settle(delivery_tag, multiple):
+            self.broker.stats['acked'] += 1
+            if self.broker.on_ack:
+                self.broker.on_ack(message)
+
+    def basic_nack(self, delivery_tag: int = 0, multiple: bool = False, requeue: bool = True):
+        self._check()
+        for queue, message in self._settle(delivery_tag, multiple):
+            if requeue:
+                self.broker.requeue(queue, message)
+            else:
+                self.broker.stats['rejected'] += 1
+                target = queue.arguments.get('x-dead-letter-routing-key')
+                if target:
+                    self.broker._dead_letter(queue, message, target, 'rejected')
+                if self.broker.on_reject:
+                    self.broker.on_reject(message)
+
+    def basic_reject(self, delivery_tag: int, requeue: bool = True):
+        self.basic_nack(delivery_tag, requeue=requeue)
+
+    def _settle(self, delivery_tag: int, multiple: bool):
+        with self.broker.lock:
+            if multiple:
+                tags = [tag for tag in self._unacked if tag <= delivery_tag]
+            else:
+                if delivery_tag not in self._unacked:
+                    raise AMQPChannelError(406, f"PRECONDITION_FAILED - unknown delivery tag {delivery_tag}")
+                tags = [delivery_tag]
+            return [self._unacked.pop(tag) for tag in tags]
+
+    def confirm_delivery(self):
+        """发布确认模式：替身代理同步入队，发布返回即视为已确认"""
+        self._check()
+        self.confirming = True
+
+    def basic_publish(self, exchange: str, routing_key: str, body: bytes,
+                      properties: BasicProperties = None, mandatory: bool = False):
+        self._check()
+        message = Message(body, properties or BasicProperties())
+        if self.broker.on_publish:
+            self.broker.on_publish(routing_key, message)
+        if mandatory and self.confirming and routing_key not in self.broker.queues:
+            raise UnroutableError(f"NO_ROUTE: {routing_key}")
+        self.broker.publish(routing_key, body, properties)
+
+    def queue_declare(self, queue: str, passive: bool = False, durable: bool = False,
+                      exclusive: bool = False, auto_delete: bool = False, arguments: Dict[str, Any] = None):
+        self._check()
+        target = self.broker.declare(queue, arguments, passive)
+        with self.broker.lock:
+            return types.SimpleNamespace(method=types.SimpleNamespace(
+                queue=queue, message_count=len(target.messages), consumer_count=len(target.consumers)))
+
+    def exchange_declare(self, exchange: str, exchange_type: str = 'direct', **kwargs):
+        self._check()
+
+    def queue_bind(self, queue: str, exchange: str, routing_key: str = None, arguments=None):
+        self._check()
+
+    def close(self):
+        if not self.is_open:
+            return
+        self._release()
+
+    def _release(self):
+        """通道关闭：取消消费者，未确认的投递重新入队"""
+        self.is_open = False
+        with self.broker.lock:
+            for tag, queue in self._consumers.items():
+                queue.consumers = [consumer for consumer in queue.consumers if consumer[1] != tag]
+            self._consumers = {}
+            unacked, self._unacked = self._unacked, {}
+        for tag in sorted(unacked, reverse=True):  # 逆序放回队首，保持原投递顺序
+            self.broker.requeue(*unacked[tag])
+
+
+class FakeConnection:
+    def __init__(self, broker: FakeBroker, parameters=None):
+        self.broker = broker
+        self.parameters = parameters
+        self.is_open = True
+        self.channels: List[FakeChannel] = []
+        self._callbacks: deque = deque()
+        self._timers: List[Tuple[float, int, Callable]] = []
+        self._timer_seq = itertools.count()
+        self._error: Optional[Exception] = None
+
+    @property
+    def is_closed(self) -> bool:
+        return not self.is_open
+
+    def channel(self) -> FakeChannel:
+        if not self.is_open:
+            raise ConnectionWrongStateError("Connection is closed.")
+        channel = FakeChannel(self, len(self.channels) + 1)
+        self.channels.append(channel)
+        return channel
+
+    def add_callback_threadsafe(self, callback: Callable):
+        with self.broker.lock:
+            if not self.is_open:
+                raise ConnectionWrongStateError("BlockingConnection.add_callback_threadsafe() called on closed connection")
+            self._callbacks.append(callback)
+            self.broker.wakeup.notify_all()
+
+    def call_later(self, delay: float, callback: Callable):
+        with self.broker.lock:
+            heapq.heappush(self._timers, (time.monotonic() + delay, next(self._timer_seq), callback))
+
+    def _lost(self):
+        """代理侧断开"""
+        self._error = ConnectionClosedByBroker()
+        self._close()
+
+    def _close(self):
+        with self.broker.lock:
+            if not self.is_open:
+                return
+            self.is_open = False
+            self._callbacks.clear()
+            if self in self.broker.connections:
+                self.broker.connections.remove(self)
+        for channel in self.channels:
+            if channel.is_open:
+                channel._release()
+
+    def close(self):
+        self._close()
+
+    def process_data_events(self, time_limit: float = 0):
+        """处理回调、定时器和投递；有事件处理过即返回，否则最多等待 time_limit 秒"""
+        deadline = time.monotonic() + (time_limit or 0)
+        while True:
+            if not self.is_open:
+                if self._error:
+                    raise self._error
+                return
+            worked = False
+            with self.broker.lock:
+                callbacks = list(self._callbacks)
+                self._callbacks.clear()
+            for callback in callbacks:
+                callback()
+                worked = True
+            now = time.monotonic()
+            while self._timers and self._timers[0][0] <= now:
+                with self.broker.lock:
+                    _, _, callback = heapq.heappop(self._timers)
+                callback()
+                worked = True
+            self.broker.expire()
+            for callback, args in self.broker.dispatch(self):
+                callback(*args)
+                worked = True
+            now = time.monotonic()
+            if worked or now >= deadline:
+                return
+            wake = [deadline]
+            if self._timers:
+                wake.append(self._timers[0][0])
+            expiry = self.broker.next_expiry()
+            if expiry is not None:
+                wake.append(expiry)
+            with self.broker.lock:
+                if not self._callbacks and self.is_open:
+                    self.broker.wakeup.wait(max(0.0, min(wake) - now))
+
+    def sleep(self, duration: float):
+        self.process_data_events(duration)
+
+
+def make_module(broker: FakeBroker) -> types.ModuleType:
+    """构造连接到 broker 的 pika 替身模块"""
+    module = types.ModuleType('pika')
+    exceptions = types.ModuleType('pika.exceptions')
+    for error in (AMQPError, AMQPConnectionError, ConnectionClosedByBroker, ConnectionWrongStateError,
+                  AMQPChannelError, ChannelWrongStateError, NackError, UnroutableError):
+        setattr(exceptions, error.__name__, error)
+    exceptions.StreamLostError = AMQPConnectionError
+    module.exceptions = exceptions
+    module.BasicProperties = BasicProperties
+    module.PlainCredentials = lambda username, password, **kwargs: types.SimpleNamespace(
+        username=username, password=password)
+    module.SSLOptions = lambda context, server_hostname=None: types.SimpleNamespace(
+        context=context, server_hostname=server_hostname)
+    module.ConnectionParameters = lambda **kwargs: types.SimpleNamespace(**kwargs)
+    module.BlockingConnection = broker.connect
+    module.spec = types.SimpleNamespace(BasicProperties=BasicProperties)
+    return module
+
+
+def install(broker: FakeBroker) -> types.ModuleType:
+    """把 pika 替身注册到 sys.modules，须在 import main 之前调用"""
+    module = make_module(broker)
+    sys.modules['pika'] = module
+    sys.modules['pika.exceptions'] = module.exceptions
+    sys.modules['pika.spec'] = module.spec
+    return module
@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from driver import UIDriver
+
+logger = logging.getLogger("Calibration")
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'calibration.json')
+
+# 标定的坐标点，header_area 可选(用于就绪检测)
+ANCHORS = ('msg_area', 'search_area', 'choose_area', 'header_area')
+# 参与启动校验的静态界面锚点，搜索结果和聊天标题内容会变化，不做校验
+VALIDATED_ANCHORS = ('msg_area', 'search_area')
+FINGERPRINT_SIZE = 24  # 锚点校验截图边长(像素)
+FINGERPRINT_GRID = 4  # 指纹网格边长
+FINGERPRINT_TOLERANCE = 12  # 指纹平均灰度差容忍度
+
+
+def profile_name(driver: UIDriver) -> str:
+    """按分辨率和DPI命名标定配置，如 1920x1080@96"""
+    width, height, dpi = driver.screen_info()
+    return f"{width}x{height}@{dpi}"
+
+
+def fingerprint(driver: UIDriver, point) -> List[int]:
+    """锚点附近小区域的粗粒度灰度指纹"""
+    half = FINGERPRINT_SIZE // 2
+    image = driver.screenshot(region=(int(point[0]) - half, int(point[1]) - half,
+                                      FINGERPRINT_SIZE, FINGERPRINT_SIZE))
+    if hasattr(image, 'convert'):
+        small = image.convert('L').resize((FINGERPRINT_GRID, FINGERPRINT_GRID))
+        return list(small.getdata())
+    return list(bytes(image))
+
+
+def fingerprint_distance(a: List[int], b: List[int]) -> float:
+    """两个指纹的平均灰度差"""
+    if len(a) != len(b) or not a:
+        return float('inf')
+    return sum(abs(x - y) for x, y in zip(a, b)) / len(a)
+
+
+class CalibrationStore:
+    """标定配置文件，每个分辨率/DPI一个命名配置"""
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+
+    def _read(self) -> Dict[str, Any]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"读取标定文件失败: {e}")
+            return {}
+
+    def load(self, name: str) -> Optional[Dict[str, Any]]:
+        """读取命名配置，不存在时返回None"""
+        return self._read().get(name)
+
+    def save(self, name: str, profile: Dict[str, Any]):
+        """保存命名配置，先写临时文件再替换"""
+        profiles = self._read()
+        profiles[name] = profile
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(profiles, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+        logger.info(f"标定配置已保存: {name}")
+
+
+def components_from(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """从配置取出坐标"""
+    return {key: tuple(profile[key]) for key in ANCHORS if profile.get(key)}
+
+
+def validate(driver: UIDriver, profile: Dict[str, Any]) -> bool:
+    """截图校验各静态锚点是否与标定时一致"""
+    fingerprints = profile.get('fingerprints') or {}
+    if not all(profile.get(key) for key in ANCHORS[:3]):
+        return False
+    for key, expected in fingerprints.items():
+        distance = fingerprint_distance(fingerprint(driver, profile[key]), expected)
+        if distance > FINGERPRINT_TOLERANCE:
+            logger.warning(f"锚点校验失败: {key} (差异 {distance:.1f})")
+            return False
+    return True
+
+
+def interactive_calibrate(driver: UIDriver, delay: float = 3) -> Dict[str, Any]:
+    """交互式标定：操作员依次把鼠标停在各组件上"""
+    prompts = {
+        'msg_area': '准备确认消息框位置',
+        'search_area': '准备搜索框位置',
+        'choose_area': '准备确认选中聊天位置',
+        'header_area': '准备确认聊天标题位置'
+    }
+    profile: Dict[str, Any] = {}
+    for key in ANCHORS:
+        print(prompts[key])
+        time.sleep(delay)
+        profile[key] = list(driver.position())
+    profile['fingerprints'] = {key: fingerprint(driver, profile[key]) for key in VALIDATED_ANCHORS}
+    profile['calibrated_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    return profile
+
+
+def load_components(driver: UIDriver, store: CalibrationStore = None,
+                    name: str = None, recalibrate: bool = False) -> Dict[str, Any]:
+    """
+    加载组件坐标
+    优先使用当前分辨率的已存配置并截图校验，校验失败时先按保存的界面模板自动定位，
+    仍失败或显式要求时才交互式标定(标定后保存界面模板供以后自动定位)
+    """
+    store = store or CalibrationStore()
+    name = name or profile_name(driver)
+
+    if not recalibrate:
+        profile = store.load(name)
+        if profile and validate(driver, profile):
+            logger.info(f"✅ 已加载标定配置: {name}")
+            return components_from(profile)
+        if profile:
+            located = locate_profile(driver, name, profile)
+            if located:
+                store.save(name, located)
+                return components_from(located)
+        logger.warning(f"标定配置 {name} 不存在或校验失败，开始交互式标定")
+
+    profile = interactive_calibrate(driver)
+    store.save(name, profile)
+    save_templates(driver, name, profile)
+    return components_from(profile)
+
+
+def locate_profile(driver: UIDriver, name: str, profile: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """按保存的界面模板在整屏截图中重新定位组件，成功返回更新后的配置"""
+    from locator import LayoutNotFound, TemplateLocator
+    if not TemplateLocator.available():
+        return None
+    locator = TemplateLocator.load(name)
+    if locator is None:
+        return None
+    try:
+        found = locator.locate(driver.screenshot())
+    except LayoutNotFound as e:
+        logger.warning(f"模板自动定位失败: {e}")
+        return None
+    located = dict(profile)
+    located.update({key: list(point) for key, point in found.items()})
+    located['fingerprints'] = {key: fingerprint(driver, located[key]) for key in VALIDATED_ANCHORS}
+    located['located_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    logger.info(f"✅ 已按界面模板自动定位: {name}")
+    return located
+
+
+def save_templates(driver: UIDriver, name: str, profile: Dict[str, Any]):
+    """标定后截取界面模板，未安装 opencv 时跳过"""
+    from locator import TemplateLocator
+    if not TemplateLocator.available():
+        return
+    try:
+        TemplateLocator.save(name, driver.screenshot(), components_from(profile))
+    except Exception as e:
+        logger.error(f"保存界面模板失败: {e}")
@@ -0,0 +1,56 @@
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger("Coalescer")
+
+
+class Coalescer:
+    """
+    同群消息合并：把同一个群的多条待发消息按顺序拼接成一条，一次粘贴、一次回车
+    分隔模板可引用 {index}(下一条在本次合并中的序号，从1开始)；
+    单次合并受条数和字数上限约束，超出时另起一条，超长的单条消息原样单独发送
+    """
+
+    def __init__(self, separator: str = '\n\n', max_messages: int = 10, max_chars: int = 2000):
+        self.separator = separator
+        self.max_messages = max(1, max_messages)
+        self.max_chars = max_chars
+
+        # 统计
+        self.metrics = {
+            'messages': 0,
+            'sends': 0,
+            'sends_saved': 0
+        }
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'Coalescer':
+        return cls(config.get('separator', '\n\n'),
+                   config.get('max_messages', 10),
+                   config.get('max_chars', 2000))
+
+    def join(self, messages: List[str]) -> List[str]:
+        """把消息列表合并成尽量少的待发文本，保持原顺序"""
+        chunks: List[str] = []
+        current = ''
+        count = 0
+        for message in messages:
+            if count:
+                joined = current + self.separator.format(index=count + 1) + message
+                if count < self.max_messages and len(joined) <= self.max_chars:
+                    current = joined
+                    count += 1
+                    continue
+                chunks.append(current)
+            current, count = message, 1
+        if count:
+            chunks.append(current)
+
+        self.metrics['messages'] += len(messages)
+        self.metrics['sends'] += len(chunks)
+        self.metrics['sends_saved'] += len(messages) - len(chunks)
+        return chunks
+
+    def capacity(self, sends: int) -> int:
+        """允许 sends 次发送时最多可合并的消息条数(限速按发送次数计)"""
+        return max(1, sends) * self.max_messages
@@ -0,0 +1,153 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from journal import message_key
+from model import Notice
+
+logger = logging.getLogger("Dedup")
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dedup_store.txt')
+
+
+def dedup_key(data: Dict[str, Any], properties=None, mode: str = 'message_id') -> str:
+    """去重键：message_id 模式优先用 message_id，content 模式始终用内容哈希"""
+    if mode == 'content' and isinstance(data, Notice):
+        data = data.to_dict()
+    return message_key(data, None if mode == 'content' else properties)
+
+
+class DedupCache:
+    """
+    已完成消息的 LRU+TTL 去重缓存
+    内存条目数有上限，同时追加写入磁盘存储(每行: 键\\t过期时间)，重启后恢复未过期条目；
+    处理中的键另行登记，同键的第二份投递等第一份的结果，不会与之同时进入发送
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_PATH, ttl: float = 86400,
+                 max_entries: int = 100000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: 'OrderedDict[str, float]' = OrderedDict()
+        self.inflight: Dict[str, List[Callable[[bool], None]]] = {}  # 处理中的键 -> 等待其结果的回调
+        self._lock = threading.Lock()
+        self._file = None
+        self._lines = 0
+
+        # 统计
+        self.metrics = {
+            'hits': 0,
+            'misses': 0,
+            'inflight_hits': 0,
+            'evictions': 0
+        }
+
+        if path:
+            self._load()
+            self._file = open(path, 'a', encoding='utf-8')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        now = time.time()
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                self._lines += 1
+                key, _, expires = line.rstrip('\n').rpartition('\t')
+                try:
+                    expires_at = float(expires)
+                except ValueError:
+                    continue
+                if key and expires_at > now:
+                    self._put(key, expires_at)
+        logger.info(f"已加载去重缓存: {len(self.entries)} 条")
+
+    def _put(self, key: str, expires_at: float):
+        self.entries[key] = expires_at
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.metrics['evictions'] += 1
+
+    def _seen(self, key: str) -> bool:
+        expires_at = self.entries.get(key)
+        if expires_at is not None and expires_at > time.time():
+            self.entries.move_to_end(key)
+            self.metrics['hits'] += 1
+            return True
+        if expires_at is not None:
+            del self.entries[key]
+        self.metrics['misses'] += 1
+        return False
+
+    def seen(self, key: str) -> bool:
+        """是否为已完成消息的重复投递"""
+        with self._lock:
+            return self._seen(key)
+
+    def claim(self, key: str, waiter: Callable[[bool], None] = None) -> Optional[bool]:
+        """
+        处理前登记: True-由调用方处理，完成后须调用 release；False-已完成的重复投递；
+        None-同键消息正在处理中，waiter(ok) 在其 release 时回调
+        """
+        with self._lock:
+            if self._seen(key):
+                return False
+            waiters = self.inflight.get(key)
+            if waiters is None:
+                self.inflight[key] = []
+                return True
+            self.metrics['inflight_hits'] += 1
+            if waiter is not None:
+                waiters.append(waiter)
+            return None
+
+    def release(self, key: str, ok: bool):
+        """处理结束：成功时记录完成，再通知等待中的同键投递"""
+        if ok:
+            self.add(key)
+        with self._lock:
+            waiters = self.inflight.pop(key, ())
+        for waiter in waiters:
+            waiter(ok)
+
+    def add(self, key: str):
+        """记录已完成的消息"""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._put(key, expires_at)
+            if self._file:
+                self._file.write(f"{key}\t{expires_at:.0f}\n")
+                self._file.flush()
+                self._lines += 1
+                if self._lines > 2 * len(self.entries) + 1000:
+                    self._compact()
+
+    def _compact(self):
+        """重写磁盘存储，只保留内存中的未过期条目"""
+        now = time.time()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for key, expires_at in self.entries.items():
+                if expires_at > now:
+                    f.write(f"{key}\t{expires_at:.0f}\n")
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._lines = len(self.entries)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取命中统计"""
+        metrics = self.metrics.copy()
+        metrics['size'] = len(self.entries)
+        return metrics
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,263 @@
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import processer
+from model import Notice
+from session import ChatSession
+from waiter import ReadinessWaiter
+
+logger = logging.getLogger("Desktops")
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """一致性哈希环：每个桌面放 replicas 个虚拟节点，增删桌面时只有约 1/N 的群换桌面"""
+
+    def __init__(self, nodes=(), replicas: int = 64):
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._nodes: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str):
+        for i in range(self.replicas):
+            point = _hash(f"{node}#{i}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._nodes.insert(index, node)
+
+    def remove(self, node: str):
+        kept = [(point, name) for point, name in zip(self._points, self._nodes) if name != node]
+        self._points = [point for point, _ in kept]
+        self._nodes = [name for _, name in kept]
+
+    def node_for(self, key: str) -> str:
+        """键所属的节点"""
+        if not self._points:
+            raise LookupError("哈希环为空")
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._nodes[index]
+
+
+class DesktopSession:
+    """
+    同一进程内的一个桌面：独立的驱动、标定坐标、聊天会话和就绪等待器
+    界面操作在专属线程中串行执行，适用于可按实例区分屏幕的驱动(如无界面录制驱动)
+    """
+
+    in_process = True
+
+    def __init__(self, name: str, driver, components: Dict[str, Any],
+                 sender: Callable = None):
+        self.name = name
+        self.driver = driver
+        self.components = components
+        self.sender = sender or processer.process_group
+        self.session = ChatSession(ttl=processer.session_ttl, focus_probe=processer.focus_token)
+        self.waiter = ReadinessWaiter(driver.screenshot, clock=driver.now, sleep=driver.sleep)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"Desktop-{name}",
+                                            initializer=processer.bind_desktop, initargs=(self,))
+
+    def start(self):
+        pass
+
+    def submit(self, group: str, messages: List[str]) -> Future:
+        return self._executor.submit(self.sender, group, messages, self.components)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+class LimiterClient:
+    """桌面进程中的限速代理：每条消息发送前经管道向父进程申请一个令牌，全部桌面共用父进程的限速器"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def acquire(self, group: str):
+        self.conn.send(group)
+        self.conn.recv()
+
+
+def serve_tokens(conn, limiter: Callable[[], Any] = lambda: processer.rate_limiter):
+    """父进程中为一个桌面进程发放令牌的循环，管道关闭时退出；未配置限速时立即放行"""
+    while True:
+        try:
+            group = conn.recv()
+        except (EOFError, OSError):
+            return
+        rate_limiter = limiter()
+        if rate_limiter:
+            rate_limiter.acquire(group)
+        try:
+            conn.send(True)
+        except (BrokenPipeError, OSError):
+            return
+
+
+_display_state: Dict[str, Any] = {}
+
+
+def _init_display(display: str, profile: Optional[str], recalibrate: bool, tokens=None):
+    """桌面进程初始化：先设置 DISPLAY 再创建 pyautogui 驱动，并加载该显示的标定；限速改为向父进程申请令牌"""
+    os.environ['DISPLAY'] = display
+    if tokens is not None:
+        processer.set_rate_limiter(LimiterClient(tokens))
+    from calibration import load_components, profile_name
+    driver = processer.get_driver()
+    name = profile or f"{profile_name(driver)}{display}"
+    _display_state['components'] = load_components(driver, name=name, recalibrate=recalibrate)
+
+
+def _send_on_display(group: str, messages: List[str]):
+    processer.process_group(group, messages, _display_state['components'])
+
+
+def _ready() -> bool:
+    return True
+
+
+class DisplayProcess:
+    """
+    独立进程中的桌面：pyautogui 在导入时绑定 DISPLAY，同一进程无法驱动多个 X 显示，
+    因此每个显示一个进程；每条消息发送前向父进程申请令牌，群间隔和全局最小间隔对所有桌面生效
+    """
+
+    in_process = False
+
+    def __init__(self, display: str, profile: str = None, recalibrate: bool = False):
+        self.name = display
+        context = multiprocessing.get_context('spawn')
+        self._tokens, self._child_tokens = context.Pipe()
+        self._executor = ProcessPoolExecutor(
+            max_workers=1, mp_context=context,
+            initializer=_init_display, initargs=(display, profile, recalibrate, self._child_tokens)
+        )
+        self._token_thread = threading.Thread(target=serve_tokens, args=(self._tokens,),
+                                              name=f"Desktop-Tokens-{display}", daemon=True)
+
+    def start(self):
+        """启动进程并完成标定，多个显示依次进行，避免同时交互标定和并发写标定文件"""
+        self._token_thread.start()
+        self._executor.submit(_ready).result()
+        self._child_tokens.close()  # 子进程已持有副本，父进程关闭后子进程退出时令牌线程能读到 EOF
+        logger.info(f"桌面进程已就绪: {self.name}")
+
+    def submit(self, group: str, messages: List[str]) -> Future:
+        return self._executor.submit(_send_on_display, group, messages)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._tokens.close()
+
+
+def start_xvfb(display: str, screen: str = '1920x1080x24') -> subprocess.Popen:
+    """在指定显示号启动 Xvfb"""
+    if not shutil.which('Xvfb'):
+        raise RuntimeError("未找到 Xvfb")
+    process = subprocess.Popen(['Xvfb', display, '-screen', '0', screen, '-nolisten', 'tcp'],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(0.5)
+    if process.poll() is not None:
+        raise RuntimeError(f"Xvfb {display} 启动失败")
+    logger.info(f"Xvfb 已启动: {display} ({screen})")
+    return process
+
+
+class DesktopPool:
+    """
+    多桌面并行发送
+    按群名一致性哈希分配桌面，同一个群始终落在同一桌面以保留聊天复用；
+    不同桌面上的群真正并行发送，同一桌面上的群串行；限速在每条消息发送时由各桌面申请
+    """
+
+    def __init__(self, desktops: List[Any], replicas: int = 64, xvfb: List[subprocess.Popen] = None):
+        if not desktops:
+            raise ValueError("至少需要一个桌面")
+        self.desktops = {desktop.name: desktop for desktop in desktops}
+        self.ring = HashRing(self.desktops, replicas)
+        self.xvfb = xvfb or []
+
+        # 统计
+        self.metrics = {
+            'rounds': 0,
+            'groups': {name: 0 for name in self.desktops},
+            'failures': 0
+        }
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'DesktopPool':
+        """按显示列表创建桌面进程，配置 xvfb 时先为每个显示启动 Xvfb"""
+        xvfb = []
+        try:
+            if config.get('xvfb'):
+                xvfb = [start_xvfb(display, config.get('screen', '1920x1080x24'))
+                        for display in config['displays']]
+            profiles = config.get('profiles') or {}
+            desktops = [DisplayProcess(display, profiles.get(display), config.get('recalibrate', False))
+                        for display in config['displays']]
+        except Exception:
+            for process in xvfb:
+                process.terminate()
+            raise
+        return cls(desktops, config.get('replicas', 64), xvfb)
+
+    def start(self):
+        for desktop in self.desktops.values():
+            desktop.start()
+        logger.info(f"多桌面发送已启用: {', '.join(self.desktops)}")
+
+    def desktop_for(self, group: str):
+        """群所属的桌面"""
+        return self.desktops[self.ring.node_for(group)]
+
+    def send_groups(self, batches: Dict[str, List[str]]) -> Dict[str, Optional[Exception]]:
+        """并行发送多个群的消息，返回每个群的异常(成功为None)"""
+        futures = {}
+        for group, messages in batches.items():
+            desktop = self.desktop_for(group)
+            futures[group] = desktop.submit(group, messages)
+            self.metrics['groups'][desktop.name] += 1
+        self.metrics['rounds'] += 1
+
+        results: Dict[str, Optional[Exception]] = {}
+        for group, future in futures.items():
+            try:
+                future.result()
+                results[group] = None
+            except Exception as e:
+                self.metrics['failures'] += 1
+                results[group] = e
+        return results
+
+    def process(self, data: Notice, journal=None, key: str = None):
+        """把一条消息并行发往各群，跳过投递日志中已发送的群，任一群失败则抛出"""
+        groups = [group for group in data.groups if not (journal and journal.is_done(key, group))]
+        results = self.send_groups({group: [data.text] for group in groups})
+        errors = [error for error in results.values() if error is not None]
+        if journal:
+            for group, error in results.items():
+                if error is None:
+                    journal.record(key, group)
+            journal.flush()
+        if errors:
+            raise errors[0]
+
+    def close(self):
+        for desktop in self.desktops.values():
+            desktop.close()
+        for process in self.xvfb:
+            process.terminate()
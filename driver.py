@@ -0,0 +1,188 @@
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class UIDriver:
+    """界面驱动接口：点击、粘贴、组合键、按键和截图"""
+
+    def click(self, x: int, y: int):
+        raise NotImplementedError
+
+    def paste(self, text: str):
+        raise NotImplementedError
+
+    def hotkey(self, *keys: str):
+        raise NotImplementedError
+
+    def press(self, key: str):
+        raise NotImplementedError
+
+    def screenshot(self, region=None):
+        raise NotImplementedError
+
+    def position(self) -> Tuple[int, int]:
+        """当前鼠标位置"""
+        raise NotImplementedError
+
+    def active_title(self) -> Optional[str]:
+        """前台窗口标题，不支持时返回None"""
+        return None
+
+    def screen_info(self) -> Tuple[int, int, int]:
+        """屏幕分辨率和DPI: (宽, 高, dpi)"""
+        return 1920, 1080, 96
+
+    def now(self) -> float:
+        """驱动时钟，模拟驱动返回模拟时间"""
+        return time.monotonic()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+
+class PyAutoGUIDriver(UIDriver):
+    """基于 pyautogui/pyperclip 的真实桌面驱动"""
+
+    def __init__(self):
+        import pyautogui
+        import pyperclip
+
+        pyautogui.FAILSAFE = True
+        pyautogui.PAUSE = 0  # 不再全局等待，由就绪检测决定何时执行下一步
+        self.pyautogui = pyautogui
+        self.pyperclip = pyperclip
+
+    def click(self, x: int, y: int):
+        self.pyautogui.click(x, y)
+
+    def paste(self, text: str):
+        self.pyperclip.copy(text)
+        self.pyautogui.hotkey('ctrl', 'v')
+
+    def hotkey(self, *keys: str):
+        self.pyautogui.hotkey(*keys)
+
+    def press(self, key: str):
+        self.pyautogui.press(key)
+
+    def screenshot(self, region=None):
+        return self.pyautogui.screenshot(region=region)
+
+    def position(self) -> Tuple[int, int]:
+        return tuple(self.pyautogui.position())
+
+    def active_title(self) -> Optional[str]:
+        try:
+            return self.pyautogui.getActiveWindowTitle()
+        except Exception:
+            return None
+
+    def screen_info(self) -> Tuple[int, int, int]:
+        width, height = self.pyautogui.size()
+        dpi = 96
+        try:
+            import ctypes
+            dpi = ctypes.windll.user32.GetDpiForSystem()
+        except Exception:
+            pass
+        return width, height, dpi
+
+
+# 模拟驱动各动作的默认耗时(秒)
+DEFAULT_LATENCY = {
+    'click': 0.05,
+    'paste': 0.08,
+    'hotkey': 0.05,
+    'press': 0.03,
+    'screenshot': 0.01,
+    'render': 0.2  # 界面对动作作出反应所需时间
+}
+
+
+class HeadlessDriver(UIDriver):
+    """
+    无界面录制驱动
+    记录每个动作并按模拟耗时推进模拟时钟，不真正等待；
+    每个动作在 render 耗时后使屏幕帧变化，供就绪等待检测
+    """
+
+    def __init__(self, latency: Dict[str, float] = None, jitter: float = 0.0,
+                 seed: int = None, realtime: bool = False):
+        self.latency = {**DEFAULT_LATENCY, **(latency or {})}
+        self.jitter = jitter
+        self.realtime = realtime
+        self.random = random.Random(seed)
+        self.elapsed = 0.0
+        self.actions: List[Tuple[float, str, tuple]] = []
+        self.clipboard = ''
+        self.mouse = (0, 0)
+        self._frames: List[Tuple[float, int]] = [(0.0, 0)]
+
+    def _cost(self, action: str) -> float:
+        cost = self.latency.get(action, 0.0)
+        if self.jitter:
+            cost *= 1 + self.random.uniform(-self.jitter, self.jitter)
+        return cost
+
+    def _act(self, action: str, *args):
+        self.actions.append((self.elapsed, action, args))
+        self.sleep(self._cost(action))
+        if action != 'screenshot':
+            self._frames.append((self.elapsed + self._cost('render'), len(self.actions)))
+
+    def click(self, x: int, y: int):
+        self.mouse = (x, y)
+        self._act('click', x, y)
+
+    def paste(self, text: str):
+        self.clipboard = text
+        self._act('paste', text)
+
+    def hotkey(self, *keys: str):
+        self._act('hotkey', *keys)
+
+    def press(self, key: str):
+        self._act('press', key)
+
+    def screenshot(self, region=None):
+        self._act('screenshot', region)
+        frame = 0
+        for ready_at, version in reversed(self._frames):
+            if ready_at <= self.elapsed:
+                frame = version
+                break
+        return str(frame).encode()
+
+    def position(self) -> Tuple[int, int]:
+        return self.mouse
+
+    def active_title(self) -> Optional[str]:
+        return 'WeCom'
+
+    def now(self) -> float:
+        return self.elapsed
+
+    def sleep(self, seconds: float):
+        self.elapsed += seconds
+        if self.realtime:
+            time.sleep(seconds)
+
+    def count(self, action: str = None) -> int:
+        """已记录的动作数，screenshot 不计入界面动作"""
+        if action:
+            return sum(1 for _, name, _ in self.actions if name == action)
+        return sum(1 for _, name, _ in self.actions if name != 'screenshot')
+
+    def reset(self):
+        """清空记录和模拟时钟"""
+        self.elapsed = 0.0
+        self.actions = []
+        self._frames = [(0.0, 0)]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """动作统计"""
+        counts: Dict[str, int] = {}
+        for _, name, _ in self.actions:
+            counts[name] = counts.get(name, 0) + 1
+        return {'elapsed': self.elapsed, 'actions': counts}
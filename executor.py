@@ -0,0 +1,300 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from coalesce import Coalescer
+from journal import message_key
+from scheduler import GroupBatchScheduler
+from model import EXPIRED, SCHEDULED, Notice, Preempted, is_expired
+from timers import TimerHeap
+
+logger = logging.getLogger("GuiExecutor")
+
+_STOP = object()
+_STOP_URGENCY = (float('inf'), float('inf'))  # 停止标记排在所有积压之后
+
+
+class _Once:
+    """投递回调只生效一次：处理中途出错时补一次失败回调，不会与已经发生的确认重复"""
+
+    __slots__ = ('on_done', 'called')
+
+    def __init__(self, on_done: Callable):
+        self.on_done = on_done
+        self.called = False
+
+    def __call__(self, result):
+        if self.called:
+            return
+        self.called = True
+        self.on_done(result)
+
+
+class BacklogQueue(queue.PriorityQueue):
+    """按紧急程度出队的有界积压队列，条目为 (urgency, seq, data, properties, on_done)"""
+
+    def requeue(self, item):
+        """放回队列，不受容量限制、不阻塞(被抢占的投递、停止标记)"""
+        with self.not_empty:
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def head_urgency(self):
+        """队首的紧急程度，队列为空返回None"""
+        with self.mutex:
+            return self.queue[0][0] if self.queue else None
+
+
+class GuiExecutor:
+    """
+    单线程 GUI 执行器
+    连接线程只负责把投递放入有界队列，界面操作全部在专用线程中串行执行，
+    处理结果通过 on_done 回调交还(由调用方负责切回连接线程确认)；
+    配置定时堆时，未到 sendAt 的消息落盘后即确认，到期时与实时消息合并处理；
+    积压按优先级出队，同优先级按截止时间最早者先(EDF)，再按到达顺序；
+    启用抢占时，多群扇出在群边界发现有更高优先级的消息在等待则让出，剩余的群重新入队；
+    队列满时以 hold 方式提交的投递暂存在溢出队列中，执行线程腾出空位后按到达顺序补入
+    """
+
+    def __init__(self, handler: Callable = None, scheduler: GroupBatchScheduler = None,
+                 max_backlog: int = 200, low_water: int = 20, timers: TimerHeap = None,
+                 preempt: bool = True):
+        self.handler = handler
+        self.scheduler = scheduler
+        self.timers = timers
+        self.max_backlog = max_backlog
+        self.low_water = low_water
+        self.preempt = preempt
+        self.queue = BacklogQueue(maxsize=max_backlog)
+        self.overflow = deque()  # 队列满时暂存的投递，已预取未确认，不能退回代理
+        self._seq = itertools.count()
+        self.on_drain: Optional[Callable[[], None]] = None  # 积压降到低水位时回调
+        self.receipts = None  # 定时消息到期处理后的送达回执(原投递早已确认)
+        self.thread = None
+        self.running = False
+        self._busy = 0
+
+        # 统计
+        self.metrics = {
+            'submitted': 0,
+            'fired': 0,
+            'completed': 0,
+            'rejected': 0,
+            'held': 0,
+            'preempted': 0,
+            'max_backlog_seen': 0
+        }
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], handler: Callable = None,
+                    batch_sender: Callable = None, journal=None,
+                    rate_limiter=None, timers: TimerHeap = None,
+                    desktops=None) -> 'GuiExecutor':
+        """按消费者配置创建执行器，启用批量或合并时由调度器按群聚合发送"""
+        scheduler = None
+        batch_config = config.get('batch', {})
+        coalesce_config = config.get('coalesce', {})
+        if batch_sender and (batch_config.get('enabled') or coalesce_config.get('enabled')):
+            coalescer = None
+            window = batch_config.get('window', 1.0) if batch_config.get('enabled') else 0
+            if coalesce_config.get('enabled'):
+                coalescer = Coalescer.from_config(coalesce_config)
+                window = max(window, coalesce_config.get('window', 2.0))
+                logger.info(f"同群消息合并已启用: 每次最多 {coalescer.max_messages}条/{coalescer.max_chars}字")
+            scheduler = GroupBatchScheduler(
+                batch_sender,
+                window=window,
+                max_messages=batch_config.get('max_messages', 50),
+                journal=journal,
+                rate_limiter=rate_limiter,
+                desktops=desktops,
+                coalescer=coalescer
+            )
+            logger.info(f"批量调度已启用: 窗口 {window}秒, 上限 {scheduler.max_messages}条")
+        executor_config = config.get('executor', {})
+        return cls(handler, scheduler,
+                   max_backlog=executor_config.get('max_backlog', 200),
+                   low_water=executor_config.get('low_water', 20),
+                   timers=timers,
+                   preempt=config.get('priority', {}).get('preempt', True))
+
+    def start(self):
+        """启动执行线程"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="GUI-Executor", daemon=True)
+        self.thread.start()
+        logger.info("GUI执行器已启动")
+
+    def stop(self, timeout: float = 5):
+        """停止执行线程，缓冲中的批次会先发送完"""
+        if not self.running:
+            return
+        self.running = False
+        # 队列满时也要放入停止标记，否则执行线程要等积压降下来才会最后一次刷新批次
+        self.queue.requeue((_STOP_URGENCY, next(self._seq), _STOP, None, None))
+        if self.thread:
+            self.thread.join(timeout=timeout)
+        logger.info("GUI执行器已停止")
+
+    def backlog(self) -> int:
+        """本地积压: 队列中 + 溢出暂存 + 批次缓冲中 + 正在处理"""
+        pending = self.scheduler.pending_count() if self.scheduler else 0
+        return self.queue.qsize() + len(self.overflow) + pending + self._busy
+
+    def submit(self, data: Notice, properties, on_done: Callable, hold: bool = False) -> bool:
+        """非阻塞提交，队列已满时返回False；hold 为 True 时转入溢出队列等待空位，始终返回True"""
+        try:
+            self.queue.put_nowait((data.urgency, next(self._seq), data, properties, on_done))
+        except queue.Full:
+            if not hold:
+                self.metrics['rejected'] += 1
+                return False
+            self.overflow.append((data, properties, on_done))
+            self.metrics['held'] += 1
+        self.metrics['submitted'] += 1
+        self.metrics['max_backlog_seen'] = max(self.metrics['max_backlog_seen'], self.backlog())
+        return True
+
+    def _refill(self):
+        """把溢出暂存的投递补入已腾出的队列空位(执行线程)"""
+        while self.overflow:
+            data, properties, on_done = self.overflow[0]
+            try:
+                self.queue.put_nowait((data.urgency, next(self._seq), data, properties, on_done))
+            except queue.Full:
+                return
+            self.overflow.popleft()
+
+    def has_urgent(self, urgency) -> bool:
+        """队列中是否有比 urgency 优先级更高的消息在等待(同优先级不抢占，避免来回切换)"""
+        if not self.preempt:
+            return False
+        head = self.queue.head_urgency()
+        return head is not None and head[0] < urgency[0]
+
+    def _next_timeout(self) -> float:
+        timeout = 0.5
+        if self.scheduler and self.scheduler.pending_count():
+            remaining = self.scheduler.window - (time.monotonic() - self.scheduler.first_at)
+            timeout = max(0.0, remaining)
+        if self.timers is not None:
+            due_in = self.timers.next_due_in()
+            if due_in is not None:
+                timeout = min(timeout, due_in)
+        return timeout
+
+    def _handle(self, data, properties, on_done):
+        if self.timers is not None:
+            if is_expired(data):
+                logger.warning(f"消息已过 expireAt，丢弃: {message_key(data, properties)}")
+                on_done(EXPIRED)
+                return
+            if self.timers.defer(data, message_key(data, properties), properties):
+                on_done(SCHEDULED)
+                return
+        self._dispatch(data, properties, on_done)
+
+    def _fire_due(self):
+        """取出所有到期的定时消息并处理"""
+        while True:
+            due = self.timers.pop_due()
+            if due is None:
+                return
+            key, data, properties = due
+            fired_at = time.time()
+            if is_expired(data):
+                self.timers.expire(key)
+                self._report(key, data, properties, EXPIRED, fired_at)
+                continue
+            self.metrics['fired'] += 1
+
+            def on_done(result, key=key, data=data, properties=properties, fired_at=fired_at):
+                if result is None:
+                    self._retry_timer(key, data, properties, fired_at)
+                    return
+                self.timers.complete(key)
+                self._report(key, data, properties, result, fired_at)
+
+            try:
+                self._dispatch(data, properties, on_done)
+            except Exception as e:
+                logger.error(f"❌ 定时消息处理异常: {e}")
+                self._retry_timer(key, data, properties, fired_at)
+
+    def _retry_timer(self, key: str, data: Notice, properties, fired_at: float):
+        """定时消息发送失败：延后重试，超过重试上限已转入死信时发送最终回执"""
+        if not self.timers.reschedule(key):
+            self._report(key, data, properties, None, fired_at)
+
+    def _report(self, key: str, data: Notice, properties, result, received_at: float):
+        if self.receipts:
+            self.receipts.report(key, data.groups, self.receipts.status(result), properties, received_at)
+
+    def _dispatch(self, data, properties, on_done):
+        if self.scheduler:
+            if self.scheduler.submit(data, properties, on_done):
+                self.scheduler.flush(self.has_urgent)
+            return
+        try:
+            result = self.handler(data, properties) if self.handler else True
+        except Preempted as e:
+            # 已发送的群记在投递日志中，剩余的群按原紧急程度重新排队，确认留到全部发完
+            self.metrics['preempted'] += 1
+            logger.info(f"消息 {message_key(data, properties)} 被更高优先级的消息抢占，剩余 {len(e.remaining)} 个群")
+            remaining = data.with_groups(e.remaining)
+            self.queue.requeue((remaining.urgency, next(self._seq), remaining, properties, on_done))
+            return
+        except Exception as e:
+            logger.error(f"自定义处理器异常: {e}")
+            result = None
+        on_done(result)
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self._next_timeout())[2:]
+            except queue.Empty:
+                item = None
+
+            if item is not None and item[0] is _STOP:
+                break
+            self._refill()
+            if item is not None:
+                data, properties, on_done = item
+                settle = _Once(on_done)
+                self._busy = 1
+                try:
+                    self._handle(data, properties, settle)
+                except Exception as e:
+                    # 未确认的投递按失败回调(转入重试)，否则一直不确认，去重的处理中标记也不会释放
+                    logger.error(f"❌ GUI执行异常: {e}")
+                    settle(None)
+                finally:
+                    self._busy = 0
+                self.metrics['completed'] += 1
+
+            if self.timers is not None:
+                try:
+                    self._fire_due()
+                except Exception as e:
+                    logger.error(f"❌ 定时消息调度异常: {e}")
+
+            if self.scheduler and (self.scheduler.is_due() or
+                                   (self.queue.empty() and not self.running)):
+                try:
+                    self.scheduler.flush(self.has_urgent if self.running else None)
+                except Exception as e:
+                    logger.error(f"❌ 批量发送异常: {e}")
+
+            if self.on_drain and self.backlog() <= self.low_water:
+                self.on_drain()
+
+        if self.scheduler:
+            self.scheduler.flush()
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Set
+
+logger = logging.getLogger("Journal")
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'delivery_journal.jsonl')
+
+
+def message_key(data: Dict[str, Any], properties=None) -> str:
+    """消息唯一键：已解码的通知自带键；否则优先 message_id，再取内容哈希，重启后保持不变"""
+    key = getattr(data, 'key', None)
+    if key:
+        return key
+    message_id = getattr(properties, 'message_id', None) if properties is not None else None
+    if message_id:
+        return message_id
+    raw = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return 'sha1:' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class DeliveryJournal:
+    """
+    按(消息, 群)记录成功发送的追加式日志(JSONL)
+    重新投递时跳过已完成的群；写入批量 fsync，内存索引按 LRU 限制大小，
+    文件超过阈值时压缩，只保留保留期内的记录
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH,
+                 fsync_batch: int = 50,
+                 fsync_interval: float = 0.5,
+                 max_messages: int = 10000,
+                 retention: float = 86400,
+                 compact_lines: int = 50000):
+        self.path = path
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.max_messages = max_messages
+        self.retention = retention
+        self.compact_lines = compact_lines
+        self.index: 'OrderedDict[str, Dict[str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lines = 0
+        self._compact_at = compact_lines
+
+        self._load()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        """流式读取日志重建索引"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                self._lines += 1
+                try:
+                    entry = json.loads(line)
+                    self._index(entry['id'], entry['group'], entry['ts'])
+                except (ValueError, KeyError):
+                    continue  # 忽略崩溃时写了一半的行
+        logger.info(f"已加载投递日志: {len(self.index)} 条消息")
+
+    def _index(self, key: str, group: str, ts: float):
+        groups = self.index.get(key)
+        if groups is None:
+            groups = self.index[key] = {}
+            while len(self.index) > self.max_messages:
+                self.index.popitem(last=False)
+        else:
+            self.index.move_to_end(key)
+        groups[group] = ts
+
+    def is_done(self, key: str, group: str) -> bool:
+        """该消息是否已成功发送到该群"""
+        with self._lock:
+            groups = self.index.get(key)
+            return groups is not None and group in groups
+
+    def done_groups(self, key: str) -> Set[str]:
+        """该消息已完成的群"""
+        with self._lock:
+            return set(self.index.get(key, ()))
+
+    def sent_times(self, key: str) -> Dict[str, float]:
+        """该消息已完成的群及发送时刻"""
+        with self._lock:
+            return dict(self.index.get(key, ()))
+
+    def record(self, key: str, group: str):
+        """记录一次成功发送"""
+        ts = time.time()
+        with self._lock:
+            self._index(key, group, ts)
+            self._file.write(json.dumps({'id': key, 'group': group, 'ts': ts},
+                                        ensure_ascii=False) + '\n')
+            self._unsynced += 1
+            self._lines += 1
+            if (self._unsynced >= self.fsync_batch or
+                    time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
+        if self._lines >= self._compact_at:
+            self.compact()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def flush(self):
+        """落盘尚未 fsync 的记录，确认消息前调用"""
+        with self._lock:
+            if self._unsynced:
+                self._sync()
+
+    def compact(self):
+        """重写日志，只保留索引中且在保留期内的记录"""
+        cutoff = time.time() - self.retention
+        with self._lock:
+            for key in [key for key, groups in self.index.items()
+                        if max(groups.values()) < cutoff]:
+                del self.index[key]
+            tmp_path = self.path + '.tmp'
+            lines = 0
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for key, groups in self.index.items():
+                    for group, ts in groups.items():
+                        f.write(json.dumps({'id': key, 'group': group, 'ts': ts},
+                                           ensure_ascii=False) + '\n')
+                        lines += 1
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self._lines = lines
+            self._compact_at = max(self.compact_lines, lines * 2)
+            self._unsynced = 0
+        logger.info(f"投递日志已压缩: {lines} 条记录")
+
+    def close(self):
+        """落盘并关闭"""
+        self.flush()
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,59 @@
+import importlib
+import importlib.util
+import threading
+from typing import Dict
+
+# 可选依赖及其所属的附加依赖组，安装: pip install -r requirements-<extra>.txt
+OPTIONAL_EXTRAS: Dict[str, str] = {
+    'cv2': 'vision',
+    'numpy': 'vision',
+    'easyocr': 'vision',
+    'torch': 'vision',
+    'orjson': 'speedups',
+}
+
+
+class LazyModule:
+    """延迟导入门面：首次访问属性时才真正导入模块"""
+
+    def __init__(self, name: str, extra: str = None):
+        self._name = name
+        self._extra = extra or OPTIONAL_EXTRAS.get(name.split('.')[0])
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    try:
+                        self._module = importlib.import_module(self._name)
+                    except ImportError as e:
+                        hint = f"，请安装 requirements-{self._extra}.txt" if self._extra else ""
+                        raise ImportError(f"缺少可选依赖 {self._name}{hint}") from e
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        """是否已导入"""
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def lazy_import(name: str, extra: str = None) -> LazyModule:
+    """返回模块的延迟导入门面"""
+    return LazyModule(name, extra)
+
+
+def is_available(name: str) -> bool:
+    """可选依赖是否已安装，不会导入模块"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from calibration import fingerprint, fingerprint_distance, FINGERPRINT_TOLERANCE
+from driver import UIDriver
+from lazy import is_available, lazy_import
+from metrics import registry
+from waiter import Region
+
+cv2 = lazy_import('cv2')
+numpy = lazy_import('numpy')
+
+logger = logging.getLogger("Locator")
+
+DEFAULT_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+# 直接模板匹配的静态锚点；搜索结果和聊天标题内容会变化，按与搜索框的相对位置推算
+MATCHED_ANCHORS = ('search_area', 'msg_area')
+DERIVED_ANCHORS = {'choose_area': 'search_area', 'header_area': 'search_area'}
+TEMPLATE_SIZE = (96, 32)  # 锚点模板尺寸(宽, 高)
+ANCHOR_SEARCH = (240, 120)  # 在锚点周围该范围内(宽, 高)寻找纹理最丰富的截取位置
+MIN_TEXTURE = 12.0  # 模板灰度标准差下限，空白输入框等平坦区域的匹配得分不可信
+SCALES = (1.0, 0.9, 1.1, 0.8, 1.25, 0.75, 1.5)  # 缩放/DPI 变化时依次尝试的模板比例
+
+
+class LayoutNotFound(RuntimeError):
+    """截图中找不到界面锚点"""
+
+
+def to_gray(image):
+    """PIL 图像或数组转为灰度数组"""
+    if hasattr(image, 'convert'):
+        return numpy.asarray(image.convert('L'))
+    if image.ndim == 3:
+        return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    return image
+
+
+def texture(gray) -> float:
+    """区域纹理强度(灰度标准差)；TM_CCOEFF_NORMED 在平坦区域上到处都能得到高分"""
+    return float(gray.std()) if gray.size else 0.0
+
+
+def textured_crop(gray, point: Tuple[int, int], size: Tuple[int, int] = TEMPLATE_SIZE,
+                  search: Tuple[int, int] = ANCHOR_SEARCH, step: int = 8):
+    """
+    在锚点附近找纹理最丰富的模板截取框，返回 (模板, 锚点相对模板中心的偏移)
+    纹理相同时取离锚点最近的；附近全是平坦区域时返回None
+    """
+    width, height = size
+    x, y = int(point[0]), int(point[1])
+    best = None
+    for dy in range(-(search[1] // 2), search[1] // 2 + 1, step):
+        for dx in range(-(search[0] // 2), search[0] // 2 + 1, step):
+            left, top = x + dx - width // 2, y + dy - height // 2
+            if left < 0 or top < 0 or left + width > gray.shape[1] or top + height > gray.shape[0]:
+                continue
+            crop = gray[top:top + height, left:left + width]
+            rank = (texture(crop), -(dx * dx + dy * dy))
+            if best is None or rank > best[0]:
+                best = (rank, crop, (-dx, -dy))
+    if best is None or best[0][0] < MIN_TEXTURE:
+        return None
+    return best[1], best[2]
+
+
+class TemplateLocator:
+    """
+    多尺度模板匹配定位企业微信界面组件
+    搜索框和消息输入框匹配标定时在其附近截取的纹理最丰富的模板(空白输入框本身无法可靠匹配)，
+    再按保存的偏移换算回锚点；选中位置和聊天标题按与搜索框的相对位置推算；
+    上次命中的比例优先尝试，得分达到阈值即停止
+    """
+
+    def __init__(self, templates: Dict[str, Any], reference: Dict[str, Tuple[int, int]],
+                 threshold: float = 0.8, scales=SCALES, offsets: Dict[str, Tuple[int, int]] = None):
+        self.templates = templates
+        self.reference = reference
+        self.offsets = offsets or {}  # 锚点相对模板中心的偏移(按 1.0 比例)
+        self.threshold = threshold
+        self.scales = list(scales)
+        self._scaled: Dict[Tuple[str, float], Any] = {}
+        self._last_scale = {anchor: 1.0 for anchor in templates}
+
+    @staticmethod
+    def available() -> bool:
+        """模板匹配依赖是否已安装"""
+        return is_available('cv2') and is_available('numpy')
+
+    @classmethod
+    def load(cls, name: str, directory: str = DEFAULT_TEMPLATE_DIR, **kwargs) -> Optional['TemplateLocator']:
+        """读取命名配置的模板，不存在或模板过于平坦(旧版以锚点为中心截取的空白区域)时返回None"""
+        path = os.path.join(directory, name)
+        layout_path = os.path.join(path, 'layout.json')
+        if not os.path.exists(layout_path):
+            return None
+        with open(layout_path, encoding='utf-8') as f:
+            layout = json.load(f)
+        reference = {key: tuple(value) for key, value in layout['reference'].items()}
+        offsets = {key: tuple(value) for key, value in layout.get('offsets', {}).items()}
+        templates = {}
+        for anchor in MATCHED_ANCHORS:
+            # imdecode 兼容非ASCII路径
+            data = numpy.fromfile(os.path.join(path, f'{anchor}.png'), dtype=numpy.uint8)
+            templates[anchor] = cv2.imdecode(data, cv2.IMREAD_GRAYSCALE)
+            if texture(templates[anchor]) < MIN_TEXTURE:
+                logger.warning(f"界面模板 {name}/{anchor} 缺少纹理，无法可靠匹配，请重新标定")
+                return None
+        return cls(templates, reference, offsets=offsets, **kwargs)
+
+    @staticmethod
+    def save(name: str, screen, components: Dict[str, Any], directory: str = DEFAULT_TEMPLATE_DIR):
+        """从整屏截图截取锚点附近纹理最丰富的模板，连同锚点偏移和各锚点参考坐标保存"""
+        gray = to_gray(screen)
+        crops = {}
+        for anchor in MATCHED_ANCHORS:
+            crops[anchor] = textured_crop(gray, components[anchor])
+            if crops[anchor] is None:
+                raise LayoutNotFound(f"锚点附近没有可用于匹配的纹理: {anchor}")
+        path = os.path.join(directory, name)
+        os.makedirs(path, exist_ok=True)
+        for anchor, (template, _) in crops.items():
+            ok, encoded = cv2.imencode('.png', template)
+            if not ok:
+                raise RuntimeError(f"模板编码失败: {anchor}")
+            encoded.tofile(os.path.join(path, f'{anchor}.png'))
+        with open(os.path.join(path, 'layout.json'), 'w', encoding='utf-8') as f:
+            json.dump({'reference': {key: list(value) for key, value in components.items()},
+                       'offsets': {anchor: list(offset) for anchor, (_, offset) in crops.items()},
+                       'saved_at': time.strftime('%Y-%m-%d %H:%M:%S')}, f, ensure_ascii=False, indent=2)
+        logger.info(f"界面模板已保存: {path}")
+
+    def _template(self, anchor: str, scale: float):
+        key = (anchor, scale)
+        template = self._scaled.get(key)
+        if template is None:
+            template = self.templates[anchor]
+            if scale != 1.0:
+                template = cv2.resize(template, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            self._scaled[key] = template
+        return template
+
+    def match(self, gray, anchor: str) -> Optional[Tuple[float, float, float]]:
+        """在灰度图中查找锚点，返回(锚点x, 锚点y, 得分)，得分不足返回None"""
+        last = self._last_scale[anchor]
+        best = None
+        for scale in [last] + [scale for scale in self.scales if scale != last]:
+            template = self._template(anchor, scale)
+            height, width = template.shape[:2]
+            if height > gray.shape[0] or width > gray.shape[1]:
+                continue
+            result = cv2.matchTemplate(gray, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (left, top) = cv2.minMaxLoc(result)
+            if best is None or score > best[2]:
+                best = (left + width / 2, top + height / 2, score, scale)
+            if score >= self.threshold:
+                break
+        if best is None or best[2] < self.threshold:
+            return None
+        self._last_scale[anchor] = best[3]
+        dx, dy = self.offsets.get(anchor, (0, 0))
+        return best[0] + dx * best[3], best[1] + dy * best[3], best[2]
+
+    def locate(self, image, offset: Tuple[int, int] = (0, 0)) -> Dict[str, Tuple[int, int]]:
+        """在截图中定位全部组件，offset 为截图左上角的屏幕坐标；找不到时抛出 LayoutNotFound"""
+        gray = to_gray(image)
+        found: Dict[str, Tuple[int, int]] = {}
+        for anchor in MATCHED_ANCHORS:
+            hit = self.match(gray, anchor)
+            if hit is None:
+                raise LayoutNotFound(f"未找到界面锚点: {anchor}")
+            found[anchor] = (int(round(hit[0] + offset[0])), int(round(hit[1] + offset[1])))
+        for anchor, base in DERIVED_ANCHORS.items():
+            if anchor in self.reference:
+                dx = found[base][0] - self.reference[base][0]
+                dy = found[base][1] - self.reference[base][1]
+                found[anchor] = (self.reference[anchor][0] + dx, self.reference[anchor][1] + dy)
+        return found
+
+
+class LayoutTracker:
+    """
+    缓存界面布局，按需重新定位
+    定期(或发送失败后)用锚点小区域指纹做廉价检查，窗口移动或缩放后只在上次窗口区域附近重新匹配，
+    找不到时再搜整屏；定位结果原地更新组件坐标字典，所有引用方同步生效
+    """
+
+    def __init__(self, driver: UIDriver, locator: TemplateLocator, components: Dict[str, Any],
+                 check_interval: float = 30, margin: int = 200):
+        self.driver = driver
+        self.locator = locator
+        self.components = components
+        self.check_interval = check_interval
+        self.margin = margin
+        self.checked_at = time.monotonic()
+        self._force = False
+        self.fingerprints = self._fingerprints()
+
+        # 统计
+        self.metrics = registry.state('layout', {
+            'checks': 0,
+            'moves': 0,
+            'relocations': 0,
+            'full_screen': 0,
+            'failures': 0
+        })
+
+    def _fingerprints(self) -> Dict[str, List[int]]:
+        return {anchor: fingerprint(self.driver, self.components[anchor]) for anchor in MATCHED_ANCHORS}
+
+    def region(self) -> Region:
+        """上次已知的窗口区域：各锚点外接矩形向外扩展 margin"""
+        xs = [point[0] for point in self.components.values()]
+        ys = [point[1] for point in self.components.values()]
+        left, top = max(0, int(min(xs)) - self.margin), max(0, int(min(ys)) - self.margin)
+        return left, top, int(max(xs)) + self.margin - left, int(max(ys)) + self.margin - top
+
+    def invalidate(self):
+        """下次 ensure 时立即检查(如发送失败后)"""
+        self._force = True
+
+    def moved(self) -> bool:
+        """锚点附近的界面是否已变化"""
+        for anchor, expected in self.fingerprints.items():
+            if fingerprint_distance(fingerprint(self.driver, self.components[anchor]), expected) > FINGERPRINT_TOLERANCE:
+                return True
+        return False
+
+    def relocate(self) -> Dict[str, Tuple[int, int]]:
+        """重新定位并原地更新组件坐标"""
+        start = time.perf_counter()
+        region = self.region()
+        try:
+            found = self.locator.locate(self.driver.screenshot(region), offset=region[:2])
+        except LayoutNotFound:
+            self.metrics['full_screen'] += 1
+            found = self.locator.locate(self.driver.screenshot())
+        self.components.update(found)
+        self.fingerprints = self._fingerprints()
+        self.metrics['relocations'] += 1
+        registry.observe('locate', time.perf_counter() - start)
+        logger.info(f"界面已重新定位，耗时 {(time.perf_counter() - start) * 1000:.1f}毫秒: {found}")
+        return found
+
+    def ensure(self) -> bool:
+        """到检查时间或被标记时检查布局，移动过则重新定位；返回是否重新定位"""
+        now = time.monotonic()
+        if not self._force and now - self.checked_at < self.check_interval:
+            return False
+        self._force = False
+        self.checked_at = now
+        self.metrics['checks'] += 1
+        if not self.moved():
+            return False
+        self.metrics['moves'] += 1
+        try:
+            self.relocate()
+        except LayoutNotFound as e:
+            self.metrics['failures'] += 1
+            self._force = True
+            logger.error(f"界面重新定位失败: {e}")
+            raise
+        return True
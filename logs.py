@@ -0,0 +1,175 @@
+import copy
+import json
+import logging
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict
+
+from metrics import registry
+
+TEXT_FORMAT = '%(asctime)s.%(msecs)03d - %(name)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 通过 extra 传入、写入 JSON 日志的结构化字段
+EXTRA_FIELDS = ('message_id', 'group', 'stage', 'elapsed', 'groups', 'messages', 'sampled')
+
+# 高频日志的默认采样: 每 N 条输出 1 条，未列出的键不采样
+DEFAULT_SAMPLING = {
+    'receive': 10,  # 收到消息
+    'group': 10  # 每个群的打开/发送
+}
+
+# 统计
+stats = registry.state('logging', {
+    'enqueued': 0,
+    'dropped': 0,
+    'sampled_out': 0
+})
+
+
+def _json_default(value: Any) -> Any:
+    to_dict = getattr(value, 'to_dict', None)
+    return to_dict() if callable(to_dict) else str(value)
+
+
+class lazy_json:
+    """只在真正输出时才序列化的日志参数，支持带 to_dict 的对象(如 Notice)"""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __str__(self):
+        return json.dumps(self.value, ensure_ascii=False, indent=2, default=_json_default)
+
+
+def _snapshot(value: Any) -> Any:
+    """可变容器参数复制一份，入队后调用方再修改也不影响输出；其余参数原样保留"""
+    if isinstance(value, lazy_json):
+        return lazy_json(_snapshot(value.value))
+    if isinstance(value, (list, dict, set)):
+        try:
+            return copy.deepcopy(value)
+        except Exception:
+            return value
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录一行JSON，携带消息ID、群、阶段耗时等结构化字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'ts': f"{self.formatTime(record, DATE_FORMAT)}.{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for field in EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class Sampler:
+    """
+    高频日志采样，每个键每 N 条放行 1 条
+    在创建日志记录之前判断，被采样掉的日志不产生任何格式化或记录开销
+    """
+
+    def __init__(self, rates: Dict[str, int] = None):
+        self.rates = {**DEFAULT_SAMPLING, **(rates or {})}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> bool:
+        rate = self.rates.get(key, 1)
+        if rate <= 1:
+            return True
+        with self._lock:
+            count = self.counters.get(key, 0)
+            self.counters[key] = count + 1
+        if count % rate:
+            stats['sampled_out'] += 1
+            return False
+        return True
+
+
+_sampler = Sampler()
+
+
+def sampled(key: str) -> bool:
+    """该键的本条高频日志是否输出，用法: if sampled('group'): logger.info(...)"""
+    return _sampler.allow(key)
+
+
+def sample(key: str, **fields) -> Dict[str, Any]:
+    """构造高频日志的 extra 参数，记录采样率"""
+    fields['sampled'] = _sampler.rates.get(key, 1)
+    return fields
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    入队不阻塞的 QueueHandler：队列满时丢弃并计数，格式化和I/O都在后台监听线程中完成
+    入队时不预先格式化消息，只复制可变容器参数，并把异常堆栈渲染成文本(不让记录持有栈帧)
+    """
+
+    _exc_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if isinstance(record.args, tuple):
+            record.args = tuple(_snapshot(arg) for arg in record.args)
+        elif record.args:
+            record.args = _snapshot(record.args)
+        record.msg = _snapshot(record.msg)
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            stats['enqueued'] += 1
+        except queue.Full:
+            stats['dropped'] += 1
+
+
+def setup_logging(level: int = logging.INFO, fmt: str = 'text', queue_size: int = 10000,
+                  sampling: Dict[str, int] = None, stream=None) -> QueueListener:
+    """
+    配置根日志：调用线程只做采样判断和入队，格式化与输出由后台监听线程完成
+    返回监听器，退出前调用 stop() 刷出剩余日志
+    """
+    global _sampler
+    _sampler = Sampler(sampling)
+
+    # 日志格式不含线程/进程，关闭记录时的相关字段采集(只用公开开关，调用方位置照常记录)
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT, DATE_FORMAT))
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = QueueListener(queue_handler.queue, handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -1,7 +1,10 @@
 import pika
 import ssl
 import json
+import time
+import argparse
 import logging
+import random
 from typing import Optional, Callable
 import signal
 import sys
@@ -9,32 +12,61 @@ from datetime import datetime
 import threading
 from typing import Dict, Any
 from processer import *
+from executor import GuiExecutor
+from calibration import load_components, profile_name
+from locator import LayoutTracker, TemplateLocator
+from journal import DeliveryJournal, message_key
+from dedup import DedupCache, dedup_key, DEFAULT_PATH as DEDUP_PATH
+from retry import RetryPolicy
+from verify import ChatVerifier
+from model import InvalidNotice, Notice, Preempted, accepted, decode_notice
+from metrics import registry, start_http_server
+from ratelimit import RateLimiter
+from timers import TimerHeap, DEFAULT_PATH as SCHEDULE_PATH
+from workers import StageWorkerPool
+from desktops import DesktopPool
+from sources import build_sources, DEAD_LETTER_PATH, DEFAULT_SPOOL_PATH
+from receipts import ReceiptPublisher, receipt_status, DEFAULT_PATH as RECEIPT_PATH
+from logs import lazy_json, sample, sampled, setup_logging
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s.%(msecs)03d - %(name)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
 logger = logging.getLogger("RabbitMQ-SSL")
 
 
-def init_component_location():
-    print('准备确认消息框位置')
-    time.sleep(3)
-    msg_area = pyautogui.position()
-    print('准备搜索框位置')
-    time.sleep(3)
-    search_area = pyautogui.position()
-    print('准备确认选中聊天位置')
-    time.sleep(3)
-    choose_area = pyautogui.position()
-    return {'msg_area': msg_area,
-            'search_area': search_area,
-            'choose_area': choose_area, }
+class ResumableSSLContext(ssl.SSLContext):
+    """
+    记住最近一次握手的 TLS 会话，重连时复用以跳过完整握手
+    _last_socket 只对应一条连接，每条连接(消费、回执发布)须使用各自的上下文
+    """
+
+    resume_session = None
+    _last_socket = None
+
+    def wrap_socket(self, sock, *args, session=None, **kwargs):
+        ssl_sock = super().wrap_socket(sock, *args, session=session or self.resume_session, **kwargs)
+        self._last_socket = ssl_sock
+        return ssl_sock
+
+    def remember_session(self) -> bool:
+        """连接建立后调用：保存本次会话，返回本次握手是否复用了旧会话"""
+        sock = self._last_socket
+        if sock is None:
+            return False
+        try:
+            if sock.session is not None:
+                self.resume_session = sock.session
+            return sock.session_reused
+        except (OSError, ValueError, AttributeError):
+            return False
+
 
+def init_component_location(recalibrate: bool = False, profile: str = None):
+    """加载已存标定配置，校验失败或显式要求时才交互式标定"""
+    return load_components(get_driver(), name=profile, recalibrate=recalibrate)
 
-components = init_component_location()
+
+components = None
+journal = None
+desktops = None
 
 
 class SSLRabbitMQConsumer:
@@ -50,18 +82,148 @@ class SSLRabbitMQConsumer:
             'password': 'rabbitmq',
             'routing_key': '',  # 路由键
             'durable': True,
+            'ssl': {
+                'enabled': True,  # 5671 为 AMQPS 端口，连接明文端口时关闭
+                'ca_certs': None,  # CA 证书文件，为空时使用系统证书
+                'certfile': None,  # 客户端证书(双向认证时)
+                'keyfile': None,
+                'cert_reqs': ssl.CERT_REQUIRED,
+                'ssl_version': ssl.PROTOCOL_TLS_CLIENT
+            },
             'listener': {
                 'concurrency': 1,  # 初始并发数
                 'max_concurrency': 10,  # 最大并发数
-                'prefetch_count': 1  # QoS预取数量
+                'prefetch_count': 1,  # QoS预取数量(每个通道)
+                'scale_interval': 5,  # 按队列深度伸缩的检查间隔(秒)
+                'scale_step': 20  # 队列每积压该数量的消息增加一个消费通道
+            },
+
+            'batch': {
+                'enabled': False,  # 是否按群聚合批量发送
+                'window': 1.0,  # 缓冲窗口(秒)
+                'max_messages': 50  # 单批最大投递数
+            },
+
+            'coalesce': {
+                'enabled': False,  # 同群多条消息合并为一条发送(一次粘贴、一次回车)，全部来源消息一起确认
+                'window': 2.0,  # 收集窗口(秒)，与批量窗口取较大者
+                'max_messages': 10,  # 单次合并最多条数
+                'max_chars': 2000,  # 单次合并最多字数，超长的单条消息原样发送
+                'separator': '\n——————\n'  # 分隔模板，可引用 {index}(下一条的序号)
+            },
+
+            'dedup': {
+                'enabled': True,  # 已完成消息的重复投递直接确认
+                'key': 'message_id',  # message_id: 优先用消息ID, content: 内容哈希
+                'ttl': 86400,  # 去重保留时间(秒)
+                'max_entries': 100000,  # 内存条目上限
+                'path': DEDUP_PATH  # 持久化文件
+            },
+
+            'retry': {
+                'enabled': True,  # 失败消息经延迟队列重试，超过次数转入死信队列
+                'base_delay': 5,  # 首次重试延迟(秒)
+                'multiplier': 4,  # 每级延迟倍数
+                'levels': 4,  # 延迟队列级数
+                'max_attempts': 5  # 最大处理次数
+            },
+
+            'rate_limit': {
+                'enabled': True,  # 发送限速，防止企业微信限流或风控
+                'global_rate': 1.0,  # 全局每秒补充令牌数
+                'global_burst': 5,  # 全局突发上限
+                'group_rate': 0.2,  # 每群每秒补充令牌数
+                'group_burst': 3,  # 每群突发上限
+                'min_interval': 0.3  # 任意两次发送的最小间隔(秒)
+            },
+
+            'verify': {
+                'enabled': False,  # 选中群聊后 OCR 校验聊天标题，不一致则不发送(需 requirements-vision.txt)
+                'languages': ['ch_sim', 'en'],
+                'threshold': 0.8,  # 标题与群名的最低相似度
+                'budget': 0.3,  # 单次 OCR 推理耗时预算(秒)，超出时告警计数
+                'cache_size': 256,  # 按标题区域像素摘要缓存的识别结果数
+                'max_distance': 0,  # >0 时感知哈希距离在此以内的区域复用缓存(相近标题可能是另一个群，慎用)
+                'gpu': False
+            },
+
+            'timers': {
+                'enabled': True,  # 支持 sendAt/expireAt 定时发送
+                'retry_delay': 60,  # 定时消息发送失败后的重试延迟(秒)
+                'max_attempts': 5,  # 定时消息最多发送次数，仍失败则转入死信文件
+                'dead_letter': DEAD_LETTER_PATH,
+                'path': SCHEDULE_PATH  # 定时消息持久化文件
+            },
+
+            'priority': {
+                'max_priority': 0,  # 声明队列时的 x-max-priority，0 为不启用(已存在的队列改参数需先删除重建)
+                'preempt': True  # 多群扇出在群边界让位给更高优先级的消息
+            },
+
+            'executor': {
+                'max_backlog': 200,  # GUI执行队列容量
+                'high_water': 80,  # 本地积压达到该值时暂停消费
+                'low_water': 20  # 本地积压降到该值时恢复消费
+            },
+
+            'sources': {
+                'amqp': True,  # 从RabbitMQ队列消费；代理停机维护时可关闭，只用本地输入源
+                'spool': {
+                    'enabled': False,  # 流式读取 JSONL 假脱机文件，每行一条通知
+                    'path': DEFAULT_SPOOL_PATH,
+                    'checkpoint': None,  # 字节偏移检查点文件，默认为 <path>.offset
+                    'checkpoint_interval': 1.0,  # 持续读取时检查点最长写入间隔(秒)
+                    'poll_interval': 0.5,  # 读到文件末尾后的轮询间隔(秒)
+                    'max_line_bytes': 65536,  # 单行上限，超长行转入死信
+                    'max_inflight': 100  # 已读取未完成的行数上限
+                },
+                'http': {
+                    'enabled': False,  # 本地 HTTP 输入 POST /notices，单条或数组
+                    'host': '127.0.0.1',
+                    'port': 9109,
+                    'max_batch': 100,  # 单次请求最多通知数
+                    'max_body': 1048576,  # 请求体上限(字节)
+                    'retry_after': 1  # 429/503 响应的 Retry-After(秒)
+                },
+                'max_attempts': 5,  # 本地输入的最大处理次数
+                'retry_delay': 5,  # 首次重试延迟(秒)，之后每次加倍
+                'dead_letter': DEAD_LETTER_PATH  # 本地输入的死信文件(JSONL)
+            },
+
+            'receipts': {
+                'enabled': False,  # 每条消息处理完成后发布送达回执(各群状态、发送时刻、阶段耗时)
+                'exchange': '',  # 回执交换机，为空时只发往设置了 reply_to 的生产方
+                'exchange_type': 'direct',
+                'routing_key': 'receipt',
+                'use_reply_to': True,  # 消息带 reply_to 时优先发往该队列
+                'batch_size': 50,  # 凑够该条数立即发布
+                'flush_interval': 1.0,  # 最早的回执最多等待该时长(秒)
+                'max_pending': 10000,  # 内存队列上限，超出丢弃并计数
+                'compact_bytes': 1048576,  # 全部确认后缓冲文件超过该大小时清空
+                'reconnect_delay': 5,  # 发布连接断开后的重连间隔(秒)
+                'path': RECEIPT_PATH  # 未确认回执的磁盘缓冲
+            },
+
+            'metrics_http': {
+                'enabled': True,  # 本地指标服务 /metrics 与 /metrics.json
+                'host': '127.0.0.1',
+                'port': 9108
             },
 
             'connection': {
                 'heartbeat': 600,  # 心跳间隔(秒)
                 'blocked_connection_timeout': 300,  # 阻塞超时
-                'connection_attempts': 5,  # 连接尝试次数
+                'connection_attempts': 1,  # 单次连接尝试次数，重试由退避策略负责
                 'retry_delay': 5,  # 重试延迟
                 'socket_timeout': 10  # socket超时
+            },
+
+            'reconnect': {
+                'initial_delay': 0.1,  # 首次重连延迟(秒)，瞬断时快速恢复
+                'multiplier': 2,  # 每次失败延迟倍数
+                'max_delay': 30,  # 最大重连延迟(秒)
+                'jitter': 0.5,  # 随机抖动比例，避免多实例同时重连
+                'stable_after': 30  # 连接保持该时长后断开，退避从头开始(秒)
             }
         }
 
@@ -76,22 +238,46 @@ class SSLRabbitMQConsumer:
         self.should_reconnect = True
         self.reconnect_attempts = 0
         self.max_reconnect_attempts = 10
+        self.connected_at = None
+        self.disconnected_at = None  # 断线时刻，重连后收到首条消息时计算恢复耗时
+        self._ssl_contexts: Dict[str, Any] = {}  # 按连接用途各一个，进程内复用，重连时恢复各自的TLS会话
+        self._declared = set()  # 已声明的队列拓扑，每个进程只声明一次
+        self._lost_channels = set()  # 已提示过确认丢失的已关闭通道，每条断开的通道只警告一次
+        self._lost_connection = None  # 已提示过回调投递失败的已断开连接
 
         # 消费者相关
-        self.consumer_tag = None
+        self.channels = []  # 首个为主通道，其余为扩容通道
+        self.consumer_tags: Dict[int, str] = {}  # 通道号 -> 消费者标签
         self.message_handler = None
+        self.executor = None
+        self.workers = None
+        self.dedup = None
+        self.receipts = None
+        self.retry_policy = None
+        self._route_channel = None  # 失败路由专用的确认模式通道，随连接重建
+        self.queue_name = None
+        self.auto_ack = False
+        self._consuming = False
+        self._paused = False
+        self._io_thread = None
         self.active_consumers = 0
         self.max_consumers = self.default_config['listener']['max_concurrency']
 
-        # 统计
-        self.metrics = {
+        # 统计，存放在进程级注册表中，重连后不丢失
+        self.metrics = registry.state('consumer', {
             'messages_received': 0,
             'messages_processed': 0,
             'messages_failed': 0,
+            'messages_duplicate': 0,
+            'scale_ups': 0,
+            'scale_downs': 0,
             'connection_errors': 0,
+            'reconnects': 0,
+            'settles_lost': 0,
+            'tls_resumed': 0,
             'last_connection_time': None,
             'uptime_start': datetime.now()
-        }
+        })
 
     def _merge_config(self, config: Dict[str, Any]):
         """深度合并配置"""
@@ -105,25 +291,33 @@ class SSLRabbitMQConsumer:
 
         deep_update(self.default_config, config)
 
-    def _create_ssl_context(self) -> Optional[ssl.SSLContext]:
-        """创建SSL上下文"""
+    def _create_ssl_context(self, purpose: str = 'consumer') -> Optional[ssl.SSLContext]:
+        """创建SSL上下文，每种连接用途在进程内只创建一次，重连时复用"""
+        if purpose in self._ssl_contexts:
+            return self._ssl_contexts[purpose] or None
+        ssl_config = self.default_config.get('ssl') or {}
+        if not ssl_config.get('enabled', True):
+            self._ssl_contexts[purpose] = False
+            return None
         try:
-            ssl_context = ssl.create_default_context(
-                cafile=self.default_config['ssl']['ca_certs']
-            )
-
             # 设置协议版本
-            ssl_context.protocol = self.default_config['ssl']['ssl_version']
+            ssl_context = ResumableSSLContext(ssl_config.get('ssl_version', ssl.PROTOCOL_TLS_CLIENT))
+            if ssl_config.get('ca_certs'):
+                ssl_context.load_verify_locations(cafile=ssl_config['ca_certs'])
+            else:
+                ssl_context.load_default_certs(ssl.Purpose.SERVER_AUTH)
 
             # 设置证书验证
-            ssl_context.verify_mode = self.default_config['ssl']['cert_reqs']
+            cert_reqs = ssl_config.get('cert_reqs', ssl.CERT_REQUIRED)
+            if cert_reqs == ssl.CERT_NONE:
+                ssl_context.check_hostname = False
+            ssl_context.verify_mode = cert_reqs
 
             # 加载客户端证书（如果提供）
-            if (self.default_config['ssl']['certfile'] and
-                    self.default_config['ssl']['keyfile']):
+            if ssl_config.get('certfile') and ssl_config.get('keyfile'):
                 ssl_context.load_cert_chain(
-                    certfile=self.default_config['ssl']['certfile'],
-                    keyfile=self.default_config['ssl']['keyfile']
+                    certfile=ssl_config['certfile'],
+                    keyfile=ssl_config['keyfile']
                 )
 
             # 禁用不安全的协议
@@ -132,11 +326,47 @@ class SSLRabbitMQConsumer:
             ssl_context.options |= ssl.OP_NO_TLSv1
             ssl_context.options |= ssl.OP_NO_TLSv1_1
 
+            self._ssl_contexts[purpose] = ssl_context
             return ssl_context
         except Exception as e:
             logger.error(f"创建SSL上下文失败: {e}")
+            self._ssl_contexts[purpose] = False  # 配置不变，重连时不再重复尝试
             return None
 
+    def open_connection(self, purpose: str = 'consumer'):
+        """按用途建立连接，返回 (连接, 是否复用了TLS会话)；同一用途的连接只在一个线程中依次建立"""
+        connection = pika.BlockingConnection(self.connection_parameters(purpose))
+        ssl_context = self._ssl_contexts.get(purpose)
+        resumed = isinstance(ssl_context, ResumableSSLContext) and ssl_context.remember_session()
+        return connection, resumed
+
+    def connection_parameters(self, purpose: str = 'consumer'):
+        """连接参数(含SSL)，消费连接和回执发布连接的参数相同，SSL上下文按用途分开"""
+        # 创建SSL上下文
+        ssl_context = self._create_ssl_context(purpose)
+        ssl_options = None
+        if ssl_context:
+            ssl_options = pika.SSLOptions(ssl_context, self.default_config['host'])
+
+        # 连接参数
+        credentials = pika.PlainCredentials(
+            username=self.default_config['username'],
+            password=self.default_config['password']
+        )
+
+        return pika.ConnectionParameters(
+            host=self.default_config['host'],
+            port=self.default_config['port'],
+            virtual_host=self.default_config['virtual_host'],
+            credentials=credentials,
+            heartbeat=self.default_config['connection']['heartbeat'],
+            blocked_connection_timeout=self.default_config['connection']['blocked_connection_timeout'],
+            connection_attempts=self.default_config['connection']['connection_attempts'],
+            retry_delay=self.default_config['connection']['retry_delay'],
+            socket_timeout=self.default_config['connection']['socket_timeout'],
+            ssl_options=ssl_options
+        )
+
     def connect(self) -> bool:
         """建立SSL连接"""
         try:
@@ -145,44 +375,31 @@ class SSLRabbitMQConsumer:
             logger.info(f"虚拟主机: {self.default_config['virtual_host']}")
             logger.info(f"用户名: {self.default_config['username']}")
 
-            # 创建SSL上下文
-            ssl_context = self._create_ssl_context()
-            ssl_options = None
-            if ssl_context:
-                ssl_options = pika.SSLOptions(ssl_context, self.default_config['host'])
-
-            # 连接参数
-            credentials = pika.PlainCredentials(
-                username=self.default_config['username'],
-                password=self.default_config['password']
-            )
-
-            parameters = pika.ConnectionParameters(
-                host=self.default_config['host'],
-                port=self.default_config['port'],
-                virtual_host=self.default_config['virtual_host'],
-                credentials=credentials,
-                heartbeat=self.default_config['connection']['heartbeat'],
-                blocked_connection_timeout=self.default_config['connection']['blocked_connection_timeout'],
-                connection_attempts=self.default_config['connection']['connection_attempts'],
-                retry_delay=self.default_config['connection']['retry_delay'],
-                socket_timeout=self.default_config['connection']['socket_timeout'],
-                ssl_options=ssl_options
-            )
-
-            # 建立连接
-            self.connection = pika.BlockingConnection(parameters)
+            # 建立连接，先丢弃断开的旧连接
+            if self.connection and self.connection.is_open:
+                try:
+                    self.connection.close()
+                except Exception:
+                    pass
+            self.connection, resumed = self.open_connection('consumer')
+            if resumed:
+                self.metrics['tls_resumed'] += 1
             self.channel = self.connection.channel()
+            self._route_channel = None
 
             # 设置QoS
             self.channel.basic_qos(
                 prefetch_count=self.default_config['listener']['prefetch_count']
             )
+            self.channels = [self.channel]
+            self.consumer_tags = {}
+            self._lost_channels.clear()
 
             self.is_connected = True
-            self.reconnect_attempts = 0
+            self.connected_at = time.monotonic()
             self.metrics['last_connection_time'] = datetime.now()
-            self.metrics['connection_errors'] = 0
+            if self.disconnected_at is not None:
+                self.metrics['reconnects'] += 1
 
             logger.info("✅ SSL连接成功建立")
             logger.info(f"心跳: {self.default_config['connection']['heartbeat']}秒")
@@ -226,6 +443,9 @@ class SSLRabbitMQConsumer:
                 #     'x-dead-letter-routing-key': f'dlx.{queue_name}'  # 死信路由键
                 # }
             }
+            max_priority = self.default_config['priority']['max_priority']
+            if max_priority:
+                queue_args['arguments'] = {'x-max-priority': max_priority}  # 代理按 properties.priority 优先投递
             queue_args.update(kwargs)
 
             result = self.channel.queue_declare(**queue_args)
@@ -279,51 +499,303 @@ class SSLRabbitMQConsumer:
             logger.error(f"队列绑定失败: {e}")
             return False
 
+    def _fail(self, ch, method, properties, body, message_id: str, reason: str, retry: bool = True):
+        """处理失败：启用延迟重试时转入延迟队列或死信队列后确认，否则退回代理"""
+        self.metrics['messages_failed'] += 1
+        if self.retry_policy:
+            try:
+                target = self.retry_policy.route(self._confirm_channel(), properties, body, reason, retry)
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+                logger.warning("⚠️ 消息处理失败(%s)，转入 %s: %s", reason, target, message_id,
+                               extra={'message_id': message_id})
+                return
+            except Exception as e:
+                logger.error(f"失败消息路由异常: {e}")
+        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=retry)
+        logger.warning("⚠️ 消息处理失败(%s)%s: %s", reason, '(重试)' if retry else '(丢弃)', message_id,
+                       extra={'message_id': message_id})
+
+    def _confirm_channel(self):
+        """失败路由用的确认模式通道，转发经代理确认后才确认原消息；连接重建后重新打开"""
+        if self._route_channel is None or not self._route_channel.is_open:
+            self._route_channel = self.connection.channel()
+            self._route_channel.confirm_delivery()
+        return self._route_channel
+
+    def _settle(self, ch, method, properties, body, message_id: str, result, elapsed: float = None):
+        """根据处理结果确认投递: True/已转定时/已过期-确认, False-丢弃, None-重试"""
+        if accepted(result):
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            self.metrics['messages_processed'] += 1
+            logger.info("✅ 消息处理成功%s: %s", '' if result is True else f'({result})', message_id,
+                        extra={'message_id': message_id, 'stage': 'message', 'elapsed': elapsed})
+        elif result is False:
+            self._fail(ch, method, properties, body, message_id, '处理器拒绝', retry=False)
+        else:  # None或其他
+            self._fail(ch, method, properties, body, message_id, '处理器要求重试')
+
     def on_message_callback(self, ch, method, properties, body):
-        """消息处理回调"""
+        """消息处理回调(连接线程)：计数后交给阶段线程池，未配置线程池时就地处理"""
         message_id = properties.message_id or f"msg_{self.metrics['messages_received']}"
         self.metrics['messages_received'] += 1
 
-        logger.info(f"📨 收到消息 [ID: {message_id}]")
+        if sampled('receive'):
+            logger.info("📨 收到消息 [ID: %s]", message_id, extra=sample('receive', message_id=message_id))
+        received_at = time.perf_counter()
+        if self.disconnected_at is not None:
+            registry.observe('reconnect', time.monotonic() - self.disconnected_at)
+            self.disconnected_at = None
+        if properties.timestamp:
+            registry.observe('broker_wait', max(0.0, time.time() - properties.timestamp))
+
+        if self.workers:
+            self.workers.submit(self._process_delivery, ch, method, properties, body, message_id, received_at)
+        else:
+            self._process_delivery(ch, method, properties, body, message_id, received_at)
 
+    def _process_delivery(self, ch, method, properties, body, message_id: str, received_at: float):
+        """解码、校验、去重后交给GUI执行器；可在阶段线程中并行执行，通道操作切回连接线程"""
+        decode_start = time.perf_counter()
+        if self.workers:
+            registry.observe('stage_wait', decode_start - received_at)
         try:
-            # 解析消息
-            message_data = json.loads(body.decode('utf-8'))
-            logger.debug(f"消息内容: {json.dumps(message_data, ensure_ascii=False, indent=2)}")
+            # 从字节直接解码并校验，之后整条流水线只传递 Notice；畸形消息直接进死信队列
+            try:
+                message_data = decode_notice(body, properties)
+            except InvalidNotice as e:
+                invalid = str(e)
+                logger.error("❌ 消息非法: %s", invalid, extra={'message_id': message_id})
+                logger.debug("原始消息: %r...", body[:500])  # 只记录前500字符
+                if self.receipts:
+                    self.receipts.report(message_id, (), 'invalid', properties, time.time(), error=invalid)
+                self._settle_threadsafe(ch, message_id, lambda: self._fail(
+                    ch, method, properties, body, message_id, invalid, retry=False))
+                return
+            registry.observe('json_decode', time.perf_counter() - decode_start)
+            logger.debug("消息内容: %s", lazy_json(message_data), extra={'message_id': message_id})
+
+            # 去重：已完成消息的重复投递直接确认，不触碰界面
+            key = dedup_key(message_data, properties, self.default_config['dedup']['key'])
+            if not properties.message_id:
+                message_id = key
+
+            def ack_duplicate():
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+                self.metrics['messages_duplicate'] += 1
+                logger.info("♻️ 重复消息，直接确认: %s", message_id, extra={'message_id': message_id})
+
+            def after_inflight(ok):
+                # 同键的另一份投递处理完成：成功则按重复确认，失败则本份走重试，不与之并发发送
+                if ok:
+                    if self.receipts:
+                        self.receipts.report(key, message_data.groups, 'duplicate', properties, time.time())
+                    self._settle_threadsafe(ch, message_id, ack_duplicate)
+                else:
+                    self._settle_threadsafe(ch, message_id, lambda: self._fail(
+                        ch, method, properties, body, message_id, '同键消息处理失败'))
+
+            claimed = self.dedup.claim(key, after_inflight) if self.dedup else True
+            if claimed is None:
+                logger.info("♻️ 同键消息正在处理，等待其结果: %s", message_id, extra={'message_id': message_id})
+                return
+            if claimed is False:
+                if self.receipts:
+                    self.receipts.report(key, message_data.groups, 'duplicate', properties, time.time())
+                self._settle_threadsafe(ch, message_id, ack_duplicate)
+                return
 
-            # 处理消息
-            if self.message_handler:
+            def settle(result):
+                elapsed = time.perf_counter() - received_at
+                registry.observe('message', elapsed)
+                registry.observe_priority('message', message_data.priority, elapsed)
+                self._settle(ch, method, properties, body, message_id, result, round(elapsed, 4))
+
+            def done(result):
+                # 先记录完成再确认：确认前连接断开时，重新投递会被去重直接确认而不会重复发送
+                if self.dedup:
+                    self.dedup.release(key, accepted(result))
+                if self.receipts:
+                    self.receipts.report(key, message_data.groups, receipt_status(result), properties,
+                                         time.time() - (time.perf_counter() - received_at))
+                self._settle_threadsafe(ch, message_id, lambda: settle(result))
+
+            # 处理消息；已预取的投递在执行队列满时暂存本地，退回代理会立即重新投递形成空转
+            if self.executor:
+                self.executor.submit(message_data, properties, done, hold=True)
+                if self.executor.backlog() >= self.default_config['executor']['high_water']:
+                    self._threadsafe(self._pause_consuming)
+            elif self.message_handler:
                 try:
                     result = self.message_handler(message_data, properties)
-                    if result is True:
-                        ch.basic_ack(delivery_tag=method.delivery_tag)
-                        self.metrics['messages_processed'] += 1
-                        logger.info(f"✅ 消息处理成功: {message_id}")
-                    elif result is False:
-                        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
-                        self.metrics['messages_failed'] += 1
-                        logger.warning(f"❌ 消息处理失败(丢弃): {message_id}")
-                    else:  # None或其他
-                        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-                        logger.warning(f"⚠️ 消息处理失败(重试): {message_id}")
                 except Exception as e:
-                    logger.error(f"自定义处理器异常: {e}")
-                    ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+                    logger.error("自定义处理器异常: %s", e, extra={'message_id': message_id})
+                    result = None
+                done(result)
             else:
                 # 无处理器，直接确认
-                ch.basic_ack(delivery_tag=method.delivery_tag)
-                self.metrics['messages_processed'] += 1
-                logger.info(f"✅ 消息自动确认: {message_id}")
-
-        except json.JSONDecodeError as e:
-            logger.error(f"❌ JSON解析失败: {e}")
-            logger.debug(f"原始消息: {body[:500]}...")  # 只记录前500字符
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
-            self.metrics['messages_failed'] += 1
+                def auto_ack():
+                    ch.basic_ack(delivery_tag=method.delivery_tag)
+                    self.metrics['messages_processed'] += 1
+                    logger.info("✅ 消息自动确认: %s", message_id, extra={'message_id': message_id})
+
+                self._settle_threadsafe(ch, message_id, auto_ack)
+
         except Exception as e:
-            logger.error(f"❌ 消息处理异常: {e}")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-            self.metrics['messages_failed'] += 1
+            logger.error("❌ 消息处理异常: %s", e, extra={'message_id': message_id})
+            reason = str(e)
+            self._settle_threadsafe(ch, message_id, lambda: self._fail(
+                ch, method, properties, body, message_id, reason))
+
+    def _threadsafe(self, callback: Callable):
+        """在连接线程执行回调：已在连接线程时直接执行，否则投递到连接的回调队列"""
+        if threading.get_ident() == self._io_thread:
+            callback()
+            return
+        connection = self.connection
+        try:
+            connection.add_callback_threadsafe(callback)
+        except Exception as e:
+            # 断线到重连之间每个完成的投递都会失败，同一连接只报一次错
+            if connection is self._lost_connection:
+                logger.debug(f"连接线程回调投递失败: {e}")
+                return
+            self._lost_connection = connection
+            logger.error(f"连接线程回调投递失败(该连接后续不再逐条提示): {e}")
+
+    def _settle_threadsafe(self, ch, message_id: str, settle: Callable):
+        """从GUI线程或阶段线程把确认切回连接线程执行"""
+        def callback():
+            if ch.is_open:
+                settle()
+                return
+            # 断线时在途的投递都会走到这里，同一通道只警告一次，其余记为调试日志
+            self.metrics['settles_lost'] += 1
+            if ch in self._lost_channels:
+                logger.debug("通道已关闭，消息将由代理重新投递: %s", message_id, extra={'message_id': message_id})
+                return
+            self._lost_channels.add(ch)
+            logger.warning("通道已关闭，该通道上未确认的消息将由代理重新投递(不再逐条提示): %s", message_id,
+                           extra={'message_id': message_id})
+
+        self._threadsafe(callback)
+
+    def _consume(self, channel):
+        """在通道上注册消费者"""
+        self.consumer_tags[channel.channel_number] = channel.basic_consume(
+            queue=self.queue_name,
+            on_message_callback=self.on_message_callback,
+            auto_ack=self.auto_ack
+        )
+
+    def _cancel(self, channel):
+        """取消通道上的消费者，通道保持打开，已收到未确认的投递照常确认"""
+        consumer_tag = self.consumer_tags.pop(channel.channel_number, None)
+        if consumer_tag and channel.is_open:
+            channel.basic_cancel(consumer_tag)
+
+    def _scale_to(self, consumers: int):
+        """
+        调整消费通道数(连接线程)
+        缩容只取消消费者而不关闭通道，避免已预取未确认的消息被代理重新投递
+        """
+        listener = self.default_config['listener']
+        consumers = min(listener['max_concurrency'], max(listener['concurrency'], consumers))
+        while len(self.channels) < consumers:
+            channel = self.connection.channel()
+            channel.basic_qos(prefetch_count=listener['prefetch_count'])
+            self.channels.append(channel)
+        self.active_consumers = consumers
+
+        for index, channel in enumerate(self.channels):
+            if not channel.is_open:
+                continue
+            consuming = channel.channel_number in self.consumer_tags
+            if index < consumers and not consuming and not self._paused:
+                self._consume(channel)
+            elif index >= consumers and consuming:
+                self._cancel(channel)
+
+        if self.workers:
+            self.workers.resize(consumers)
+
+    def _autoscale(self):
+        """按代理队列深度与本地积压伸缩消费通道，GUI积压超过高水位时不扩容"""
+        if not self._consuming or not self.connection.is_open:
+            return
+        listener = self.default_config['listener']
+        try:
+            depth = self.channel.queue_declare(queue=self.queue_name, passive=True).method.message_count
+            backlog = self.executor.backlog() if self.executor else 0
+            pending = self.workers.pending() if self.workers else 0
+
+            if backlog >= self.default_config['executor']['high_water']:
+                desired = listener['concurrency']
+            else:
+                desired = listener['concurrency'] + -(-(depth + pending) // max(1, listener['scale_step']))
+            if desired < self.active_consumers:
+                desired = self.active_consumers - 1  # 逐级缩容，避免抖动
+
+            if desired != self.active_consumers:
+                previous = self.active_consumers
+                self._scale_to(desired)
+                if self.active_consumers != previous:
+                    self.metrics['scale_ups' if self.active_consumers > previous else 'scale_downs'] += 1
+                    logger.info(f"🔀 消费通道 {previous} -> {self.active_consumers} "
+                                f"(队列深度 {depth}, 阶段排队 {pending}, GUI积压 {backlog})")
+        except Exception as e:
+            logger.error(f"自动伸缩失败: {e}")
+        finally:
+            if self._consuming and self.connection.is_open:
+                self.connection.call_later(listener['scale_interval'], self._autoscale)
+
+    def _pause_consuming(self):
+        """本地积压超过高水位，暂停所有通道的消费"""
+        if self._paused or not self.consumer_tags:
+            return
+        try:
+            for channel in self.channels:
+                self._cancel(channel)
+            self._paused = True
+            logger.info(f"⏸️ 本地积压 {self.executor.backlog()}，暂停消费")
+        except Exception as e:
+            logger.error(f"暂停消费失败: {e}")
+
+    def _resume_consuming(self):
+        """本地积压降到低水位，恢复消费"""
+        if not self._paused or not self._consuming or not self.channel.is_open:
+            return
+        try:
+            self._paused = False
+            for channel in self.channels[:self.active_consumers]:
+                if channel.is_open and channel.channel_number not in self.consumer_tags:
+                    self._consume(channel)
+            logger.info(f"▶️ 本地积压 {self.executor.backlog()}，恢复消费")
+        except Exception as e:
+            logger.error(f"恢复消费失败: {e}")
+
+    def _on_executor_drain(self):
+        """GUI线程回调：积压降到低水位时请求连接线程恢复消费"""
+        if self._paused and self.connection and self.connection.is_open:
+            self._threadsafe(self._resume_consuming)
+
+    def set_dedup(self, dedup: DedupCache):
+        """设置去重缓存"""
+        self.dedup = dedup
+
+    def set_executor(self, executor: GuiExecutor):
+        """设置GUI执行器，消息处理移出连接线程"""
+        self.executor = executor
+        executor.on_drain = self._on_executor_drain
+        logger.info("GUI执行器已设置")
+
+    def set_receipts(self, receipts: ReceiptPublisher):
+        """设置送达回执发布器，每条消息处理完成后提交回执"""
+        self.receipts = receipts
+
+    def set_workers(self, workers: StageWorkerPool):
+        """设置阶段线程池，GUI之前的各阶段并行执行"""
+        self.workers = workers
+        logger.info("阶段线程池已设置")
 
     def set_message_handler(self, handler: Callable):
         """设置消息处理器"""
@@ -337,24 +809,36 @@ class SSLRabbitMQConsumer:
             return
 
         try:
-            # 声明队列
-            if not self.declare_queue(queue_name):
-                logger.error(f"队列 {queue_name} 声明失败")
-                return
+            # 队列拓扑每个进程只声明一次，重连后直接消费
+            if queue_name not in self._declared:
+                # 声明队列
+                if not self.declare_queue(queue_name):
+                    logger.error(f"队列 {queue_name} 声明失败")
+                    return
+
+                # 声明延迟重试队列
+                retry_config = self.default_config['retry']
+                if retry_config.get('enabled'):
+                    self.retry_policy = RetryPolicy.from_config(queue_name, retry_config)
+                    self.retry_policy.declare(self.channel, self.default_config.get('durable', True))
+                self._declared.add(queue_name)
+
+            # 按初始并发数启动消费者，之后定时伸缩
+            listener = self.default_config['listener']
+            self.queue_name = queue_name
+            self.auto_ack = auto_ack
+            self._io_thread = threading.get_ident()
+            self._consuming = True
+            self._scale_to(listener['concurrency'])
+            if listener['max_concurrency'] > listener['concurrency']:
+                self.connection.call_later(listener['scale_interval'], self._autoscale)
 
-            # 启动消费者
-            self.consumer_tag = self.channel.basic_consume(
-                queue=queue_name,
-                on_message_callback=self.on_message_callback,
-                auto_ack=auto_ack
-            )
-
-            self.active_consumers += 1
             logger.info(f"🚀 开始消费队列: {queue_name}")
             logger.info(f"   并发消费者数: {self.active_consumers}/{self.max_consumers}")
 
-            # 开始消费
-            self.channel.start_consuming()
+            # 开始消费，暂停期间仍处理心跳和确认回调
+            while self._consuming and self.connection.is_open:
+                self.connection.process_data_events(time_limit=1)
 
         except pika.exceptions.ConnectionClosedByBroker:
             logger.warning("连接被代理关闭")
@@ -366,28 +850,53 @@ class SSLRabbitMQConsumer:
         except Exception as e:
             logger.error(f"消费过程异常: {e}")
         finally:
+            lost = self._consuming  # 未主动停止而退出，说明连接已断开
             self.stop_consuming()
+            if lost:
+                self._on_connection_lost()
+
+    def _on_connection_lost(self):
+        """记录断线时刻；连接已稳定运行足够久时，退避从头开始"""
+        self.is_connected = False
+        self.disconnected_at = time.monotonic()
+        if (self.connected_at is not None and
+                self.disconnected_at - self.connected_at >= self.default_config['reconnect']['stable_after']):
+            self.reconnect_attempts = 0
+        logger.warning("连接已断开，准备重连")
+
+    def next_backoff(self) -> float:
+        """下一次重连前的等待时间：首次快速重试，之后指数退避并加随机抖动"""
+        config = self.default_config['reconnect']
+        delay = min(config['max_delay'],
+                    config['initial_delay'] * config['multiplier'] ** self.reconnect_attempts)
+        self.reconnect_attempts += 1
+        return delay * (1 - config['jitter'] * random.random())
 
     def stop_consuming(self):
         """停止消费"""
-        if self.channel and self.consumer_tag:
+        was_consuming = self._consuming
+        self._consuming = False
+        self._paused = False
+        for channel in self.channels:
             try:
-                self.channel.basic_cancel(self.consumer_tag)
-                self.consumer_tag = None
-                self.active_consumers = max(0, self.active_consumers - 1)
-                logger.info("消费已停止")
+                self._cancel(channel)
             except Exception as e:
                 logger.error(f"停止消费失败: {e}")
+        self.consumer_tags = {}
+        if was_consuming:
+            self.active_consumers = 0
+            logger.info("消费已停止")
 
     def close(self):
         """关闭连接"""
         self.stop_consuming()
 
-        if self.channel and self.channel.is_open:
-            try:
-                self.channel.close()
-            except Exception:
-                pass
+        for channel in self.channels or [self.channel]:
+            if channel and channel.is_open:
+                try:
+                    channel.close()
+                except Exception:
+                    pass
 
         if self.connection and self.connection.is_open:
             try:
@@ -403,26 +912,40 @@ class SSLRabbitMQConsumer:
         uptime = datetime.now() - self.metrics['uptime_start']
         self.metrics['uptime'] = str(uptime)
         self.metrics['current_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        return self.metrics.copy()
+        metrics = self.metrics.copy()
+        if self.dedup:
+            metrics['dedup'] = self.dedup.get_metrics()
+        if self.retry_policy:
+            metrics['retry'] = self.retry_policy.metrics.copy()
+        if self.workers:
+            metrics['workers'] = self.workers.metrics.copy()
+        scheduler = self.executor.scheduler if self.executor else None
+        if scheduler and scheduler.coalescer:
+            metrics['coalesce'] = scheduler.coalescer.metrics.copy()
+        return metrics
 
     def print_status(self):
-        """打印状态信息"""
+        """输出状态信息到日志"""
         metrics = self.get_metrics()
-        print("\n" + "=" * 60)
-        print("RabbitMQ SSL 连接状态")
-        print("=" * 60)
-        print(f"连接状态: {'✅ 已连接' if self.is_connected else '❌ 未连接'}")
-        print(f"主机: {self.default_config['host']}:{self.default_config['port']}")
-        print(f"虚拟主机: {self.default_config['virtual_host']}")
-        print(f"消费者数: {self.active_consumers}/{self.max_consumers}")
-        print(f"运行时间: {metrics['uptime']}")
-        print(f"消息统计:")
-        print(f"  接收: {metrics['messages_received']}")
-        print(f"  成功: {metrics['messages_processed']}")
-        print(f"  失败: {metrics['messages_failed']}")
-        print(f"连接错误: {metrics['connection_errors']}")
-        print(f"最后连接: {metrics['last_connection_time']}")
-        print("=" * 60)
+        lines = [
+            "=" * 60,
+            "RabbitMQ SSL 连接状态",
+            "=" * 60,
+            f"连接状态: {'✅ 已连接' if self.is_connected else '❌ 未连接'}",
+            f"主机: {self.default_config['host']}:{self.default_config['port']}",
+            f"虚拟主机: {self.default_config['virtual_host']}",
+            f"消费者数: {self.active_consumers}/{self.max_consumers}",
+            f"运行时间: {metrics['uptime']}",
+            "消息统计:",
+            f"  接收: {metrics['messages_received']}",
+            f"  成功: {metrics['messages_processed']}",
+            f"  失败: {metrics['messages_failed']}",
+            f"  重复: {metrics['messages_duplicate']}",
+            f"连接错误: {metrics['connection_errors']}",
+            f"最后连接: {metrics['last_connection_time']}",
+            "=" * 60
+        ]
+        logger.info("状态信息:\n%s", '\n'.join(lines))
 
 
 class RabbitMQManager:
@@ -431,30 +954,121 @@ class RabbitMQManager:
     def __init__(self, config: Dict[str, Any] = None):
         self.config = config or {}
         self.consumer = None
+        self.executor = None
+        self.workers = None
+        self.dedup = None
+        self.timers = None
+        self.metrics_server = None
+        self.sources = []
+        self.receipts = None
         self.running = False
         self.reconnect_thread = None
 
-    def start(self, queue_name: str, message_handler: Callable = None):
-        """启动消费者"""
+    def setup(self, message_handler: Callable = None, batch_sender: Callable = None,
+              journal: DeliveryJournal = None, desktops: DesktopPool = None):
+        """
+        创建消费者和共享的处理流水线(执行器、阶段线程池、去重缓存、定时堆等)，只执行一次
+        消费者跨重连复用：SSL上下文、已声明的拓扑和统计都保留；本地输入源与消费者共用同一流水线
+        """
+        if self.consumer is not None:
+            return
+        self.consumer = SSLRabbitMQConsumer(self.config)
+
+        # 设置消息处理器
+        if message_handler:
+            self.consumer.set_message_handler(message_handler)
+
+        # GUI执行器跨重连复用
+        if self.executor is None:
+            rate_config = self.consumer.default_config['rate_limit']
+            rate_limiter = None
+            if rate_config['enabled']:
+                rate_limiter = RateLimiter.from_config(rate_config)
+                set_rate_limiter(rate_limiter)
+            verify_config = self.consumer.default_config['verify']
+            if verify_config['enabled']:
+                if ChatVerifier.available():
+                    verifier = ChatVerifier.from_config(verify_config)
+                    verifier.warm()
+                    set_verifier(verifier)
+                else:
+                    logger.error("未安装OCR依赖(requirements-vision.txt)，聊天标题校验未启用")
+            timer_config = self.consumer.default_config['timers']
+            if timer_config['enabled']:
+                self.timers = TimerHeap(timer_config['path'], retry_delay=timer_config['retry_delay'],
+                                        max_attempts=timer_config['max_attempts'],
+                                        dead_letter=timer_config['dead_letter'])
+            self.executor = GuiExecutor.from_config(
+                self.consumer.default_config, message_handler, batch_sender, journal,
+                rate_limiter, self.timers, desktops
+            )
+            set_preempt_check(self.executor.has_urgent)
+            self.executor.start()
+        self.consumer.set_executor(self.executor)
+
+        # 阶段线程池跨重连复用，线程数随消费通道数伸缩
+        if self.workers is None:
+            listener = self.consumer.default_config['listener']
+            self.workers = StageWorkerPool(listener['concurrency'], listener['max_concurrency'])
+            self.workers.start()
+        self.consumer.set_workers(self.workers)
+
+        # 去重缓存跨重连复用
+        dedup_config = self.consumer.default_config['dedup']
+        if self.dedup is None and dedup_config['enabled']:
+            self.dedup = DedupCache(dedup_config['path'], ttl=dedup_config['ttl'],
+                                    max_entries=dedup_config['max_entries'])
+        if self.dedup:
+            self.consumer.set_dedup(self.dedup)
+
+        # 回执发布使用独立连接，断线重连和发布确认都不影响消费连接
+        receipt_config = self.consumer.default_config['receipts']
+        if self.receipts is None and receipt_config['enabled']:
+            consumer = self.consumer
+            self.receipts = ReceiptPublisher.from_config(
+                lambda: consumer.open_connection('receipts')[0], receipt_config, journal)
+            self.receipts.start()
+        if self.receipts:
+            self.consumer.set_receipts(self.receipts)
+            self.executor.receipts = self.receipts
+
+        # 指标服务只启动一次
+        http_config = self.consumer.default_config['metrics_http']
+        if self.metrics_server is None and http_config['enabled']:
+            try:
+                self.metrics_server = start_http_server(http_config['host'], http_config['port'])
+            except Exception as e:
+                logger.error(f"指标服务启动失败: {e}")
+                http_config['enabled'] = False
+
+    def start(self, queue_name: str, message_handler: Callable = None,
+              batch_sender: Callable = None, journal: DeliveryJournal = None,
+              desktops: DesktopPool = None):
+        """启动配置中启用的输入源：RabbitMQ消费者和本地输入源共用同一条处理流水线"""
         self.running = True
+        self.setup(message_handler, batch_sender, journal, desktops)
+
+        # 本地输入源
+        if not self.sources:
+            self.sources = build_sources(self.consumer.default_config, self.executor, self.dedup, self.receipts)
+            for source in self.sources:
+                try:
+                    source.start()
+                except Exception as e:
+                    logger.error(f"本地输入源启动失败: {e}")
+        if not self.consumer.default_config['sources']['amqp']:
+            logger.info("未启用RabbitMQ输入，仅使用本地输入源")
+            return
 
         def _consumer_loop():
             while self.running:
                 try:
-                    # 创建消费者实例
-                    self.consumer = SSLRabbitMQConsumer(self.config)
-
-                    # 设置消息处理器
-                    if message_handler:
-                        self.consumer.set_message_handler(message_handler)
-
                     # 连接
                     if self.consumer.connect():
-                        # 开始消费
+                        # 开始消费，返回说明连接已断开或已停止
                         self.consumer.start_consuming(queue_name)
                     else:
                         logger.error("连接失败，等待重试...")
-                        time.sleep(10)
 
                 except KeyboardInterrupt:
                     logger.info("收到中断信号")
@@ -464,7 +1078,12 @@ class RabbitMQManager:
                     logger.error(f"消费者异常: {e}")
                     if self.consumer:
                         self.consumer.close()
-                    time.sleep(5)  # 等待后重试
+
+                # 首次快速重试，之后指数退避
+                if self.running:
+                    delay = self.consumer.next_backoff() if self.consumer else 1
+                    logger.info(f"{delay:.2f}秒后重连")
+                    time.sleep(delay)
 
         # 启动消费者线程
         self.reconnect_thread = threading.Thread(
@@ -478,8 +1097,20 @@ class RabbitMQManager:
     def stop(self):
         """停止消费者"""
         self.running = False
+        for source in self.sources:
+            source.stop()
+        if self.workers:
+            self.workers.stop()
+        if self.executor:
+            self.executor.stop()
         if self.consumer:
             self.consumer.close()
+        if self.dedup:
+            self.dedup.close()
+        if self.timers is not None:
+            self.timers.close()
+        if self.receipts:
+            self.receipts.stop()
         if self.reconnect_thread:
             self.reconnect_thread.join(timeout=5)
         logger.info("RabbitMQ管理器已停止")
@@ -491,31 +1122,61 @@ class RabbitMQManager:
         return {"status": "not_connected"}
 
 
-def process_message(data: Dict[str, Any], properties) -> bool:
+def process_message(data: Notice, properties) -> bool:
     """
     自定义消息处理器
     返回: True-成功, False-失败(丢弃), None-失败(重试)
     """
     try:
-        logger.info(f"开始准备处理消息: {data}")
+        key = message_key(data, properties)
+        logger.debug("开始准备处理消息: %s", lazy_json(data), extra={'message_id': key})
 
         # 业务逻辑示例
-        if not len(data.get('groupName')) == 0:
-            logger.info(f"收到服务器消息，开始处理")
-            process(data, components)
+        if data.groups:
+            if desktops:
+                desktops.process(data, journal, key)
+            else:
+                process(data, components, journal, key)
             return True
 
         else:
-            logger.warning(f"未知消息类型: {data},不予处理")
+            logger.warning("未知消息类型: %s,不予处理", data)
             return True  # 确认未知类型消息，避免阻塞队列
 
+    except Preempted:
+        raise  # 交给执行器把剩余的群重新排队
     except Exception as e:
-        logger.error(f"消息处理异常: {e}")
+        logger.error("消息处理异常: %s", e)
         return None  # 返回None会触发重试
 
 
+def send_group(group: str, messages) -> None:
+    """批量调度使用的发送函数：打开一次群聊并依次发送"""
+    process_group(group, messages, components)
+
+
 def main():
     """主程序"""
+    global components, journal, desktops
+
+    parser = argparse.ArgumentParser(description='企业微信消息机器人')
+    parser.add_argument('--calibrate', action='store_true', help='重新交互式标定组件位置')
+    parser.add_argument('--profile', help='标定配置名，默认按分辨率和DPI')
+    parser.add_argument('--displays', help='多桌面模式的X显示列表，如 :1,:2,:3')
+    parser.add_argument('--xvfb', action='store_true', help='多桌面模式下为每个显示启动Xvfb')
+    parser.add_argument('--spool', help='同时从该 JSONL 假脱机文件读取通知')
+    parser.add_argument('--http-port', type=int, help='同时在本地该端口接收 HTTP 通知')
+    parser.add_argument('--no-amqp', action='store_true', help='不连接RabbitMQ，只使用本地输入源')
+    parser.add_argument('--log-format', choices=('text', 'json'), default='text', help='日志格式')
+    parser.add_argument('--log-level', default='INFO', help='日志级别')
+    args = parser.parse_args()
+
+    # 日志在后台线程格式化和输出，消息处理线程只入队
+    log_listener = setup_logging(getattr(logging, args.log_level.upper(), logging.INFO), args.log_format)
+
+    # 投递日志，重新投递时跳过已发送的群
+    journal = DeliveryJournal()
+
     # 配置
     config = {
         'host': '192.168.2.106',
@@ -526,14 +1187,58 @@ def main():
         'listener': {
             'concurrency': 1,
             'max_concurrency': 10,
-            'prefetch_count': 1
+            'prefetch_count': 100  # GUI在独立线程执行，预取保持流水线饱和
+        },
+        'batch': {
+            'enabled': True,
+            'window': 1.0,
+            'max_messages': 50
+        },
+        'desktops': {
+            'enabled': bool(args.displays),  # 多桌面并行发送，每个显示运行一个企业微信实例
+            'displays': args.displays.split(',') if args.displays else [],
+            'xvfb': args.xvfb,
+            'screen': '1920x1080x24',
+            'recalibrate': args.calibrate,
+            'replicas': 64  # 一致性哈希虚拟节点数
+        },
+        'layout': {
+            'enabled': True,  # 按标定时保存的界面模板自动重新定位(需 requirements-vision.txt)
+            'check_interval': 30,  # 布局廉价检查间隔(秒)，发送失败后立即检查
+            'threshold': 0.8,  # 模板匹配最低得分
+            'margin': 200  # 只在上次窗口区域外扩该像素内搜索
+        },
+        'sources': {
+            'amqp': not args.no_amqp,  # 代理停机维护期间用 --no-amqp 只走本地输入
+            'spool': {'enabled': bool(args.spool), 'path': args.spool or DEFAULT_SPOOL_PATH},
+            'http': {'enabled': args.http_port is not None, 'port': args.http_port or 9109}
         },
 
     }
 
+    # 加载组件坐标；多桌面模式下每个显示各自标定
+    if config['desktops']['enabled']:
+        desktops = DesktopPool.from_config(config['desktops'])
+        desktops.start()
+    else:
+        components = init_component_location(args.calibrate, args.profile)
+        layout_config = config['layout']
+        if layout_config['enabled'] and TemplateLocator.available():
+            locator = TemplateLocator.load(args.profile or profile_name(get_driver()),
+                                           threshold=layout_config['threshold'])
+            if locator:
+                set_layout(LayoutTracker(get_driver(), locator, components,
+                                         check_interval=layout_config['check_interval'],
+                                         margin=layout_config['margin']))
+                logger.info("界面自动定位已启用")
+
     def signal_handler(signum, frame):
         logger.info(f"收到信号 {signum}，正在关闭...")
         manager.stop()
+        journal.close()
+        if desktops:
+            desktops.close()
+        log_listener.stop()
         sys.exit(0)
 
     # 注册信号
@@ -548,13 +1253,15 @@ def main():
     queue_name = 'yilvtong.auction.notice.agency'
 
     # 启动
-    logger.info("启动RabbitMQ SSL消费者...")
-    manager.start(queue_name, process_message)
+    logger.info("启动输入源: %s", ', '.join(name for name, enabled in (
+        ('RabbitMQ', config['sources']['amqp']), ('假脱机文件', config['sources']['spool']['enabled']),
+        ('HTTP', config['sources']['http']['enabled'])) if enabled))
+    manager.start(queue_name, process_message, send_group, journal, desktops)
 
-    # 定期打印状态
+    # 定期输出状态
     def print_status_periodically():
         while manager.running:
-            time.sleep(30)  # 每30秒打印一次状态
+            time.sleep(30)  # 每30秒输出一次状态
             if manager.consumer:
                 manager.consumer.print_status()
 
@@ -572,6 +1279,10 @@ def main():
         logger.info("主线程被中断")
     finally:
         manager.stop()
+        journal.close()
+        if desktops:
+            desktops.close()
+        log_listener.stop()
 
 
 if __name__ == '__main__':
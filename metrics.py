@@ -0,0 +1,169 @@
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger("Metrics")
+
+# 固定桶上界(秒)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# 流水线各阶段
+STAGES = {
+    'broker_wait': '生产者发布到消费者收到',
+    'stage_wait': '收到后在阶段线程池中排队',
+    'json_decode': '消息解码',
+    'search': '搜索群',
+    'select': '选中群',
+    'verify': '聊天标题校验(截图+识别或缓存)',
+    'ocr': '聊天标题OCR推理',
+    'locate': '界面模板重新定位',
+    'paste': '粘贴消息',
+    'enter': '回车发送',
+    'group': '单个群端到端',
+    'message': '单条消息收到到确认',
+    'reconnect': '断线到重连后收到首条消息'
+}
+
+
+class Histogram:
+    """固定桶直方图，计数存放在定长数组中，写入只持有极短的锁"""
+
+    def __init__(self, name: str, help_text: str = '', buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一格为 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        """计时上下文"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按桶估算分位数(取桶上界)"""
+        counts, total = self.counts[:], self.count
+        if not total:
+            return None
+        target = q * total
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float('inf')
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts, total, value_sum = self.counts[:], self.count, self.sum
+        return {
+            'count': total,
+            'sum': round(value_sum, 6),
+            'buckets': {str(bound): count for bound, count in zip(self.buckets + ('+Inf',), counts)},
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99)
+        }
+
+
+class MetricsRegistry:
+    """进程级指标注册表，跨重连保留"""
+
+    def __init__(self, prefix: str = 'wecom'):
+        self.prefix = prefix
+        self.histograms: Dict[str, Histogram] = {}
+        self.states: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help_text: str = '') -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram(name, help_text))
+        return histogram
+
+    def stage(self, name: str) -> Histogram:
+        """流水线阶段耗时直方图"""
+        return self.histogram(name, STAGES.get(name, name))
+
+    def observe(self, name: str, value: float):
+        self.stage(name).observe(value)
+
+    def observe_priority(self, name: str, priority: int, value: float):
+        """按消息优先级分开统计的阶段耗时，直方图名为 <阶段>_p<优先级>"""
+        self.histogram(f'{name}_p{priority}', f"{STAGES.get(name, name)}(优先级{priority})").observe(value)
+
+    def state(self, name: str, defaults: Dict[str, Any]) -> Dict[str, Any]:
+        """命名的计数器字典，首次创建后始终返回同一对象"""
+        with self._lock:
+            return self.states.setdefault(name, defaults)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            'stages': {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+            'counters': {name: {key: value for key, value in state.items()
+                                if isinstance(value, (int, float)) and not isinstance(value, bool)}
+                         for name, state in self.states.items()}
+        }
+
+    def render_prometheus(self) -> str:
+        """Prometheus 文本格式"""
+        metric = f'{self.prefix}_stage_latency_seconds'
+        lines = [f'# HELP {metric} 流水线各阶段耗时', f'# TYPE {metric} histogram']
+        for name, histogram in self.histograms.items():
+            snapshot = histogram.snapshot()
+            cumulative = 0
+            for bound, count in snapshot['buckets'].items():
+                cumulative += count
+                lines.append(f'{metric}_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{stage="{name}"}} {snapshot["sum"]}')
+            lines.append(f'{metric}_count{{stage="{name}"}} {snapshot["count"]}')
+        for state_name, counters in self.to_json()['counters'].items():
+            for key, value in counters.items():
+                lines.append(f'{self.prefix}_{state_name}_{key} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def start_http_server(host: str = '127.0.0.1', port: int = 9108,
+                      metrics: MetricsRegistry = None) -> threading.Thread:
+    """在后台线程启动指标HTTP服务: /metrics(Prometheus) 和 /metrics.json"""
+    from flask import Flask, Response
+    from werkzeug.serving import make_server
+
+    metrics = metrics or registry
+    app = Flask('wecom-metrics')
+
+    @app.route('/metrics')
+    def prometheus():
+        return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/metrics.json')
+    def as_json():
+        return Response(json.dumps(metrics.to_json(), ensure_ascii=False, default=str),
+                        mimetype='application/json')
+
+    server = make_server(host, port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name="Metrics-HTTP", daemon=True)
+    thread.start()
+    logger.info(f"指标服务已启动: http://{host}:{port}/metrics")
+    return thread
@@ -0,0 +1,181 @@
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from journal import message_key
+from lazy import is_available, lazy_import
+
+# 可选的快速 JSON 解码器，未安装时使用标准库
+orjson = lazy_import('orjson') if is_available('orjson') else None
+_loads = None  # 首次解码时绑定
+
+# 通知的已知字段，其余字段原样保存在 extra 中
+KNOWN_FIELDS = frozenset(('groupName', 'message', 'priority', 'deadline', 'sendAt', 'expireAt'))
+
+# 处理结果: True-已发送, False-拒绝(不重试), None-失败(重试)；以下两种未发送但同样确认原投递
+SCHEDULED = 'scheduled'  # 已转入定时堆，到 sendAt 再发送
+EXPIRED = 'expired'  # 已过 expireAt，丢弃
+
+
+class InvalidNotice(ValueError):
+    """畸形消息：无法解码或结构非法，不应重试"""
+
+
+class Preempted(Exception):
+    """扇出发送在群边界被更紧急的消息抢占，remaining 为尚未发送的群"""
+
+    def __init__(self, remaining: Tuple[str, ...]):
+        super().__init__(f"被抢占，剩余 {len(remaining)} 个群")
+        self.remaining = remaining
+
+
+def parse_time(value) -> Optional[float]:
+    """解析 sendAt/expireAt: 秒或毫秒时间戳、ISO 8601 或 'YYYY-MM-DD HH:MM:SS'，缺省返回None"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"无效时间: {value!r}")
+    if isinstance(value, (int, float)):
+        return value / 1000 if value > 1e11 else float(value)
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.strip().replace('Z', '+00:00')).timestamp()
+    raise ValueError(f"无效时间: {value!r}")
+
+
+def normalize_groups(groups) -> List[str]:
+    """把 groupName 规范成去重且保序的群名列表"""
+    if not groups:
+        return []
+    if isinstance(groups, str):
+        groups = [groups]
+    result = []
+    for group in groups:
+        if group and group not in result:
+            result.append(group)
+    return result
+
+
+class Notice:
+    """
+    已解码并校验过的通知，在流水线中直接传递，不再重复解析
+    groups 为去重保序的元组(单个字符串群名也规范成一元组)，时间字段为时间戳；
+    priority 取 AMQP properties.priority，缺省时取消息体 priority，deadline 为可选的截止时间
+    """
+
+    __slots__ = ('key', 'groups', 'text', 'priority', 'deadline', 'send_at', 'expire_at', 'extra')
+
+    def __init__(self, key: str, groups: Tuple[str, ...], text: str, priority: int = 0,
+                 send_at: float = None, expire_at: float = None, extra: Dict[str, Any] = None,
+                 deadline: float = None):
+        self.key = key
+        self.groups = groups
+        self.text = text
+        self.priority = priority
+        self.deadline = deadline
+        self.send_at = send_at
+        self.expire_at = expire_at
+        self.extra = extra
+
+    @property
+    def urgency(self) -> Tuple[int, float]:
+        """排序键，越小越紧急：优先级高者先，同优先级按截止时间(无则取 expireAt)最早者先"""
+        deadline = self.deadline if self.deadline is not None else self.expire_at
+        return -self.priority, deadline if deadline is not None else float('inf')
+
+    def with_groups(self, groups: Tuple[str, ...]) -> 'Notice':
+        """同一条通知只保留部分群(键不变，投递日志和去重照常生效)"""
+        return Notice(self.key, tuple(groups), self.text, self.priority, self.send_at,
+                      self.expire_at, self.extra, self.deadline)
+
+    @classmethod
+    def from_dict(cls, data: Any, properties=None) -> 'Notice':
+        """从已解析的 JSON 对象构建并校验，非法时抛出 InvalidNotice"""
+        if not isinstance(data, dict):
+            raise InvalidNotice("消息体不是JSON对象")
+        groups = data.get('groupName')
+        if isinstance(groups, str):
+            groups = [groups]
+        if not isinstance(groups, list) or not groups:
+            raise InvalidNotice("groupName 缺失或为空")
+        for group in groups:
+            if not group or not isinstance(group, str):
+                raise InvalidNotice("groupName 含非字符串或空群名")
+        text = data.get('message')
+        if not isinstance(text, str) or not text:
+            raise InvalidNotice("message 缺失或不是字符串")
+        try:
+            send_at = parse_time(data.get('sendAt'))
+        except (TypeError, ValueError, OverflowError):
+            raise InvalidNotice("sendAt 时间格式无效") from None
+        try:
+            expire_at = parse_time(data.get('expireAt'))
+        except (TypeError, ValueError, OverflowError):
+            raise InvalidNotice("expireAt 时间格式无效") from None
+        try:
+            deadline = parse_time(data.get('deadline'))
+        except (TypeError, ValueError, OverflowError):
+            raise InvalidNotice("deadline 时间格式无效") from None
+        priority = getattr(properties, 'priority', None)
+        if priority is None:
+            priority = data.get('priority') or 0
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise InvalidNotice("priority 不是整数")
+        extra = None
+        if not KNOWN_FIELDS.issuperset(data):
+            extra = {key: value for key, value in data.items() if key not in KNOWN_FIELDS}
+        key = getattr(properties, 'message_id', None) or message_key(data)
+        # 群名已校验为非空字符串，dict.fromkeys 去重保序
+        return cls(key, tuple(dict.fromkeys(groups)), text, priority, send_at, expire_at, extra, deadline)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """还原为通知 JSON 对象(用于持久化和内容哈希)"""
+        data: Dict[str, Any] = dict(self.extra or ())
+        data['groupName'] = list(self.groups)
+        data['message'] = self.text
+        if self.priority:
+            data['priority'] = self.priority
+        if self.deadline is not None:
+            data['deadline'] = self.deadline
+        if self.send_at is not None:
+            data['sendAt'] = self.send_at
+        if self.expire_at is not None:
+            data['expireAt'] = self.expire_at
+        return data
+
+    def is_expired(self, now: float = None) -> bool:
+        """是否已过 expireAt"""
+        return self.expire_at is not None and self.expire_at <= (time.time() if now is None else now)
+
+    def __repr__(self):
+        return f"<Notice {self.key} -> {len(self.groups)}个群: {self.text[:20]!r}>"
+
+
+def loads(body: bytes) -> Any:
+    """解码 JSON，优先使用 orjson"""
+    global _loads
+    if _loads is None:
+        _loads = orjson.loads if orjson is not None else json.loads
+    return _loads(body)
+
+
+def decode_notice(body: bytes, properties=None) -> Notice:
+    """从消息体字节直接解码并校验，一次完成；失败抛出 InvalidNotice"""
+    try:
+        data = loads(body)
+    except ValueError as e:  # JSONDecodeError / UnicodeDecodeError / orjson.JSONDecodeError
+        raise InvalidNotice(f"JSON解析失败: {e}") from None
+    return Notice.from_dict(data, properties)
+
+
+def is_expired(data, now: float = None) -> bool:
+    """是否已过 expireAt，兼容 Notice 和原始字典"""
+    if isinstance(data, Notice):
+        return data.is_expired(now)
+    expire_at = parse_time(data.get('expireAt'))
+    return expire_at is not None and expire_at <= (time.time() if now is None else now)
+
+
+def accepted(result) -> bool:
+    """处理结果是否应确认原投递(已发送、已转入定时或已过期)"""
+    return result is True or result == SCHEDULED or result == EXPIRED
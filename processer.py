@@ -1,44 +1,233 @@
-import pyautogui
-import pyperclip
-import random
+import logging
+import threading
 import time
 
-from torch.cuda import clock_rate
+from driver import PyAutoGUIDriver, UIDriver
+from logs import sample, sampled
+from metrics import registry
+from model import Preempted
+from ratelimit import RateLimiter
+from session import ChatSession
+from verify import ChatMismatch
+from waiter import ReadinessWaiter, region_around
 
-pyautogui.FAILSAFE = True
-pyautogui.PAUSE = 0.5
-interval_time = 3
+session_ttl = 30
+search_result_size = (240, 60)  # 搜索结果检测区域(以choose_area为中心)
+header_size = (300, 40)  # 聊天标题检测区域(以header_area为中心)
+
+_driver = None
+rate_limiter = None
+preempt_check = None  # preempt_check(urgency) 为 True 时在群边界让出
+verifier = None  # 配置后选中群聊时 OCR 校验聊天标题
+layout = None  # 配置后打开群聊前检查界面布局，窗口移动时自动重新定位
+logger = logging.getLogger("Processer")
+_local = threading.local()  # 多桌面模式下每个桌面线程绑定自己的驱动、会话和就绪等待器
+_header_warned = False  # 已提示过标定配置缺少聊天标题位置
+
+
+def bind_desktop(desktop):
+    """把当前线程绑定到一个桌面会话(需有 driver/session/waiter 属性)，传None解除绑定"""
+    _local.desktop = desktop
+
+
+def get_driver() -> UIDriver:
+    """当前界面驱动：优先取当前线程绑定的桌面，否则为全局驱动(首次使用时创建 pyautogui 驱动)"""
+    desktop = getattr(_local, 'desktop', None)
+    if desktop is not None:
+        return desktop.driver
+    global _driver
+    if _driver is None:
+        _driver = PyAutoGUIDriver()
+    return _driver
+
+
+def set_driver(driver: UIDriver):
+    """替换界面驱动(如无界面录制驱动)"""
+    global _driver
+    _driver = driver
+    chat_session.invalidate('driver_changed')
+
+
+def set_rate_limiter(limiter: RateLimiter):
+    """设置发送限速器，每次发送前都会先取令牌"""
+    global rate_limiter
+    rate_limiter = limiter
+
+
+def set_verifier(chat_verifier):
+    """设置聊天标题校验器，传None关闭校验"""
+    global verifier
+    verifier = chat_verifier
+
+
+def set_layout(tracker):
+    """设置界面布局跟踪器，传None关闭自动定位"""
+    global layout
+    layout = tracker
+
+
+def set_preempt_check(check):
+    """设置抢占检查，多群扇出每发完一个群调用 check(urgency)，返回 True 则抛出 Preempted"""
+    global preempt_check
+    preempt_check = check
+
+
+def focus_token():
+    """焦点快照：前台窗口标题和鼠标位置，任一变化说明操作员动过桌面"""
+    driver = get_driver()
+    return driver.active_title(), driver.position()
+
+
+chat_session = ChatSession(ttl=session_ttl, focus_probe=focus_token)
+waiter = ReadinessWaiter(
+    lambda region: get_driver().screenshot(region),
+    clock=lambda: get_driver().now(),
+    sleep=lambda seconds: get_driver().sleep(seconds)
+)
+
+
+def current_session() -> ChatSession:
+    """当前线程的聊天会话"""
+    desktop = getattr(_local, 'desktop', None)
+    return desktop.session if desktop is not None else chat_session
+
+
+def current_waiter() -> ReadinessWaiter:
+    """当前线程的就绪等待器"""
+    desktop = getattr(_local, 'desktop', None)
+    return desktop.waiter if desktop is not None else waiter
+
+
+def ui_regions(component):
+    """就绪检测区域：搜索结果列表和聊天标题，未标定标题位置时退回固定等待"""
+    header_area = component.get('header_area')
+    return {
+        'search_result': region_around(component['choose_area'], *search_result_size),
+        'chat_header': region_around(header_area, *header_size) if header_area else None
+    }
 
 
 def click(locate):
-    pyautogui.click(locate[0], locate[1], interval=random.random() / interval_time)
+    get_driver().click(locate[0], locate[1])
 
 
 def write(message):
-    pyperclip.copy(message)
-    pyautogui.hotkey('ctrl', 'v', interval=random.random() / interval_time)
+    get_driver().paste(message)
 
 
 def clear():
-    pyautogui.hotkey('ctrl', 'a', interval=random.random() / interval_time)
-    pyautogui.press('backspace', interval=random.random() / interval_time)
-
-
-def process(data, component):
-    groupName = data.get('groupName')
-    message = data.get('message')
-    msg_area = component['msg_area']
-    search_area = component['search_area']
-    choose_area = component['choose_area']
-    for i in groupName:
-        print("查找群:{},并准备发送信息.".format(i))
-        click(search_area)
-        clear()
-        write(i)
-        time.sleep(0.5)
-        click(choose_area)
-        time.sleep(0.5)
-        click(msg_area)
-        write(message)
-        pyautogui.press('enter', interval=random.random() / interval_time)
-        print('群消息:{},已成功发送至:{}.'.format(groupName, message))
+    get_driver().hotkey('ctrl', 'a')
+    get_driver().press('backspace')
+
+
+def observe(stage, start):
+    """按驱动时钟记录阶段耗时，返回当前时刻"""
+    now = get_driver().now()
+    registry.observe(stage, now - start)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("阶段 %s 耗时 %.3f秒", stage, now - start, extra={'stage': stage, 'elapsed': round(now - start, 4)})
+    return now
+
+
+def open_chat(group, component):
+    """搜索并打开群聊，每一步等界面就绪后立即执行下一步"""
+    regions = ui_regions(component)
+    waiter = current_waiter()
+    start = get_driver().now()
+    baseline = waiter.snapshot(regions['search_result'])
+    click(component['search_area'])
+    clear()
+    # 清空搜索框的渲染落定后再取基准，否则清空本身会被当成搜索结果的变化
+    waiter.require('clear', regions['search_result'], baseline)
+    baseline = waiter.snapshot(regions['search_result'])
+    write(group)
+    waiter.require('search', regions['search_result'], baseline)
+    start = observe('search', start)
+    baseline = waiter.snapshot(regions['chat_header'])
+    click(component['choose_area'])
+    waiter.require('select', regions['chat_header'], baseline)
+    start = observe('select', start)
+    if verifier and regions['chat_header']:
+        matched = verifier.verify(group, get_driver().screenshot(regions['chat_header']))
+        observe('verify', start)
+        if not matched:
+            raise ChatMismatch(f"打开的聊天不是群:{group}")
+    elif verifier:
+        warn_missing_header()
+
+
+def warn_missing_header():
+    """已启用聊天标题校验但标定配置没有 header_area，校验无从进行，提示一次重新标定"""
+    global _header_warned
+    if _header_warned:
+        return
+    _header_warned = True
+    logger.warning("⚠️ 已启用聊天标题校验，但标定配置缺少聊天标题位置(header_area)，校验被跳过；"
+                   "请使用 --calibrate 重新标定")
+
+
+def send_text(message, component, focus_input=True):
+    """在当前打开的聊天中发送一条消息"""
+    start = get_driver().now()
+    if focus_input:
+        click(component['msg_area'])
+    write(message)
+    start = observe('paste', start)
+    get_driver().press('enter')
+    observe('enter', start)
+
+
+def process_group(group, messages, component, session=None):
+    """打开一次群聊，依次发送该群的全部待发消息；当前聊天已是目标群时直接粘贴发送"""
+    session = session or current_session()
+    reuse = reused = session.is_current(group)
+    if reuse:
+        logger.debug("群:%s已打开,直接发送%d条信息.", group, len(messages), extra={'group': group})
+    else:
+        logger.debug("查找群:%s,并准备发送%d条信息.", group, len(messages), extra={'group': group})
+    start = get_driver().now()
+    try:
+        if not reuse:
+            if layout:
+                layout.ensure()
+            open_chat(group, component)
+            session.select(group)
+        for message in messages:
+            if rate_limiter:
+                rate_limiter.acquire(group)
+            send_text(message, component, focus_input=not reuse)
+            reuse = True  # 发送后焦点停留在输入框
+            session.touch()
+            logger.debug("群消息:%s,已成功发送至:%s.", message, group, extra={'group': group})
+        elapsed = observe('group', start) - start
+        if sampled('group'):
+            logger.info("已向群:%s发送%d条信息%s.", group, len(messages), "(复用已打开聊天)" if reused else "",
+                        extra=sample('group', group=group, messages=len(messages),
+                                     stage='group', elapsed=round(elapsed, 4)))
+    except Exception:
+        session.invalidate('send_failed')
+        if layout:
+            layout.invalidate()  # 可能是窗口移动导致，下次打开群聊前检查布局
+        raise
+
+
+def process(data, component, journal=None, key=None):
+    """
+    逐群发送一条消息；提供投递日志时跳过已发送的群并记录每个成功的群
+    设置了抢占检查时，每发完一个群检查一次，有更紧急的消息则抛出 Preempted(剩余的群)
+    """
+    sent = False
+    try:
+        for index, i in enumerate(data.groups):
+            if journal and journal.is_done(key, i):
+                logger.info("群:%s已发送过该消息,跳过.", i, extra={'group': i, 'message_id': key})
+                continue
+            if sent and preempt_check and preempt_check(data.urgency):
+                raise Preempted(data.groups[index:])
+            process_group(i, [data.text], component)
+            sent = True
+            if journal:
+                journal.record(key, i)
+    finally:
+        if journal:
+            journal.flush()
@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger("RateLimit")
+
+EPSILON = 1e-6  # 浮点补充误差，避免差一点点令牌时反复等待
+
+
+class TokenBucket:
+    """令牌桶: rate 为每秒补充的令牌数，capacity 为突发上限"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated_at')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+
+    def refill(self, now: float):
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def wait_time(self, now: float, tokens: float = 1) -> float:
+        """距离可取出 tokens 个令牌还需等待的秒数"""
+        self.refill(now)
+        if self.tokens >= tokens - EPSILON:
+            return 0.0
+        if self.rate <= 0:
+            return float('inf')
+        return (tokens - self.tokens) / self.rate
+
+    def take(self, now: float, tokens: float = 1):
+        self.refill(now)
+        self.tokens -= tokens
+
+
+class RateLimiter:
+    """
+    发送限速: 全局令牌桶 + 每群令牌桶 + 最小发送间隔
+    process 每次发送前调用 acquire，只等待恰好需要的时间；调度器用 delay/available 挑选有令牌的群
+    """
+
+    def __init__(self, global_rate: float = 1.0, global_burst: float = 5,
+                 group_rate: float = 0.2, group_burst: float = 3,
+                 min_interval: float = 0.3, max_groups: int = 10000,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.min_interval = min_interval
+        self.max_groups = max_groups
+        self.clock = clock
+        self.sleep = sleep
+        self.global_bucket = TokenBucket(global_rate, global_burst, clock())
+        self.groups: 'OrderedDict[str, TokenBucket]' = OrderedDict()
+        self.last_send = None
+        self._lock = threading.Lock()
+
+        # 统计
+        self.metrics = {
+            'acquired': 0,
+            'throttled': 0,
+            'wait_seconds': 0.0
+        }
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], **kwargs) -> 'RateLimiter':
+        return cls(global_rate=config.get('global_rate', 1.0),
+                   global_burst=config.get('global_burst', 5),
+                   group_rate=config.get('group_rate', 0.2),
+                   group_burst=config.get('group_burst', 3),
+                   min_interval=config.get('min_interval', 0.3),
+                   **kwargs)
+
+    def _bucket(self, group: str, now: float) -> TokenBucket:
+        bucket = self.groups.get(group)
+        if bucket is None:
+            bucket = self.groups[group] = TokenBucket(self.group_rate, self.group_burst, now)
+            while len(self.groups) > self.max_groups:
+                self.groups.popitem(last=False)
+        else:
+            self.groups.move_to_end(group)
+        return bucket
+
+    def _delay(self, group: str, now: float) -> float:
+        spacing = 0.0
+        if self.last_send is not None and now - self.last_send < self.min_interval - EPSILON:
+            spacing = self.last_send + self.min_interval - now
+        return max(spacing,
+                   self.global_bucket.wait_time(now),
+                   self._bucket(group, now).wait_time(now))
+
+    def delay(self, group: str) -> float:
+        """向该群发送一条消息前还需等待的秒数"""
+        with self._lock:
+            return self._delay(group, self.clock())
+
+    def available(self, group: str) -> int:
+        """此刻该群可连续发送的条数(不计最小间隔)"""
+        with self._lock:
+            now = self.clock()
+            self.global_bucket.refill(now)
+            bucket = self._bucket(group, now)
+            bucket.refill(now)
+            return int(min(self.global_bucket.tokens, bucket.tokens) + EPSILON)
+
+    def acquire(self, group: str):
+        """阻塞到允许发送，然后扣除令牌"""
+        while True:
+            with self._lock:
+                now = self.clock()
+                wait = self._delay(group, now)
+                if wait <= 0:
+                    self.global_bucket.take(now)
+                    self._bucket(group, now).take(now)
+                    self.last_send = now
+                    self.metrics['acquired'] += 1
+                    return
+            self.metrics['throttled'] += 1
+            self.metrics['wait_seconds'] += wait
+            self.sleep(wait)
@@ -0,0 +1,392 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from journal import DeliveryJournal
+from lazy import lazy_import
+from metrics import registry
+from model import EXPIRED, SCHEDULED
+
+pika = lazy_import('pika')  # 只有发布线程用到，构造回执和计算状态不依赖 pika
+
+logger = logging.getLogger("Receipts")
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'receipts.jsonl')
+
+# 消息级状态: delivered-全部群已发送, duplicate-重复投递(此前已完成), rejected-处理器拒绝,
+# failed-本次处理失败(将重试或转入死信), scheduled-已转入定时发送, expired-已过期未发送, invalid-畸形消息
+SENT_STATUSES = ('delivered', 'duplicate')
+UNSENT_STATUSES = (SCHEDULED, EXPIRED)  # 各群状态与消息状态相同
+
+# 处理结果 -> 回执状态，其余(None)为 failed
+RECEIPT_STATUS = {True: 'delivered', False: 'rejected', SCHEDULED: SCHEDULED, EXPIRED: EXPIRED}
+
+
+def receipt_status(result) -> str:
+    """处理结果对应的回执状态"""
+    return RECEIPT_STATUS.get(result, 'failed')
+
+
+def build_receipt(key: str, groups: Iterable[str], status: str, properties=None,
+                  received_at: float = None, journal: DeliveryJournal = None,
+                  error: str = None) -> Dict[str, Any]:
+    """
+    构造一条消息的送达回执：每个群的状态和发送时刻取自投递日志
+    阶段耗时: broker_wait 为发布到收到，processing 为收到到完成，各群 latency 为收到到该群发送
+    """
+    now = time.time()
+    sent = journal.sent_times(key) if journal and key else {}
+    published = getattr(properties, 'timestamp', None)
+    receipt = {
+        'receipt_id': uuid.uuid4().hex,
+        'message_id': key,
+        'correlation_id': getattr(properties, 'correlation_id', None) or getattr(properties, 'message_id', None),
+        'status': status,
+        'received_at': received_at,
+        'completed_at': now,
+        'stages': {
+            'broker_wait': round(received_at - published, 4) if published and received_at else None,
+            'processing': round(now - received_at, 4) if received_at else None
+        },
+        'groups': []
+    }
+    for group in groups:
+        sent_at = sent.get(group)
+        if sent_at is not None:
+            group_status = 'sent'
+        elif status in UNSENT_STATUSES:
+            group_status = status
+        elif status in SENT_STATUSES and journal is None:
+            group_status = 'sent'  # 无投递日志时只能按消息状态推断
+        else:
+            group_status = 'not_sent'
+        receipt['groups'].append({
+            'group': group,
+            'status': group_status,
+            'sent_at': sent_at,
+            'latency': round(sent_at - received_at, 4) if sent_at is not None and received_at else None
+        })
+    if error:
+        receipt['error'] = error
+    return receipt
+
+
+class ReceiptPublisher:
+    """
+    送达回执批量发布
+    生产方设置了 reply_to 时发往该队列(默认交换机)，否则发往配置的回执交换机；
+    emit 只入内存队列，不阻塞GUI线程和消费通道。发布线程把回执追加到磁盘缓冲文件，
+    按条数或时间凑批，在独立连接的确认模式通道上发布，代理确认后才推进文件偏移检查点；
+    断线期间回执留在磁盘上，重连(或重启)后从检查点继续发布，回执带 receipt_id 供接收方去重
+    """
+
+    def __init__(self, connect: Callable[[], Any], path: str = DEFAULT_PATH,
+                 exchange: str = '', exchange_type: str = 'direct', routing_key: str = '',
+                 use_reply_to: bool = True, batch_size: int = 50, flush_interval: float = 1.0,
+                 max_pending: int = 10000, compact_bytes: int = 1048576,
+                 reconnect_delay: float = 5, journal: DeliveryJournal = None):
+        self.connect = connect
+        self.path = path
+        self.checkpoint_path = path + '.offset'
+        self.exchange = exchange
+        self.exchange_type = exchange_type
+        self.routing_key = routing_key
+        self.use_reply_to = use_reply_to
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact_bytes = compact_bytes
+        self.reconnect_delay = reconnect_delay
+        self.journal = journal
+        self.running = False
+        self.thread = None
+        self._queue: 'queue.Queue[Dict[str, Any]]' = queue.Queue(maxsize=max_pending)
+        self._writer = None
+        self._reader = None
+        self._committed = 0  # 已被代理确认的字节偏移
+        self._confirmed = set()  # 当前批次中已确认的回执(批次中途失败时不重发)
+        self._pending = 0  # 已落盘未确认的回执条数
+        self._pending_since = None
+        self._connection = None
+        self._channel = None
+        self._retry_at = 0.0
+
+        # 统计
+        self.metrics = registry.state('receipts', {
+            'emitted': 0,
+            'published': 0,
+            'batches': 0,
+            'dropped': 0,
+            'unroutable': 0,
+            'nacked': 0,
+            'corrupt': 0,
+            'publish_errors': 0,
+            'pending': 0
+        })
+
+    @classmethod
+    def from_config(cls, connect: Callable[[], Any], config: Dict[str, Any],
+                    journal: DeliveryJournal = None) -> 'ReceiptPublisher':
+        return cls(connect, config['path'], exchange=config['exchange'],
+                   exchange_type=config['exchange_type'], routing_key=config['routing_key'],
+                   use_reply_to=config['use_reply_to'], batch_size=config['batch_size'],
+                   flush_interval=config['flush_interval'], max_pending=config['max_pending'],
+                   compact_bytes=config['compact_bytes'], reconnect_delay=config['reconnect_delay'],
+                   journal=journal)
+
+    status = staticmethod(receipt_status)
+
+    def destination(self, properties) -> Optional[Tuple[str, str]]:
+        """回执目的地 (交换机, 路由键)，未设置 reply_to 且未配置交换机时返回None"""
+        reply_to = getattr(properties, 'reply_to', None)
+        if self.use_reply_to and reply_to:
+            return '', reply_to
+        if self.exchange:
+            return self.exchange, self.routing_key
+        return None
+
+    def report(self, key: str, groups: Iterable[str], status: str, properties=None,
+               received_at: float = None, error: str = None) -> bool:
+        """构造并提交回执(任意线程，不阻塞)；无目的地或内存队列已满时丢弃并返回 False"""
+        target = self.destination(properties)
+        if target is None:
+            return False
+        receipt = build_receipt(key, groups, status, properties, received_at, self.journal, error)
+        try:
+            self._queue.put_nowait({'exchange': target[0], 'routing_key': target[1], 'receipt': receipt})
+        except queue.Full:
+            self.metrics['dropped'] += 1
+            logger.warning(f"回执队列已满，丢弃回执: {key}")
+            return False
+        self.metrics['emitted'] += 1
+        return True
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="Receipt-Publisher", daemon=True)
+        self.thread.start()
+        logger.info(f"送达回执发布已启动: {self.exchange or 'reply_to'}")
+
+    def stop(self, timeout: float = 5):
+        """停止发布线程：剩余回执落盘，连接可用时尽量发完"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=timeout)
+
+    # 磁盘缓冲
+
+    def _open(self):
+        """打开缓冲文件并从检查点恢复未确认的回执条数；崩溃时写了一半的行补上换行"""
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                state = json.load(f)
+            self._committed = int(state.get('offset', 0))
+            self._confirmed = set(state.get('confirmed', ()))
+        except FileNotFoundError:
+            self._committed = 0
+        except (ValueError, TypeError, OSError) as e:
+            logger.error(f"回执检查点损坏，从头重发: {e}")
+            self._committed = 0
+        self._writer = open(self.path, 'ab')
+        self._reader = open(self.path, 'rb')
+        size = os.fstat(self._writer.fileno()).st_size
+        if self._committed > size:
+            self._committed = 0
+        if size:
+            self._reader.seek(size - 1)
+            if self._reader.read(1) != b'\n':
+                self._writer.write(b'\n')
+                self._writer.flush()
+        self._reader.seek(self._committed)
+        while self._reader.readline():
+            self._pending += 1
+        self._reader.seek(self._committed)
+        if self._pending:
+            self._pending_since = time.monotonic()
+            logger.info(f"磁盘缓冲中有 {self._pending} 条未确认的回执")
+        self.metrics['pending'] = self._pending
+
+    def _save_checkpoint(self):
+        temp = self.checkpoint_path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({'offset': self._committed, 'confirmed': sorted(self._confirmed)}, f)
+        os.replace(temp, self.checkpoint_path)
+
+    def _spool(self, timeout: float):
+        """把内存队列中的回执追加到缓冲文件，最多等待 timeout 秒"""
+        try:
+            item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+        except queue.Empty:
+            return
+        lines = []
+        while True:
+            lines.append(json.dumps(item, ensure_ascii=False, default=str).encode('utf-8') + b'\n')
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._writer.write(b''.join(lines))
+        self._writer.flush()
+        if not self._pending:
+            self._pending_since = time.monotonic()
+        self._pending += len(lines)
+        self.metrics['pending'] = self._pending
+
+    def _compact(self):
+        """全部回执都已确认且文件较大时清空缓冲文件"""
+        if self._pending or self._committed < self.compact_bytes:
+            return
+        self._writer.truncate(0)
+        self._reader.seek(0)
+        self._committed = 0
+        self._save_checkpoint()
+
+    # 发布
+
+    def _ensure_channel(self) -> bool:
+        if self._channel is not None and self._channel.is_open:
+            return True
+        if time.monotonic() < self._retry_at:
+            return False
+        try:
+            self._connection = self.connect()
+            self._channel = self._connection.channel()
+            self._channel.confirm_delivery()
+            if self.exchange:
+                self._channel.exchange_declare(exchange=self.exchange, exchange_type=self.exchange_type,
+                                               durable=True)
+            logger.info("回执发布通道已建立(发布确认模式)")
+            return True
+        except Exception as e:
+            logger.error(f"回执发布连接失败: {e}")
+            self._disconnect()
+            return False
+
+    def _disconnect(self):
+        self._retry_at = time.monotonic() + self.reconnect_delay
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+        self._connection = None
+        self._channel = None
+
+    def _read_batch(self) -> Tuple[List[Dict[str, Any]], int]:
+        """从检查点读取至多 batch_size 条完整回执，返回(回执, 读到的行数)"""
+        items, lines = [], 0
+        while lines < self.batch_size:
+            line = self._reader.readline()
+            if not line:
+                break
+            if not line.endswith(b'\n'):
+                self._reader.seek(-len(line), os.SEEK_CUR)
+                break
+            lines += 1
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                self.metrics['corrupt'] += 1
+        return items, lines
+
+    def _publish_batch(self, items: List[Dict[str, Any]]):
+        """
+        按目的地分组，每组发布为一条消息(回执数组)；代理确认前阻塞的只是发布线程
+        每组确认后记入检查点，批次中途失败重发时跳过已确认的组
+        """
+        groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for item in items:
+            if item['receipt']['receipt_id'] not in self._confirmed:
+                groups.setdefault((item['exchange'], item['routing_key']), []).append(item['receipt'])
+        for (exchange, routing_key), receipts in groups.items():
+            try:
+                self._channel.basic_publish(
+                    exchange=exchange,
+                    routing_key=routing_key,
+                    body=json.dumps(receipts, ensure_ascii=False, default=str).encode('utf-8'),
+                    properties=pika.BasicProperties(
+                        content_type='application/json',
+                        delivery_mode=2,
+                        timestamp=int(time.time()),
+                        type='delivery-receipts',
+                        headers={'x-receipt-count': len(receipts)}
+                    ),
+                    mandatory=True
+                )
+            except pika.exceptions.UnroutableError:
+                # 回复队列已不存在：重发也无法送达，计数后跳过
+                self.metrics['unroutable'] += len(receipts)
+                logger.warning(f"回执无法路由，已丢弃 {len(receipts)} 条: {exchange or '(默认)'}/{routing_key}")
+            else:
+                self.metrics['published'] += len(receipts)
+                self.metrics['batches'] += 1
+            self._confirmed.update(receipt['receipt_id'] for receipt in receipts)
+            self._save_checkpoint()
+
+    def _flush(self, force: bool = False):
+        """凑够一批或最早的回执已等待 flush_interval 时发布，确认后推进检查点"""
+        while self._pending:
+            due = force or self._pending >= self.batch_size or \
+                time.monotonic() - self._pending_since >= self.flush_interval
+            if not due or not self._ensure_channel():
+                return
+            items, lines = self._read_batch()
+            if not lines:
+                return
+            try:
+                self._publish_batch(items)
+            except pika.exceptions.NackError:
+                self.metrics['nacked'] += 1
+                logger.warning("回执被代理拒绝确认，稍后重发")
+                self._reader.seek(self._committed)
+                self._disconnect()
+                return
+            except Exception as e:
+                self.metrics['publish_errors'] += 1
+                logger.error(f"回执发布失败，稍后重发: {e}")
+                self._reader.seek(self._committed)
+                self._disconnect()
+                return
+            self._committed = self._reader.tell()
+            self._confirmed.clear()
+            self._save_checkpoint()
+            self._pending = max(0, self._pending - lines)
+            self._pending_since = time.monotonic()
+            self.metrics['pending'] = self._pending
+        self._compact()
+
+    def _wait(self) -> float:
+        """下一次尝试发布前等待新回执的时长；发布连接断开时等到重连时刻，不空转"""
+        if not self._pending:
+            return self.flush_interval
+        now = time.monotonic()
+        wait = min(self._pending_since + self.flush_interval - now, self.flush_interval)
+        if self._channel is None or not self._channel.is_open:
+            wait = max(wait, self._retry_at - now)
+        return max(0.0, wait)
+
+    def _run(self):
+        self._open()
+        while self.running:
+            try:
+                self._spool(self._wait())
+                self._flush()
+                if self._connection is not None and self._connection.is_open:
+                    self._connection.process_data_events(0)  # 维持心跳
+            except Exception as e:
+                logger.error(f"回执发布线程异常: {e}")
+                self._disconnect()
+                time.sleep(min(self.flush_interval, 1))
+        try:
+            self._spool(0)
+            if self._channel is not None:
+                self._flush(force=True)
+        except Exception as e:
+            logger.error(f"停止时回执发布失败，保留在磁盘缓冲中: {e}")
+        self._disconnect()
+        self._writer.close()
+        self._reader.close()
@@ -0,0 +1,85 @@
+import copy
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger("Retry")
+
+
+class RetryPolicy:
+    """
+    延迟重试与死信路由
+    每一级重试对应一个带 TTL 的延迟队列，到期后死信回主队列，延迟按指数递增；
+    已重试次数从 x-death 头统计(并以自带的 x-retry-count 兜底)，超过上限后转入 dlx.<queue>
+    """
+
+    def __init__(self, queue_name: str, base_delay: float = 5, multiplier: float = 4,
+                 max_attempts: int = 5, levels: int = 4):
+        self.queue_name = queue_name
+        self.max_attempts = max_attempts
+        self.delays: List[float] = [base_delay * multiplier ** i for i in range(levels)]
+        self.dlx_queue = f'dlx.{queue_name}'
+
+        # 统计
+        self.metrics = {
+            'retried': 0,
+            'dead_lettered': 0
+        }
+
+    @classmethod
+    def from_config(cls, queue_name: str, config: Dict[str, Any]) -> 'RetryPolicy':
+        return cls(queue_name,
+                   base_delay=config.get('base_delay', 5),
+                   multiplier=config.get('multiplier', 4),
+                   max_attempts=config.get('max_attempts', 5),
+                   levels=config.get('levels', 4))
+
+    def retry_queue(self, level: int) -> str:
+        """第 level 级延迟队列名"""
+        return f'retry.{self.queue_name}.{level}'
+
+    def declare(self, channel, durable: bool = True):
+        """声明各级延迟队列，到期消息死信回主队列"""
+        for level, delay in enumerate(self.delays):
+            channel.queue_declare(
+                queue=self.retry_queue(level),
+                durable=durable,
+                arguments={
+                    'x-message-ttl': int(delay * 1000),
+                    'x-dead-letter-exchange': '',
+                    'x-dead-letter-routing-key': self.queue_name
+                }
+            )
+        logger.info(f"延迟重试队列已声明: {', '.join(f'{d:g}s' for d in self.delays)}")
+
+    def attempts(self, properties) -> int:
+        """从 x-death 头统计已经历的重试次数"""
+        headers = getattr(properties, 'headers', None) or {}
+        prefix = f'retry.{self.queue_name}.'
+        deaths = sum(int(death.get('count', 1)) for death in headers.get('x-death') or []
+                     if str(death.get('queue', '')).startswith(prefix))
+        return max(deaths, int(headers.get('x-retry-count', 0)))
+
+    def route(self, channel, properties, body: bytes, reason: str, retry: bool = True) -> str:
+        """
+        把失败消息发布到下一级延迟队列或死信队列，返回目标队列
+        channel 须为确认模式：发布返回即代理已确认，调用方随后才能确认原消息；
+        代理拒绝或无法路由时抛出异常，原消息应退回而不是确认
+        """
+        attempt = self.attempts(properties)
+        headers = dict(getattr(properties, 'headers', None) or {})
+        headers['x-last-error'] = reason[:200]
+
+        if retry and attempt + 1 < self.max_attempts:
+            target = self.retry_queue(min(attempt, len(self.delays) - 1))
+            headers['x-retry-count'] = attempt + 1
+            self.metrics['retried'] += 1
+        else:
+            target = self.dlx_queue
+            headers['x-final-attempts'] = attempt + 1
+            self.metrics['dead_lettered'] += 1
+
+        # 原投递的属性保持不变，失败时退回代理的仍是原消息
+        properties = copy.copy(properties)
+        properties.headers = headers
+        channel.basic_publish(exchange='', routing_key=target, body=body, properties=properties, mandatory=True)
+        return target
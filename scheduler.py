@@ -0,0 +1,269 @@
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from coalesce import Coalescer
+from journal import DeliveryJournal, message_key
+from model import Notice
+from ratelimit import RateLimiter
+
+logger = logging.getLogger("Scheduler")
+
+
+class Delivery:
+    """一条待确认的投递及其尚未完成的群"""
+
+    __slots__ = ('key', 'data', 'properties', 'on_done', 'pending', 'failed', 'received_at', 'twins')
+
+    def __init__(self, key: str, data: Notice, properties, on_done: Callable, groups: List[str]):
+        self.key = key
+        self.data = data
+        self.properties = properties
+        self.on_done = on_done
+        self.pending = list(groups)
+        self.failed = False
+        self.received_at = time.monotonic()
+        self.twins: List['Delivery'] = []  # 合并进来的同键投递，随本投递一起回调
+
+    def absorb(self, other: 'Delivery'):
+        """合并同键投递：补上对方独有的待发群，确认时一并回调"""
+        self.pending.extend(group for group in other.pending if group not in self.pending)
+        self.twins.append(other)
+
+    def finish(self, result):
+        for on_done in [self.on_done] + [twin.on_done for twin in self.twins]:
+            try:
+                on_done(result)
+            except Exception as e:
+                logger.error(f"投递 {self.key} 的确认回调异常: {e}")
+
+
+class GroupBatchScheduler:
+    """
+    按群聚合的批量调度器
+    在时间窗口内缓冲投递并按目标群重新分组，每个群只打开一次、依次发送其全部待发消息，
+    一条投递的所有群都完成后才回调 on_done(True)，任一群失败则回调 on_done(None) 触发重试；
+    配置投递日志时跳过重新投递中已发送过的群；配置限速器时优先发送有令牌的群，
+    每次只发送该群当前令牌允许的条数，其余留到令牌恢复后再发；
+    配置多桌面时每一轮把各群的分片同时交给各自桌面并行发送；
+    群和群内消息按紧急程度(优先级、截止时间)排序，同等紧急的保持到达顺序，
+    刷新时提供 preempt 回调则在群边界检查是否有更紧急的消息在等待，有则让出，
+    未完成的投递留在缓冲区中，与新消息合并后按紧急程度重新排序；
+    配置合并器时同一个群的多条消息拼接成一条发送，限速按发送次数而不是消息条数计
+    """
+
+    def __init__(self, sender: Callable[[str, List[str]], None],
+                 window: float = 1.0, max_messages: int = 50,
+                 journal: DeliveryJournal = None, rate_limiter: RateLimiter = None,
+                 desktops=None, coalescer: Coalescer = None):
+        self.sender = sender
+        self.journal = journal
+        self.rate_limiter = rate_limiter
+        self.desktops = desktops
+        self.coalescer = coalescer
+        self.window = window
+        self.max_messages = max_messages
+        self._deliveries: List[Delivery] = []
+        self.first_at: Optional[float] = None
+
+        # 统计
+        self.metrics = {
+            'batches': 0,
+            'deliveries': 0,
+            'chat_switches': 0,
+            'messages_sent': 0,
+            'group_failures': 0,
+            'groups_skipped': 0,
+            'preempted': 0
+        }
+
+    def submit(self, data: Notice, properties, on_done: Callable) -> bool:
+        """加入缓冲区，返回 True 表示已达到批量上限、应立即刷新"""
+        groups = list(data.groups)
+        if not groups:
+            logger.warning(f"未知消息类型: {data},不予处理")
+            on_done(True)  # 确认未知类型消息，避免阻塞队列
+            return False
+
+        key = message_key(data, properties)
+        if self.journal:
+            done = self.journal.done_groups(key)
+            if done:
+                self.metrics['groups_skipped'] += len(done.intersection(groups))
+                groups = [group for group in groups if group not in done]
+            if not groups:
+                logger.info(f"消息 {key} 的所有群均已发送，直接确认")
+                on_done(True)
+                return False
+
+        if not self._deliveries:
+            self.first_at = time.monotonic()
+        self._deliveries.append(Delivery(key, data, properties, on_done, groups))
+        return len(self._deliveries) >= self.max_messages
+
+    def pending_count(self) -> int:
+        """缓冲中的投递数"""
+        return len(self._deliveries)
+
+    def is_due(self, now: float = None) -> bool:
+        """缓冲窗口是否已到期"""
+        if not self._deliveries:
+            return False
+        now = time.monotonic() if now is None else now
+        return now - self.first_at >= self.window
+
+    @staticmethod
+    def collapse(deliveries: List[Delivery]) -> List[Delivery]:
+        """同键的投递(生产者重复发布、重新投递)合并为一条，同一消息不会向同一个群发两次"""
+        primary: Dict[str, Delivery] = {}
+        result = []
+        for delivery in deliveries:
+            first = primary.get(delivery.key)
+            if first is None:
+                primary[delivery.key] = delivery
+                result.append(delivery)
+            else:
+                first.absorb(delivery)
+        return result
+
+    def plan(self, deliveries: List[Delivery]) -> Dict[str, List[Delivery]]:
+        """按群重新分组，群和群内消息按紧急程度排序，同等紧急的保持到达顺序；同键投递只计一次"""
+        plan: Dict[str, List[Delivery]] = {}
+        planned = set()
+        for delivery in sorted(deliveries, key=lambda d: d.data.urgency):
+            for group in delivery.pending:
+                if (delivery.key, group) in planned:
+                    continue
+                planned.add((delivery.key, group))
+                plan.setdefault(group, []).append(delivery)
+        return plan
+
+    def _next_group(self, plan: Dict[str, List[Delivery]]) -> str:
+        """下一个要发送的群：最紧急的群优先，无限速时同等紧急按到达顺序，有限速时取等待时间最短的群"""
+        if not self.rate_limiter:
+            return min(plan, key=lambda group: plan[group][0].data.urgency)
+        return min(plan, key=lambda group: (plan[group][0].data.urgency, self.rate_limiter.delay(group)))
+
+    @staticmethod
+    def _urgency(plan: Dict[str, List[Delivery]]):
+        """计划中剩余投递的最高紧急程度"""
+        return min(members[0].data.urgency for members in plan.values())
+
+    def _chunk(self, group: str, members: List[Delivery]) -> List[Delivery]:
+        """本次打开该群发送的投递，受限速时只取当前令牌允许的条数"""
+        if not self.rate_limiter:
+            return members
+        sends = max(1, self.rate_limiter.available(group))
+        return members[:self.coalescer.capacity(sends) if self.coalescer else sends]
+
+    def _texts(self, members: List[Delivery]) -> List[str]:
+        """本次发送的文本，配置合并器时拼接成尽量少的条数"""
+        texts = [delivery.data.text for delivery in members]
+        return self.coalescer.join(texts) if self.coalescer else texts
+
+    def _unsent(self, group: str, members: List[Delivery]) -> List[Delivery]:
+        """发送前再查一次投递日志：提交后才由其他路径完成的群不再发送"""
+        if not self.journal:
+            return members
+        unsent = []
+        for delivery in members:
+            if self.journal.is_done(delivery.key, group):
+                delivery.pending.remove(group)
+                self.metrics['groups_skipped'] += 1
+            else:
+                unsent.append(delivery)
+        return unsent
+
+    def _take(self, plan: Dict[str, List[Delivery]], group: str) -> List[Delivery]:
+        """从计划中取出该群本次发送的投递"""
+        plan[group] = self._unsent(group, plan[group])
+        if not plan[group]:
+            del plan[group]
+            return []
+        members = self._chunk(group, plan[group])
+        remaining = plan[group][len(members):]
+        if remaining:
+            plan[group] = remaining
+        else:
+            del plan[group]
+        self.metrics['chat_switches'] += 1
+        return members
+
+    def _finish(self, plan: Dict[str, List[Delivery]], group: str, members: List[Delivery],
+                error: Optional[Exception]):
+        """记录一次群发送的结果，失败时该群剩余的投递一并标记失败"""
+        if error is None:
+            self.metrics['messages_sent'] += len(members)
+            for delivery in members:
+                delivery.pending.remove(group)
+                if self.journal:
+                    self.journal.record(delivery.key, group)
+        else:
+            logger.error(f"群 {group} 发送失败: {error}")
+            self.metrics['group_failures'] += 1
+            for delivery in members + plan.pop(group, []):
+                delivery.failed = True
+
+    def flush(self, preempt: Callable[[tuple], bool] = None):
+        """
+        发送缓冲区内的全部消息并回调确认
+        preempt(urgency) 在每个群(多桌面时每一轮)之后调用，返回 True 则停止本次刷新；
+        中途出错时已取出的投递全部回调 None(重试)后再抛出异常
+        """
+        deliveries, self._deliveries = self._deliveries, []
+        first_at, self.first_at = self.first_at, None
+        if not deliveries:
+            return
+
+        deliveries = self.collapse(deliveries)
+        try:
+            self._send(deliveries, preempt)
+        except Exception:
+            # 发送、投递日志或多桌面出错：本批全部按失败回调转入重试(已发送的群记在日志中，不会重发)
+            for delivery in deliveries:
+                delivery.failed = True
+            raise
+        finally:
+            for delivery in deliveries:
+                if delivery.pending and not delivery.failed:
+                    self._deliveries.append(delivery)  # 被抢占，剩余的群留到下一次刷新
+                else:
+                    delivery.finish(None if delivery.failed else True)
+            if self._deliveries:
+                self.first_at = first_at  # 沿用原窗口起点，下一轮立即到期
+
+    def _send(self, deliveries: List[Delivery], preempt: Callable[[tuple], bool] = None):
+        plan = self.plan(deliveries)
+        logger.info(f"批量发送: {len(deliveries)} 条投递 -> {len(plan)} 个群")
+        self.metrics['batches'] += 1
+        self.metrics['deliveries'] += len(deliveries)
+
+        while plan:
+            if self.desktops:
+                batch = {group: members for group, members in
+                         ((group, self._take(plan, group)) for group in list(plan)) if members}
+                if batch:
+                    results = self.desktops.send_groups(
+                        {group: self._texts(members) for group, members in batch.items()})
+                    for group, members in batch.items():
+                        self._finish(plan, group, members, results[group])
+            else:
+                group = self._next_group(plan)
+                members = self._take(plan, group)
+                if not members:
+                    continue
+                try:
+                    self.sender(group, self._texts(members))
+                    error = None
+                except Exception as e:
+                    error = e
+                self._finish(plan, group, members, error)
+
+            if plan and preempt is not None and preempt(self._urgency(plan)):
+                self.metrics['preempted'] += 1
+                logger.info(f"批量发送被更紧急的消息抢占，剩余 {len(plan)} 个群稍后发送")
+                break
+
+        if self.journal:
+            self.journal.flush()
+
@@ -0,0 +1,85 @@
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("ChatSession")
+
+
+class ChatSession:
+    """
+    当前打开聊天的会话状态
+    记录当前打开的群及选中时间，目标群一致且状态仍新鲜时可跳过搜索和选中步骤。
+    失效规则: 超时未使用、发送失败、焦点丢失(前台窗口或鼠标位置被改变)
+    """
+
+    def __init__(self, ttl: float = 30.0, focus_probe: Callable[[], Any] = None):
+        self.ttl = ttl
+        self.focus_probe = focus_probe
+        self.current: Optional[str] = None
+        self.selected_at: Optional[float] = None
+        self.last_used_at: Optional[float] = None
+        self.focus_token = None
+
+        # 统计
+        self.metrics = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': {}
+        }
+
+    def _probe(self):
+        if not self.focus_probe:
+            return None
+        try:
+            return self.focus_probe()
+        except Exception as e:
+            logger.debug(f"焦点探测失败: {e}")
+            return None
+
+    def select(self, group: str):
+        """记录已选中的群"""
+        now = time.monotonic()
+        self.current = group
+        self.selected_at = now
+        self.last_used_at = now
+        self.focus_token = self._probe()
+
+    def touch(self):
+        """发送成功后刷新使用时间和焦点快照"""
+        if self.current is not None:
+            self.last_used_at = time.monotonic()
+            self.focus_token = self._probe()
+
+    def invalidate(self, reason: str):
+        """使当前会话失效"""
+        if self.current is None:
+            return
+        logger.debug(f"会话失效: {self.current} ({reason})")
+        invalidations = self.metrics['invalidations']
+        invalidations[reason] = invalidations.get(reason, 0) + 1
+        self.current = None
+        self.selected_at = None
+        self.last_used_at = None
+        self.focus_token = None
+
+    def is_current(self, group: str) -> bool:
+        """目标群是否就是当前打开且仍然有效的聊天"""
+        if self.current is None or self.current != group:
+            self.metrics['misses'] += 1
+            return False
+        if time.monotonic() - self.last_used_at > self.ttl:
+            self.invalidate('timeout')
+            self.metrics['misses'] += 1
+            return False
+        if self._probe() != self.focus_token:
+            self.invalidate('focus_lost')
+            self.metrics['misses'] += 1
+            return False
+        self.metrics['hits'] += 1
+        return True
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取会话命中统计"""
+        metrics = self.metrics.copy()
+        metrics['current'] = self.current
+        return metrics
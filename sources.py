@@ -0,0 +1,509 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from dedup import dedup_key
+from model import InvalidNotice, Notice, accepted, decode_notice
+from metrics import registry
+
+logger = logging.getLogger("Sources")
+
+DEFAULT_SPOOL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spool.jsonl')
+DEAD_LETTER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dead_letter.jsonl')
+
+
+class LocalProperties:
+    """本地输入源的消息属性，字段与 pika.BasicProperties 中流水线用到的部分一致"""
+
+    __slots__ = ('message_id', 'priority', 'timestamp', 'headers', 'reply_to', 'correlation_id')
+
+    def __init__(self, message_id: str = None, priority: int = None, timestamp: int = None,
+                 headers: Dict[str, Any] = None, reply_to: str = None, correlation_id: str = None):
+        self.message_id = message_id
+        self.priority = priority
+        self.timestamp = timestamp if timestamp is not None else int(time.time())
+        self.headers = headers if headers is not None else {}
+        self.reply_to = reply_to
+        self.correlation_id = correlation_id
+
+
+class LocalIngest:
+    """
+    本地输入源共用的投递逻辑，与消费者走同一条流水线
+    去重后交给GUI执行器；要求重试时按指数延迟重新提交，超过次数或被拒绝时写入死信文件
+    """
+
+    def __init__(self, name: str, executor, dedup=None, dedup_mode: str = 'message_id',
+                 high_water: int = 80, max_attempts: int = 5, retry_delay: float = 5,
+                 dead_letter: Optional[str] = DEAD_LETTER_PATH, receipts=None):
+        self.name = name
+        self.executor = executor
+        self.dedup = dedup
+        self.dedup_mode = dedup_mode
+        self.high_water = high_water
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.dead_letter_path = dead_letter
+        self.receipts = receipts
+        self._lock = threading.Lock()
+
+        # 统计
+        self.metrics = registry.state(f'source_{name}', {
+            'received': 0,
+            'invalid': 0,
+            'duplicate': 0,
+            'processed': 0,
+            'retried': 0,
+            'dead_lettered': 0,
+            'rejected_busy': 0
+        })
+
+    @classmethod
+    def from_config(cls, name: str, config: Dict[str, Any], executor, dedup=None,
+                    receipts=None) -> 'LocalIngest':
+        """按消费者配置创建：sources 段的重试与死信设置，executor.high_water 作为背压阈值"""
+        sources = config['sources']
+        return cls(name, executor, dedup, dedup_mode=config['dedup']['key'],
+                   high_water=config['executor']['high_water'],
+                   max_attempts=sources['max_attempts'], retry_delay=sources['retry_delay'],
+                   dead_letter=sources['dead_letter'], receipts=receipts)
+
+    def busy(self, incoming: int = 0) -> bool:
+        """本地积压加上即将提交的数量是否超过高水位"""
+        return self.executor.backlog() + incoming >= self.high_water
+
+    def dead_letter(self, reason: str, notice: Notice = None, raw: Any = None):
+        """追加写入死信文件(JSONL)，保留原始内容以便人工处理后重新投递"""
+        self.metrics['dead_lettered'] += 1
+        logger.error(f"[{self.name}] 消息转入死信: {reason}")
+        if not self.dead_letter_path:
+            return
+        record = {'at': time.strftime('%Y-%m-%d %H:%M:%S'), 'source': self.name, 'reason': reason}
+        if notice is not None:
+            record['key'] = notice.key
+            record['notice'] = notice.to_dict()
+        else:
+            record['raw'] = raw.decode('utf-8', 'replace') if isinstance(raw, bytes) else raw
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def invalid(self, reason: str, raw: Any):
+        """畸形输入：计数后直接转入死信，不重试"""
+        self.metrics['invalid'] += 1
+        self.dead_letter(reason, raw=raw)
+
+    def deliver(self, notice: Notice, properties: LocalProperties,
+                on_settled: Callable[[bool], None] = None, attempt: int = 1) -> bool:
+        """
+        提交一条通知；执行队列已满时返回 False，调用方稍后重试或向生产者返回背压
+        on_settled(ok) 在消息最终完成(成功/重复)或转入死信后调用一次
+        """
+        key = dedup_key(notice, properties, self.dedup_mode)
+
+        def duplicate():
+            self.metrics['duplicate'] += 1
+            logger.info(f"[{self.name}] ♻️ 重复消息，跳过: {key}")
+            if self.receipts:
+                self.receipts.report(key, notice.groups, 'duplicate', properties, time.time())
+            if on_settled:
+                on_settled(True)
+
+        def after_inflight(ok):
+            # 同键消息处理完成：成功按重复处理，失败则本条稍后重新提交
+            if ok:
+                duplicate()
+            else:
+                self._retry(notice, properties, on_settled, attempt)
+
+        claimed = self.dedup.claim(key, after_inflight) if self.dedup else True
+        if claimed is not True:
+            self.metrics['received'] += 1
+            if claimed is False:
+                duplicate()
+            return True
+        received_at = time.perf_counter()
+        received_wall = time.time()
+
+        def done(result):
+            elapsed = time.perf_counter() - received_at
+            registry.observe('message', elapsed)
+            registry.observe_priority('message', notice.priority, elapsed)
+            if self.receipts:
+                self.receipts.report(key, notice.groups, self.receipts.status(result), properties, received_wall)
+            if self.dedup:
+                self.dedup.release(key, accepted(result))
+            if accepted(result):
+                self.metrics['processed'] += 1
+                logger.info(f"[{self.name}] ✅ 消息处理成功: {key}")
+            elif result is False:
+                self.dead_letter('处理器拒绝', notice)
+            elif attempt < self.max_attempts:
+                self._retry(notice, properties, on_settled, attempt + 1)
+                return
+            else:
+                self.dead_letter(f'重试{attempt}次后仍失败', notice)
+            if on_settled:
+                on_settled(accepted(result))
+
+        if not self.executor.submit(notice, properties, done):
+            if self.dedup:
+                self.dedup.release(key, False)
+            if attempt == 1:
+                self.metrics['rejected_busy'] += 1
+            return False
+        if attempt == 1:
+            self.metrics['received'] += 1
+        return True
+
+    def _retry(self, notice: Notice, properties: LocalProperties, on_settled, attempt: int):
+        """延迟后重新提交；执行队列仍满时按同一延迟再等"""
+        self.metrics['retried'] += 1
+        delay = self.retry_delay * 2 ** (attempt - 2)
+        logger.warning(f"[{self.name}] ⚠️ 消息处理失败，{delay:.1f}秒后第{attempt}次处理: {notice.key}")
+
+        def resubmit():
+            if not self.deliver(notice, properties, on_settled, attempt):
+                self._schedule(delay, resubmit)
+
+        self._schedule(delay, resubmit)
+
+    @staticmethod
+    def _schedule(delay: float, callback: Callable):
+        timer = threading.Timer(delay, callback)
+        timer.daemon = True
+        timer.start()
+
+
+class SpoolSource:
+    """
+    流式读取 JSONL 假脱机文件，每行一条通知
+    按字节偏移断点续读：只有偏移之前的行全部完成(成功、重复或转入死信)才推进检查点，
+    检查点原子写入；单行长度和在途行数都有上限，内存占用与文件大小无关。
+    支持文件被截断(从头读)和轮转(旧文件读完且在途行完成后切到新文件)
+    """
+
+    def __init__(self, ingest: LocalIngest, path: str = DEFAULT_SPOOL_PATH, checkpoint: str = None,
+                 poll_interval: float = 0.5, max_line_bytes: int = 65536, max_inflight: int = 100,
+                 checkpoint_interval: float = 1.0):
+        self.ingest = ingest
+        self.path = path
+        self.checkpoint_path = checkpoint or path + '.offset'
+        self.poll_interval = poll_interval
+        self.max_line_bytes = max_line_bytes
+        self.max_inflight = max_inflight
+        self.checkpoint_interval = checkpoint_interval
+        self.running = False
+        self.thread = None
+        self._file = None
+        self._inode = None
+        self._lock = threading.Lock()
+        self._pending = deque()  # 在途行 [行尾偏移, 是否完成]，按文件顺序
+        self._committed = 0  # 已完成的连续前缀的结束偏移
+        self._saved = None
+        self._saved_at = 0.0
+        self._skipping = False  # 正在跳过超长行的剩余部分
+
+        # 统计
+        self.metrics = registry.state('spool', {
+            'lines': 0,
+            'overlong': 0,
+            'checkpoints': 0,
+            'truncations': 0,
+            'rotations': 0
+        })
+
+    @classmethod
+    def from_config(cls, ingest: LocalIngest, config: Dict[str, Any]) -> 'SpoolSource':
+        return cls(ingest, config['path'], checkpoint=config.get('checkpoint'),
+                   poll_interval=config['poll_interval'], max_line_bytes=config['max_line_bytes'],
+                   max_inflight=config['max_inflight'], checkpoint_interval=config['checkpoint_interval'])
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="Spool-Reader", daemon=True)
+        self.thread.start()
+        logger.info(f"假脱机文件输入已启动: {self.path}")
+
+    def stop(self, timeout: float = 5):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=timeout)
+        self._save_checkpoint()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                state = json.load(f)
+            return int(state.get('offset', 0)), state.get('inode')
+        except FileNotFoundError:
+            return 0, None
+        except (ValueError, TypeError, OSError) as e:
+            logger.error(f"检查点损坏，从头读取: {e}")
+            return 0, None
+
+    def _save_checkpoint(self):
+        with self._lock:
+            offset = self._committed
+        state = (offset, self._inode)
+        self._saved_at = time.monotonic()
+        if state == self._saved:
+            return
+        temp = self.checkpoint_path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({'offset': offset, 'inode': self._inode}, f)
+        os.replace(temp, self.checkpoint_path)
+        self._saved = state
+        self.metrics['checkpoints'] += 1
+
+    def _open(self) -> bool:
+        """打开文件并定位到检查点；文件不存在返回 False"""
+        try:
+            self._file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return False
+        stat = os.fstat(self._file.fileno())
+        offset, inode = self._load_checkpoint()
+        if inode is not None and inode != stat.st_ino:
+            logger.info("假脱机文件已轮转，从头读取")
+            offset = 0
+        elif offset > stat.st_size:
+            logger.info("假脱机文件已截断，从头读取")
+            offset = 0
+        self._inode = stat.st_ino
+        self._file.seek(offset)
+        with self._lock:
+            self._pending.clear()
+            self._committed = offset
+        self._skipping = False
+        return True
+
+    def _complete(self, entry: List):
+        """一行完成，推进连续完成前缀的检查点偏移"""
+        with self._lock:
+            entry[1] = True
+            while self._pending and self._pending[0][1]:
+                self._committed = self._pending.popleft()[0]
+
+    def _backlogged(self) -> bool:
+        with self._lock:
+            inflight = len(self._pending)
+        return inflight >= self.max_inflight or self.ingest.busy()
+
+    def _rotated(self) -> bool:
+        """读到文件末尾时检查：文件被截断则从头读；被替换且旧文件在途行全部完成则切到新文件"""
+        stat = os.fstat(self._file.fileno())
+        if stat.st_size < self._file.tell():
+            self.metrics['truncations'] += 1
+            logger.warning("假脱机文件已截断，从头读取")
+            self._file.seek(0)
+            with self._lock:
+                self._pending.clear()
+                self._committed = 0
+            self._skipping = False
+            return True
+        try:
+            current = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return False
+        if current == self._inode:
+            return False
+        with self._lock:
+            if self._pending:
+                return False
+        self.metrics['rotations'] += 1
+        logger.info("假脱机文件已轮转，切换到新文件")
+        self._file.close()
+        self._file = None
+        # 检查点清零后由 _open 打开新文件从头读
+        self._inode = None
+        with self._lock:
+            self._committed = 0
+        self._save_checkpoint()
+        return True
+
+    def _read_line(self) -> Optional[bool]:
+        """读取并提交一行：读到内容返回 True，到达文件末尾返回 False，执行队列已满返回 None"""
+        start = self._file.tell()
+        line = self._file.readline(self.max_line_bytes + 1)
+        if not line:
+            return False
+        if not line.endswith(b'\n'):
+            if self._skipping or len(line) > self.max_line_bytes:
+                # 超长行只保留开头写入死信，其余部分直接跳过，不整行读入内存
+                if not self._skipping:
+                    self.metrics['overlong'] += 1
+                    self.ingest.invalid(f'行超过 {self.max_line_bytes} 字节', line[:200])
+                self._skipping = True
+                return True
+            # 写入方尚未写完这一行，下次再读
+            self._file.seek(start)
+            return False
+        end = self._file.tell()
+        entry = [end, False]
+        with self._lock:
+            self._pending.append(entry)
+        if self._skipping:
+            self._skipping = False
+            self._complete(entry)
+            return True
+
+        self.metrics['lines'] += 1
+        line = line.strip()
+        if not line:
+            self._complete(entry)
+            return True
+        try:
+            notice = decode_notice(line)
+        except InvalidNotice as e:
+            self.ingest.invalid(str(e), line[:500])
+            self._complete(entry)
+            return True
+        properties = LocalProperties(headers={'x-spool-offset': start})
+        if not self.ingest.deliver(notice, properties, lambda ok: self._complete(entry)):
+            # 执行队列已满：撤回这一行，稍后重读
+            with self._lock:
+                self._pending.remove(entry)
+            self.metrics['lines'] -= 1
+            self._file.seek(start)
+            return None
+        return True
+
+    def _run(self):
+        while self.running:
+            try:
+                if self._file is None and not self._open():
+                    time.sleep(self.poll_interval)
+                    continue
+                read = None if self._backlogged() else self._read_line()
+                if read:
+                    if time.monotonic() - self._saved_at >= self.checkpoint_interval:
+                        self._save_checkpoint()
+                    continue
+                self._save_checkpoint()
+                # 只在文件末尾检查截断和轮转，背压等待时旧文件可能还没读完
+                if read is None or (self._file is not None and not self._rotated()):
+                    time.sleep(self.poll_interval)
+            except Exception as e:
+                logger.error(f"假脱机文件读取异常: {e}")
+                time.sleep(self.poll_interval)
+
+
+class HttpSource:
+    """
+    本地 HTTP 输入：POST /notices，请求体为单条通知对象或通知数组
+    全部校验通过才提交；本地积压超过高水位返回 429，提交中途队列已满返回 503 和未受理的序号，
+    两者都带 Retry-After；成功返回 202 和受理条数
+    """
+
+    def __init__(self, ingest: LocalIngest, host: str = '127.0.0.1', port: int = 9109,
+                 max_batch: int = 100, max_body: int = 1048576, retry_after: int = 1):
+        self.ingest = ingest
+        self.host = host
+        self.port = port
+        self.max_batch = max_batch
+        self.max_body = max_body
+        self.retry_after = retry_after
+        self.server = None
+        self.thread = None
+
+        # 统计
+        self.metrics = registry.state('http_source', {
+            'requests': 0,
+            'accepted': 0,
+            'bad_requests': 0,
+            'throttled': 0,
+            'unavailable': 0
+        })
+
+    @classmethod
+    def from_config(cls, ingest: LocalIngest, config: Dict[str, Any]) -> 'HttpSource':
+        return cls(ingest, config['host'], config['port'], max_batch=config['max_batch'],
+                   max_body=config['max_body'], retry_after=config['retry_after'])
+
+    def accept(self, payload: Any):
+        """校验并提交请求体，返回 (状态码, 响应对象)"""
+        self.metrics['requests'] += 1
+        items = payload if isinstance(payload, list) else [payload]
+        if not items or len(items) > self.max_batch:
+            self.metrics['bad_requests'] += 1
+            return 400, {'error': f'每次提交 1~{self.max_batch} 条通知'}
+        notices, errors = [], []
+        for index, item in enumerate(items):
+            try:
+                notices.append(Notice.from_dict(item))
+            except InvalidNotice as e:
+                errors.append({'index': index, 'error': str(e)})
+        if errors:
+            self.metrics['bad_requests'] += 1
+            return 400, {'error': '通知校验失败', 'errors': errors}
+        if self.ingest.busy(len(notices)):
+            self.metrics['throttled'] += 1
+            return 429, {'error': '本地队列积压过多，请稍后重试', 'accepted': 0}
+
+        accepted = 0
+        for notice in notices:
+            if not self.ingest.deliver(notice, LocalProperties()):
+                break
+            accepted += 1
+        self.metrics['accepted'] += accepted
+        if accepted < len(notices):
+            self.metrics['unavailable'] += 1
+            return 503, {'error': 'GUI执行队列已满', 'accepted': accepted,
+                         'rejected': list(range(accepted, len(notices)))}
+        return 202, {'accepted': accepted, 'keys': [notice.key for notice in notices]}
+
+    def start(self):
+        """在后台线程启动服务"""
+        from flask import Flask, Response, request
+        from werkzeug.serving import make_server
+
+        app = Flask('wecom-ingest')
+        app.config['MAX_CONTENT_LENGTH'] = self.max_body
+
+        @app.route('/notices', methods=['POST'])
+        def notices():
+            payload = request.get_json(force=True, silent=True)
+            if payload is None:
+                self.metrics['requests'] += 1
+                self.metrics['bad_requests'] += 1
+                status, body = 400, {'error': '请求体不是合法JSON'}
+            else:
+                status, body = self.accept(payload)
+            response = Response(json.dumps(body, ensure_ascii=False), status=status,
+                                mimetype='application/json')
+            if status in (429, 503):
+                response.headers['Retry-After'] = str(self.retry_after)
+            return response
+
+        self.server = make_server(self.host, self.port, app, threaded=True)
+        self.thread = threading.Thread(target=self.server.serve_forever, name="Ingest-HTTP", daemon=True)
+        self.thread.start()
+        logger.info(f"HTTP输入已启动: http://{self.host}:{self.port}/notices")
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server = None
+
+
+def build_sources(config: Dict[str, Any], executor, dedup=None, receipts=None) -> List[Any]:
+    """按消费者配置的 sources 段创建本地输入源(未启动)"""
+    sources = []
+    spool_config = config['sources']['spool']
+    if spool_config['enabled']:
+        ingest = LocalIngest.from_config('spool', config, executor, dedup, receipts)
+        sources.append(SpoolSource.from_config(ingest, spool_config))
+    http_config = config['sources']['http']
+    if http_config['enabled']:
+        ingest = LocalIngest.from_config('http', config, executor, dedup, receipts)
+        sources.append(HttpSource.from_config(ingest, http_config))
+    return sources
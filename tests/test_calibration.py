@@ -0,0 +1,72 @@
+import pytest
+
+import calibration
+from calibration import CalibrationStore, components_from, load_components, profile_name, validate
+from driver import HeadlessDriver
+from locator import TemplateLocator
+
+POINTS = {'msg_area': [40, 40], 'search_area': [10, 10], 'choose_area': [20, 20]}
+
+
+@pytest.fixture(autouse=True)
+def no_templates(monkeypatch):
+    # 测试中不读写仓库里的界面模板
+    monkeypatch.setattr(TemplateLocator, 'available', staticmethod(lambda: False))
+
+
+def calibrated(driver, **extra):
+    profile = dict(POINTS, **extra)
+    profile['fingerprints'] = {key: calibration.fingerprint(driver, profile[key])
+                               for key in calibration.VALIDATED_ANCHORS}
+    return profile
+
+
+def test_profile_named_by_resolution_and_dpi():
+    assert profile_name(HeadlessDriver()) == '1920x1080@96'
+
+
+def test_store_keeps_profiles_side_by_side(tmp_path):
+    store = CalibrationStore(str(tmp_path / 'calibration.json'))
+    assert store.load('1920x1080@96') is None
+    store.save('1920x1080@96', POINTS)
+    store.save('2560x1440@144', {'msg_area': [1, 1]})
+    assert store.load('1920x1080@96') == POINTS
+    assert store.load('2560x1440@144') == {'msg_area': [1, 1]}
+
+
+def test_corrupt_store_reads_as_empty(tmp_path):
+    path = tmp_path / 'calibration.json'
+    path.write_text('{broken', encoding='utf-8')
+    assert CalibrationStore(str(path)).load('1920x1080@96') is None
+
+
+def test_components_skip_missing_optional_anchor():
+    assert components_from(POINTS) == {key: tuple(point) for key, point in POINTS.items()}
+    assert 'header_area' in components_from(dict(POINTS, header_area=[5, 5]))
+
+
+def test_validate_rejects_changed_anchor_or_missing_point():
+    driver = HeadlessDriver()
+    profile = calibrated(driver)
+    assert validate(driver, profile)
+    profile['fingerprints']['msg_area'] = [255]  # 锚点附近截图与标定时明显不同
+    assert not validate(driver, profile)
+    assert not validate(driver, {'msg_area': [1, 1]})
+
+
+def test_load_uses_saved_profile_without_prompting(tmp_path, monkeypatch):
+    driver = HeadlessDriver()
+    store = CalibrationStore(str(tmp_path / 'calibration.json'))
+    store.save(profile_name(driver), calibrated(driver))
+    monkeypatch.setattr(calibration, 'interactive_calibrate', lambda driver: pytest.fail('不应交互式标定'))
+    assert load_components(driver, store) == components_from(POINTS)
+
+
+def test_invalid_profile_falls_back_to_interactive(tmp_path, monkeypatch):
+    driver = HeadlessDriver()
+    store = CalibrationStore(str(tmp_path / 'calibration.json'))
+    store.save(profile_name(driver), {'msg_area': [1, 1]})
+    fresh = dict(POINTS, header_area=[30, 5])
+    monkeypatch.setattr(calibration, 'interactive_calibrate', lambda driver: fresh)
+    assert load_components(driver, store)['header_area'] == (30, 5)
+    assert store.load(profile_name(driver)) == fresh
@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+from coalesce import Coalescer
+from model import Notice
+from scheduler import GroupBatchScheduler
+
+
+def test_joins_in_order_with_indexed_separator():
+    coalescer = Coalescer(separator='\n--{index}--\n')
+    assert coalescer.join(['a', 'b', 'c']) == ['a\n--2--\nb\n--3--\nc']
+    assert coalescer.metrics == {'messages': 3, 'sends': 1, 'sends_saved': 2}
+
+
+def test_splits_on_message_and_char_limits():
+    assert Coalescer('|', max_messages=2).join(['a', 'b', 'c']) == ['a|b', 'c']
+    assert Coalescer('|', max_chars=5).join(['ab', 'cd', 'ef']) == ['ab|cd', 'ef']
+
+
+def test_oversized_message_is_sent_alone():
+    long = 'x' * 10
+    assert Coalescer('|', max_chars=5).join(['a', long, 'b']) == ['a', long, 'b']
+
+
+def test_empty_input_sends_nothing():
+    assert Coalescer().join([]) == []
+
+
+def test_capacity_counts_sends():
+    coalescer = Coalescer(max_messages=4)
+    assert coalescer.capacity(0) == 4
+    assert coalescer.capacity(3) == 12
+
+
+def test_batch_sends_one_coalesced_text_per_group():
+    sends = []
+    scheduler = GroupBatchScheduler(lambda group, texts: sends.append((group, texts)), window=60,
+                                    coalescer=Coalescer('|'))
+    results = []
+    for i in range(3):
+        data = Notice.from_dict({'groupName': ['A'], 'message': f'm{i}'}, SimpleNamespace(message_id=f'm{i}'))
+        scheduler.submit(data, None, results.append)
+    scheduler.flush()
+    assert sends == [('A', ['m0|m1|m2'])]
+    assert results == [True, True, True]
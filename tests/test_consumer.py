@@ -0,0 +1,43 @@
+import logging
+import threading
+
+import pytest
+
+import fakebroker
+
+
+@pytest.fixture
+def consumer(monkeypatch):
+    broker = fakebroker.FakeBroker()
+    module = fakebroker.install(broker)
+    import main
+    monkeypatch.setattr(main, 'pika', module)
+    consumer = main.SSLRabbitMQConsumer({'host': 'fake-broker', 'ssl': {'enabled': False}})
+    assert consumer.connect()
+    consumer._io_thread = threading.get_ident()
+    yield consumer
+    consumer.connection.close()
+
+
+def warnings(caplog, text):
+    return [record for record in caplog.records if record.levelno >= logging.WARNING and text in record.getMessage()]
+
+
+def test_lost_settles_warn_once_per_closed_channel(consumer, caplog):
+    channel = consumer.connection.channel()
+    channel.close()
+    before = consumer.metrics['settles_lost']
+    with caplog.at_level(logging.DEBUG):
+        for i in range(5):
+            consumer._settle_threadsafe(channel, f'm{i}', lambda: pytest.fail('通道已关闭不应确认'))
+    assert len(warnings(caplog, '通道已关闭')) == 1
+    assert consumer.metrics['settles_lost'] - before == 5
+
+
+def test_callbacks_on_dropped_connection_error_once(consumer, caplog):
+    consumer._io_thread = None  # 模拟从GUI线程回调
+    consumer.connection.close()
+    with caplog.at_level(logging.DEBUG):
+        for _ in range(5):
+            consumer._threadsafe(lambda: None)
+    assert len(warnings(caplog, '回调投递失败')) == 1
@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+import pytest
+
+import dedup as dedup_module
+from dedup import DedupCache, dedup_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.time = 1000000.0
+
+    def __call__(self):
+        return self.time
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(dedup_module.time, 'time', clock)
+    return clock
+
+
+def test_claim_release_and_duplicate(clock):
+    cache = DedupCache(path=None)
+    assert cache.claim('m1') is True
+    cache.release('m1', True)
+    assert cache.claim('m1') is False
+    assert cache.get_metrics()['size'] == 1
+
+
+def test_inflight_duplicate_waits_for_first_result(clock):
+    cache = DedupCache(path=None)
+    results = []
+    assert cache.claim('m1') is True
+    assert cache.claim('m1', results.append) is None
+    assert cache.metrics['inflight_hits'] == 1
+    cache.release('m1', False)
+    assert results == [False]
+    assert cache.claim('m1') is True  # 失败后允许重新处理
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = DedupCache(path=None, ttl=60)
+    cache.add('m1')
+    clock.time += 59
+    assert cache.seen('m1')
+    clock.time += 2
+    assert not cache.seen('m1')
+    assert 'm1' not in cache.entries
+
+
+def test_lru_evicts_oldest(clock):
+    cache = DedupCache(path=None, max_entries=2)
+    cache.add('m1')
+    cache.add('m2')
+    assert cache.seen('m1')  # m1 变为最近使用
+    cache.add('m3')
+    assert list(cache.entries) == ['m1', 'm3']
+    assert cache.metrics['evictions'] == 1
+
+
+def test_entries_survive_restart_until_expired(tmp_path, clock):
+    path = str(tmp_path / 'dedup_store.txt')
+    cache = DedupCache(path=path, ttl=60)
+    cache.add('m1')
+    clock.time += 30
+    cache.add('m2')
+    cache.close()
+
+    clock.time += 40  # m1 已过期，m2 未过期
+    restored = DedupCache(path=path, ttl=60)
+    assert not restored.seen('m1')
+    assert restored.seen('m2')
+    restored.close()
+
+
+def test_compaction_keeps_live_entries(tmp_path, clock):
+    path = str(tmp_path / 'dedup_store.txt')
+    cache = DedupCache(path=path, ttl=60, max_entries=10)
+    for i in range(1100):
+        cache.add(f'm{i}')
+    cache.close()
+    with open(path, encoding='utf-8') as f:
+        lines = f.readlines()
+    assert len(lines) < 1100
+    restored = DedupCache(path=path)
+    assert restored.seen('m1099')
+    restored.close()
+
+
+def test_content_mode_ignores_message_id():
+    data = {'groupName': ['A'], 'message': 'hello'}
+    first = dedup_key(data, SimpleNamespace(message_id='x'), mode='content')
+    second = dedup_key(data, SimpleNamespace(message_id='y'), mode='content')
+    assert first == second
+    assert dedup_key(data, SimpleNamespace(message_id='x')) != dedup_key(data, SimpleNamespace(message_id='y'))
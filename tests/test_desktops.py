@@ -0,0 +1,127 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import pytest
+
+import processer
+from desktops import DesktopPool, DesktopSession, HashRing, LimiterClient, serve_tokens
+from driver import HeadlessDriver
+from journal import DeliveryJournal
+from model import Notice
+from ratelimit import RateLimiter
+
+COMPONENT = {'search_area': (10, 10), 'choose_area': (20, 20), 'msg_area': (40, 40)}
+
+
+def test_hash_ring_is_stable_and_moves_few_keys():
+    groups = [f'拍卖群{i:03d}' for i in range(1000)]
+    ring = HashRing([':1', ':2', ':3'])
+    before = {group: ring.node_for(group) for group in groups}
+    assert before == {group: HashRing([':1', ':2', ':3']).node_for(group) for group in groups}
+    assert set(before.values()) == {':1', ':2', ':3'}
+
+    ring.add(':4')
+    moved = [group for group in groups if ring.node_for(group) != before[group]]
+    assert all(ring.node_for(group) == ':4' for group in moved)
+    assert len(moved) < len(groups) / 2
+
+    ring.remove(':4')
+    assert {group: ring.node_for(group) for group in groups} == before
+
+
+def test_empty_ring_raises():
+    with pytest.raises(LookupError):
+        HashRing().node_for('拍卖群001')
+
+
+def test_sessions_send_on_their_own_drivers(tmp_path):
+    drivers = [HeadlessDriver(seed=i) for i in range(2)]
+    pool = DesktopPool([DesktopSession(f'desktop{i}', driver, COMPONENT) for i, driver in enumerate(drivers)])
+    groups = [f'拍卖群{i:02d}' for i in range(8)]
+    journal = DeliveryJournal(str(tmp_path / 'journal.jsonl'))
+    try:
+        pool.process(Notice.from_dict({'groupName': groups, 'message': 'hello'}), journal, 'm1')
+    finally:
+        pool.close()
+        journal.close()
+    for group in groups:
+        assert journal.is_done('m1', group)
+        driver = pool.desktop_for(group).driver
+        assert any(args == (group,) for _, name, args in driver.actions if name == 'paste')
+    assert sum(driver.count('paste') for driver in drivers) == 2 * len(groups)
+
+
+class RemoteDesktop:
+    """进程外桌面替身：记录提交，不做限速"""
+
+    in_process = False
+
+    def __init__(self, name):
+        self.name = name
+        self.submitted = []
+
+    def submit(self, group, messages):
+        self.submitted.append((group, list(messages)))
+        future = Future()
+        future.set_result(None)
+        return future
+
+
+class CountingLimiter:
+    def __init__(self):
+        self.acquired = []
+
+    def acquire(self, group):
+        self.acquired.append(group)
+
+
+def test_send_groups_does_not_drain_tokens_in_parent():
+    limiter = CountingLimiter()
+    processer.set_rate_limiter(limiter)
+    try:
+        pool = DesktopPool([RemoteDesktop(':1'), RemoteDesktop(':2')])
+        results = pool.send_groups({'A': ['1', '2', '3'], 'B': ['4']})
+    finally:
+        processer.set_rate_limiter(None)
+    assert results == {'A': None, 'B': None}
+    assert limiter.acquired == []
+
+
+def test_token_service_paces_each_send():
+    limiter = RateLimiter(global_rate=100, global_burst=100, group_rate=100, group_burst=100, min_interval=0.05)
+    parent, child = multiprocessing.Pipe()
+    thread = threading.Thread(target=serve_tokens, args=(parent, lambda: limiter), daemon=True)
+    thread.start()
+    client = LimiterClient(child)
+    start = time.monotonic()
+    for _ in range(4):
+        client.acquire('A')
+    assert time.monotonic() - start >= 0.15
+    assert limiter.metrics['acquired'] == 4
+    child.close()
+    thread.join(timeout=2)
+    assert not thread.is_alive()
+
+
+def _init_child(tokens):
+    processer.set_rate_limiter(LimiterClient(tokens))
+
+
+def _send_in_child(group, count):
+    for _ in range(count):
+        processer.rate_limiter.acquire(group)
+    return count
+
+
+def test_spawned_process_acquires_from_parent_limiter():
+    limiter = RateLimiter(global_rate=100, global_burst=100, group_rate=100, group_burst=100, min_interval=0.02)
+    context = multiprocessing.get_context('spawn')
+    parent, child = context.Pipe()
+    thread = threading.Thread(target=serve_tokens, args=(parent, lambda: limiter), daemon=True)
+    thread.start()
+    with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_init_child,
+                             initargs=(child,)) as executor:
+        assert executor.submit(_send_in_child, 'A', 3).result(timeout=30) == 3
+    assert limiter.metrics['acquired'] == 3
@@ -0,0 +1,66 @@
+import pytest
+
+import processer
+from driver import HeadlessDriver, UIDriver
+from session import ChatSession
+
+COMPONENT = {'search_area': (10, 10), 'choose_area': (20, 20), 'msg_area': (40, 40)}
+
+
+def test_headless_actions_advance_simulated_clock():
+    driver = HeadlessDriver(latency={'click': 0.1, 'paste': 0.2})
+    driver.click(5, 6)
+    driver.paste('hello')
+    driver.press('enter')
+    assert driver.elapsed == pytest.approx(0.1 + 0.2 + 0.03)
+    assert driver.mouse == (5, 6)
+    assert driver.clipboard == 'hello'
+    assert [name for _, name, _ in driver.actions] == ['click', 'paste', 'press']
+
+
+def test_screenshot_changes_after_render_latency():
+    driver = HeadlessDriver(latency={'click': 0.0, 'screenshot': 0.0, 'render': 0.5})
+    before = driver.screenshot()
+    driver.click(1, 1)
+    assert driver.screenshot() == before  # 界面尚未作出反应
+    driver.sleep(0.5)
+    assert driver.screenshot() != before
+
+
+def test_count_excludes_screenshots_and_reset_clears():
+    driver = HeadlessDriver()
+    driver.hotkey('ctrl', 'a')
+    driver.screenshot()
+    assert driver.count() == 1
+    assert driver.count('screenshot') == 1
+    assert driver.get_stats()['actions'] == {'hotkey': 1, 'screenshot': 1}
+    driver.reset()
+    assert (driver.count(), driver.elapsed) == (0, 0.0)
+
+
+def test_jitter_is_reproducible_with_seed():
+    def run(seed):
+        driver = HeadlessDriver(jitter=0.5, seed=seed)
+        for _ in range(10):
+            driver.click(0, 0)
+        return driver.elapsed
+
+    assert run(1) == run(1)
+    assert run(1) != run(2)
+
+
+def test_base_driver_requires_implementation():
+    with pytest.raises(NotImplementedError):
+        UIDriver().click(0, 0)
+
+
+def test_processer_sends_through_installed_driver():
+    driver = HeadlessDriver()
+    processer.set_driver(driver)
+    try:
+        processer.process_group('A', ['1', '2'], COMPONENT, session=ChatSession())
+    finally:
+        processer.set_driver(None)
+    pasted = [args[0] for _, name, args in driver.actions if name == 'paste']
+    assert pasted == ['A', '1', '2']
+    assert driver.count('press') >= 2
@@ -0,0 +1,101 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from executor import GuiExecutor
+from model import Notice
+from scheduler import GroupBatchScheduler
+from timers import TimerHeap
+
+
+def notice(key, groups=('A',), priority=0):
+    return Notice.from_dict({'groupName': list(groups), 'message': f'text-{key}'},
+                            SimpleNamespace(message_id=key, priority=priority))
+
+
+class Results:
+    def __init__(self):
+        self.results = {}
+        self.event = threading.Event()
+
+    def callback(self, key):
+        def on_done(result):
+            self.results.setdefault(key, []).append(result)
+            self.event.set()
+        return on_done
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_full_queue_holds_overflow_and_refills_in_order():
+    executor = GuiExecutor(lambda data, properties: True, max_backlog=2)
+    results = Results()
+    for i in range(5):
+        assert executor.submit(notice(f'm{i}'), None, results.callback(f'm{i}'), hold=True)
+    assert not executor.submit(notice('x'), None, results.callback('x'))
+    assert len(executor.overflow) == 3 and executor.backlog() == 5
+    executor.start()
+    assert wait_for(lambda: len(results.results) == 5)
+    executor.stop()
+    assert results.results == {f'm{i}': [True] for i in range(5)}
+    assert executor.metrics['held'] == 3 and executor.metrics['rejected'] == 1
+
+
+def test_failure_before_dispatch_settles_delivery(tmp_path):
+    class BrokenTimers(TimerHeap):
+        def defer(self, data, key, properties=None):
+            raise OSError('disk full')
+
+    executor = GuiExecutor(lambda data, properties: True, timers=BrokenTimers(str(tmp_path / 'scheduled.jsonl')))
+    results = Results()
+    executor.submit(notice('m1'), None, results.callback('m1'))
+    executor.start()
+    assert wait_for(lambda: 'm1' in results.results)
+    executor.stop()
+    assert results.results == {'m1': [None]}
+
+
+def test_flush_error_settles_every_taken_delivery_once():
+    class BrokenJournal:
+        def done_groups(self, key):
+            return set()
+
+        def is_done(self, key, group):
+            return False
+
+        def record(self, key, group):
+            raise OSError('disk full')
+
+        def flush(self):
+            pass
+
+    scheduler = GroupBatchScheduler(lambda group, texts: None, window=0, journal=BrokenJournal())
+    executor = GuiExecutor(scheduler=scheduler)
+    results = Results()
+    for key in ('m1', 'm2', 'm1'):
+        executor.submit(notice(key, ('A', 'B')), None, results.callback(key))
+    executor.start()
+    assert wait_for(lambda: sum(map(len, results.results.values())) == 3)
+    executor.stop()
+    assert results.results == {'m1': [None, None], 'm2': [None]}
+    assert scheduler.pending_count() == 0
+
+
+def test_stop_with_full_queue_flushes_buffered_batch():
+    sent = []
+    scheduler = GroupBatchScheduler(lambda group, texts: sent.append(group), window=60)
+    executor = GuiExecutor(scheduler=scheduler, max_backlog=1)
+    results = Results()
+    executor.submit(notice('m1'), None, results.callback('m1'))
+    executor.start()
+    assert wait_for(lambda: scheduler.pending_count() == 1)
+    executor.submit(notice('m2', ('B',)), None, results.callback('m2'))
+    executor.stop(timeout=5)
+    assert not executor.thread.is_alive()
+    assert results.results == {'m1': [True], 'm2': [True]}
+    assert sorted(sent) == ['A', 'B']
@@ -0,0 +1,40 @@
+import time
+
+from journal import DeliveryJournal
+
+
+def test_resume_after_restart(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = DeliveryJournal(path)
+    journal.record('m1', 'A')
+    journal.record('m1', 'B')
+    journal.record('m2', 'A')
+    journal.close()
+
+    journal = DeliveryJournal(path)
+    assert journal.done_groups('m1') == {'A', 'B'}
+    assert journal.is_done('m2', 'A') and not journal.is_done('m2', 'B')
+    journal.close()
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    journal = DeliveryJournal(str(path))
+    journal.record('m1', 'A')
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"id": "m1", "gro')
+    assert DeliveryJournal(str(path)).done_groups('m1') == {'A'}
+
+
+def test_compact_drops_expired_records(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = DeliveryJournal(path, retention=60)
+    journal.record('old', 'A')
+    journal.index['old']['A'] = time.time() - 120
+    journal.record('new', 'A')
+    journal.compact()
+    journal.close()
+    journal = DeliveryJournal(path)
+    assert journal.done_groups('old') == set()
+    assert journal.done_groups('new') == {'A'}
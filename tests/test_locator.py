@@ -0,0 +1,45 @@
+import pytest
+
+numpy = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+from locator import MIN_TEXTURE, TemplateLocator, texture, textured_crop  # noqa: E402
+
+COMPONENTS = {'search_area': (150, 40), 'choose_area': (150, 100), 'header_area': (500, 40),
+              'msg_area': (500, 540)}
+
+
+def screen(dx=0, dy=0, seed=7):
+    """合成界面：有文字纹理的搜索框、输入框上方的工具栏图标，输入框本身是空白"""
+    random = numpy.random.RandomState(seed)
+    gray = numpy.full((700, 900), 240, dtype=numpy.uint8)
+    gray[28 + dy:52 + dy, 100 + dx:200 + dx] = random.randint(0, 255, (24, 100))  # 搜索框
+    gray[470 + dy:490 + dy, 320 + dx:680 + dx] = random.randint(0, 255, (20, 360))  # 工具栏
+    gray[500 + dy:580 + dy, 300 + dx:700 + dx] = 255  # 空白输入框
+    return gray
+
+
+def test_flat_region_has_no_usable_template():
+    gray = screen()
+    assert texture(gray[520:560, 400:600]) < MIN_TEXTURE
+    assert textured_crop(gray, (500, 540), search=(40, 20)) is None
+
+
+def test_blank_input_box_is_located_through_textured_neighbour(tmp_path):
+    TemplateLocator.save('synthetic', screen(), COMPONENTS, directory=str(tmp_path))
+    locator = TemplateLocator.load('synthetic', directory=str(tmp_path))
+    assert locator is not None
+    assert texture(locator.templates['msg_area']) >= MIN_TEXTURE
+
+    found = locator.locate(screen(dx=-37, dy=25))
+    for anchor, (x, y) in COMPONENTS.items():
+        assert abs(found[anchor][0] - (x - 37)) <= 1
+        assert abs(found[anchor][1] - (y + 25)) <= 1
+
+
+def test_legacy_flat_template_is_rejected(tmp_path):
+    cv2 = pytest.importorskip('cv2')
+    TemplateLocator.save('legacy', screen(), COMPONENTS, directory=str(tmp_path))
+    # 旧版以锚点为中心截取的模板：空白输入框
+    cv2.imencode('.png', screen()[524:556, 452:548])[1].tofile(str(tmp_path / 'legacy' / 'msg_area.png'))
+    assert TemplateLocator.load('legacy', directory=str(tmp_path)) is None
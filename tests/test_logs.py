@@ -0,0 +1,85 @@
+import io
+import json
+import logging
+import queue
+import sys
+
+import pytest
+
+import logs
+from logs import JsonFormatter, NonBlockingQueueHandler, Sampler, lazy_json, setup_logging
+from model import Notice
+
+
+def make_record(msg, args=(), exc_info=None):
+    return logging.LogRecord('Test', logging.INFO, __file__, 1, msg, args, exc_info)
+
+
+def test_sampler_passes_one_in_n():
+    sampler = Sampler({'receive': 3})
+    before = logs.stats['sampled_out']
+    assert [sampler.allow('receive') for _ in range(7)] == [True, False, False, True, False, False, True]
+    assert logs.stats['sampled_out'] - before == 4
+    assert all(sampler.allow('other') for _ in range(3))  # 未列出的键不采样
+
+
+def test_full_queue_drops_without_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    before = logs.stats['dropped']
+    handler.handle(make_record('first'))
+    handler.handle(make_record('second'))
+    assert handler.queue.qsize() == 1
+    assert logs.stats['dropped'] - before == 1
+
+
+def test_prepare_snapshots_mutable_args_but_defers_formatting():
+    handler = NonBlockingQueueHandler(queue.Queue())
+    groups = ['A']
+    payload = {'groups': groups}
+    handler.handle(make_record('%s %s %d', (groups, lazy_json(payload), 1)))
+    groups.append('B')  # 入队后调用方继续修改
+    record = handler.queue.get_nowait()
+    assert record.msg == '%s %s %d'  # 消息未在调用线程格式化
+    assert isinstance(record.args[1], lazy_json)
+    assert record.getMessage().startswith("['A'] {")
+    assert '"B"' not in record.getMessage()
+
+
+def test_prepare_renders_exception_to_text():
+    handler = NonBlockingQueueHandler(queue.Queue())
+    try:
+        raise ValueError('坏消息')
+    except ValueError:
+        handler.handle(make_record('failed', exc_info=sys.exc_info()))
+    record = handler.queue.get_nowait()
+    assert record.exc_info is None
+    assert 'ValueError: 坏消息' in record.exc_text
+    assert 'ValueError: 坏消息' in logging.Formatter().format(record)
+    assert 'ValueError: 坏消息' in json.loads(JsonFormatter().format(record))['exc']
+
+
+def test_lazy_json_serializes_notice():
+    notice = Notice.from_dict({'groupName': ['A'], 'message': 'hello'})
+    assert json.loads(str(lazy_json(notice))) == {'groupName': ['A'], 'message': 'hello'}
+
+
+@pytest.fixture
+def restore_root():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_json_logging_through_listener(restore_root):
+    stream = io.StringIO()
+    listener = setup_logging(fmt='json', stream=stream)
+    logging.getLogger('Test').info('已向群:%s发送%d条信息.', 'A', 2, extra={'group': 'A', 'elapsed': 0.5})
+    listener.stop()
+    entry = json.loads(stream.getvalue().splitlines()[-1])
+    assert entry['msg'] == '已向群:A发送2条信息.'
+    assert (entry['group'], entry['elapsed'], entry['logger']) == ('A', 0.5, 'Test')
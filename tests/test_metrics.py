@@ -0,0 +1,63 @@
+import threading
+
+from metrics import Histogram, MetricsRegistry
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram('paste', buckets=(0.1, 1, 10))
+    for value in (0.05, 0.1, 0.5, 0.7, 5, 50):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot['count'] == 6
+    assert snapshot['sum'] == 56.35
+    assert snapshot['buckets'] == {'0.1': 2, '1': 2, '10': 1, '+Inf': 1}
+    assert snapshot['p50'] == 1
+    assert snapshot['p99'] == float('inf')
+
+
+def test_empty_histogram_has_no_quantile():
+    assert Histogram('paste').snapshot()['p50'] is None
+
+
+def test_concurrent_observations_are_all_counted():
+    histogram = Histogram('paste')
+
+    def observe():
+        for _ in range(1000):
+            histogram.observe(0.01)
+
+    threads = [threading.Thread(target=observe) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert histogram.count == 8000
+    assert sum(histogram.counts) == 8000
+
+
+def test_registry_reuses_histograms_and_states():
+    registry = MetricsRegistry()
+    registry.observe('search', 0.02)
+    registry.observe('search', 0.03)
+    assert registry.stage('search').count == 2
+    assert registry.stage('search').help == '搜索群'
+    registry.observe_priority('message', 0, 0.2)
+    assert 'message_p0' in registry.histograms
+    state = registry.state('executor', {'processed': 0})
+    state['processed'] += 1
+    assert registry.state('executor', {'processed': 0}) is state
+
+
+def test_json_and_prometheus_export():
+    registry = MetricsRegistry(prefix='test')
+    registry.observe('paste', 0.02)
+    registry.state('executor', {'processed': 3, 'running': True, 'name': 'gui'})
+    exported = registry.to_json()
+    assert exported['stages']['paste']['count'] == 1
+    assert exported['counters'] == {'executor': {'processed': 3}}
+
+    text = registry.render_prometheus()
+    assert 'test_stage_latency_seconds_bucket{stage="paste",le="0.025"} 1' in text
+    assert 'test_stage_latency_seconds_bucket{stage="paste",le="+Inf"} 1' in text
+    assert 'test_stage_latency_seconds_count{stage="paste"} 1' in text
+    assert 'test_executor_processed 3' in text
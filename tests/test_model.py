@@ -0,0 +1,41 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from model import InvalidNotice, Notice, decode_notice, parse_time
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, None),
+    ('', None),
+    (1700000000, 1700000000.0),
+    (1700000000.5, 1700000000.5),
+    (1700000000000, 1700000000.0),
+    (1700000000500.0, 1700000000.5),
+    ('2023-11-14T22:13:20Z', 1700000000.0),
+])
+def test_parse_time(value, expected):
+    assert parse_time(value) == expected
+
+
+def test_parse_time_local_format():
+    expected = datetime(2024, 1, 2, 3, 4, 5).timestamp()
+    assert parse_time('2024-01-02 03:04:05') == expected
+    assert parse_time(' 2024-01-02T03:04:05+00:00 ') == datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc).timestamp()
+
+
+@pytest.mark.parametrize('value', [True, 'tomorrow', [1]])
+def test_parse_time_rejects(value):
+    with pytest.raises(ValueError):
+        parse_time(value)
+
+
+def test_decode_notice_reads_millisecond_float_send_at():
+    notice = decode_notice(b'{"groupName": "g", "message": "m", "sendAt": 1700000000000.0}')
+    assert isinstance(notice, Notice)
+    assert notice.send_at == 1700000000.0
+
+
+def test_decode_notice_rejects_bad_json():
+    with pytest.raises(InvalidNotice):
+        decode_notice(b'{"groupName": ')
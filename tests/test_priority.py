@@ -0,0 +1,123 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import processer
+from driver import HeadlessDriver
+from executor import GuiExecutor
+from model import Notice
+from scheduler import GroupBatchScheduler
+
+COMPONENT = {'search_area': (10, 10), 'choose_area': (20, 20), 'msg_area': (40, 40)}
+
+
+def notice(key, groups=('A',), priority=None, **fields):
+    return Notice.from_dict(dict({'groupName': list(groups), 'message': f'text-{key}'}, **fields),
+                            SimpleNamespace(message_id=key, priority=priority))
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_urgency_orders_by_priority_then_deadline():
+    now = time.time()
+    assert notice('m', priority=5).priority == 5
+    assert notice('m').priority == 0
+    assert Notice.from_dict({'groupName': ['A'], 'message': 'x', 'priority': 3}).priority == 3
+    ordered = sorted([
+        notice('late', deadline=now + 60),
+        notice('urgent', priority=9),
+        notice('none'),
+        notice('expiring', expireAt=now + 30),
+        notice('early', deadline=now + 10),
+    ], key=lambda data: data.urgency)
+    assert [data.key for data in ordered] == ['urgent', 'early', 'expiring', 'late', 'none']
+
+
+def test_backlog_dispatches_in_edf_order():
+    now = time.time()
+    order = []
+    executor = GuiExecutor(lambda data, properties: order.append(data.key) or True)
+    done = threading.Event()
+    for data in (notice('none'), notice('late', deadline=now + 60), notice('early', deadline=now + 10),
+                 notice('urgent', priority=9), notice('none2')):
+        executor.submit(data, None, lambda result, key=data.key: key == 'none2' and done.set())
+    executor.start()
+    assert done.wait(5)
+    executor.stop()
+    assert order == ['urgent', 'early', 'late', 'none', 'none2']
+
+
+def test_same_priority_does_not_preempt():
+    executor = GuiExecutor(lambda data, properties: True)
+    executor.submit(notice('waiting', priority=1), None, lambda result: None)
+    assert not executor.has_urgent(notice('running', priority=1).urgency)
+    assert executor.has_urgent(notice('running', priority=0).urgency)
+    executor.preempt = False
+    assert not executor.has_urgent(notice('running', priority=0).urgency)
+
+
+@pytest.fixture
+def headless():
+    driver = HeadlessDriver()
+    processer.set_driver(driver)
+    yield driver
+    processer.set_driver(None)
+    processer.set_preempt_check(None)
+
+
+def sent_groups(driver):
+    """按发送顺序列出 (群, 消息)"""
+    pasted = [args[0] for _, name, args in driver.actions if name == 'paste']
+    sends, group = [], None
+    for text in pasted:
+        if text.startswith('text-'):
+            sends.append((group, text[5:]))
+        else:
+            group = text
+    return sends
+
+
+def test_fan_out_yields_to_urgent_message_at_group_boundary(headless):
+    results = {}
+    executor = GuiExecutor()
+    urgent = notice('urgent', groups=['X'], priority=9)
+
+    def handler(data, properties):
+        if data.key == 'low' and 'urgent' not in results:
+            results['urgent'] = []
+            executor.submit(urgent, None, results['urgent'].append)  # 发送途中到达的紧急消息
+        processer.process(data, COMPONENT)
+        return True
+
+    executor.handler = handler
+    processer.set_preempt_check(executor.has_urgent)
+    results['low'] = []
+    executor.submit(notice('low', groups=['A', 'B', 'C']), None, results['low'].append)
+    executor.start()
+    assert wait_for(lambda: results['low'])
+    executor.stop()
+    assert sent_groups(headless) == [('A', 'low'), ('X', 'urgent'), ('B', 'low'), ('C', 'low')]
+    assert results == {'low': [True], 'urgent': [True]}
+    assert executor.metrics['preempted'] == 1
+
+
+def test_batch_flush_yields_and_keeps_remaining_buffered():
+    sends = []
+    scheduler = GroupBatchScheduler(lambda group, texts: sends.append(group), window=60)
+    results = []
+    for data in (notice('low', groups=['A', 'B']), notice('high', groups=['C'], priority=9)):
+        scheduler.submit(data, None, results.append)
+    scheduler.flush(lambda urgency: True)
+    assert sends == ['C']  # 最紧急的群先发，随后让出
+    assert scheduler.metrics['preempted'] == 1
+    assert scheduler.pending_count() == 1 and results == [True]
+    scheduler.flush()
+    assert sends == ['C', 'A', 'B']
+    assert results == [True, True]
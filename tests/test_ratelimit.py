@@ -0,0 +1,82 @@
+import pytest
+
+from ratelimit import RateLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.time = 0.0
+
+    def now(self):
+        return self.time
+
+    def sleep(self, seconds):
+        self.time += seconds
+
+
+def make_limiter(clock, **kwargs):
+    return RateLimiter(clock=clock.now, sleep=clock.sleep, **kwargs)
+
+
+def test_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(rate=2, capacity=3, now=0)
+    for _ in range(3):
+        assert bucket.wait_time(0) == 0
+        bucket.take(0)
+    assert bucket.wait_time(0) == pytest.approx(0.5)
+    bucket.refill(100)
+    assert bucket.tokens == 3
+
+
+def test_zero_rate_bucket_never_refills():
+    bucket = TokenBucket(rate=0, capacity=1, now=0)
+    bucket.take(0)
+    assert bucket.wait_time(10) == float('inf')
+
+
+def test_group_burst_then_group_rate():
+    clock = FakeClock()
+    limiter = make_limiter(clock, global_rate=100, global_burst=100, group_rate=0.5,
+                           group_burst=2, min_interval=0)
+    sent_at = []
+    for _ in range(4):
+        limiter.acquire('A')
+        sent_at.append(clock.time)
+    assert sent_at == pytest.approx([0, 0, 2, 4])
+    assert limiter.metrics['throttled'] == 2
+
+
+def test_groups_are_limited_independently_but_share_global_bucket():
+    clock = FakeClock()
+    limiter = make_limiter(clock, global_rate=1, global_burst=3, group_rate=0.1,
+                           group_burst=2, min_interval=0)
+    for group in ('A', 'A', 'B'):
+        limiter.acquire(group)
+    assert clock.time == 0
+    assert limiter.delay('A') == pytest.approx(10)
+    assert limiter.delay('C') == pytest.approx(1)  # 新群自己的桶是满的，但全局桶已空
+    assert limiter.available('B') == 0
+
+
+def test_min_interval_spaces_consecutive_sends():
+    clock = FakeClock()
+    limiter = make_limiter(clock, global_rate=100, global_burst=100, group_rate=100,
+                           group_burst=100, min_interval=0.3)
+    for group in ('A', 'B', 'C'):
+        limiter.acquire(group)
+    assert clock.time == pytest.approx(0.6)
+    assert limiter.metrics['wait_seconds'] == pytest.approx(0.6)
+
+
+def test_idle_group_buckets_are_evicted():
+    clock = FakeClock()
+    limiter = make_limiter(clock, max_groups=2, min_interval=0)
+    for group in ('A', 'B', 'C'):
+        limiter.delay(group)
+    assert list(limiter.groups) == ['B', 'C']
+
+
+def test_from_config_reads_rates():
+    limiter = RateLimiter.from_config({'group_rate': 0.5, 'min_interval': 1})
+    assert (limiter.group_rate, limiter.min_interval) == (0.5, 1)
+    assert limiter.global_bucket.capacity == 5
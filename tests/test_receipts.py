@@ -0,0 +1,87 @@
+import json
+import time
+
+import pytest
+
+import fakebroker
+from journal import DeliveryJournal
+from model import EXPIRED, SCHEDULED
+from receipts import ReceiptPublisher, build_receipt, receipt_status
+
+
+@pytest.mark.parametrize('result, status', [
+    (True, 'delivered'),
+    (False, 'rejected'),
+    (None, 'failed'),
+    (SCHEDULED, 'scheduled'),
+    (EXPIRED, 'expired'),
+])
+def test_receipt_status(result, status):
+    assert receipt_status(result) == status
+
+
+def group_statuses(receipt):
+    return {group['group']: group['status'] for group in receipt['groups']}
+
+
+def test_group_status_comes_from_journal(tmp_path):
+    journal = DeliveryJournal(str(tmp_path / 'journal.jsonl'))
+    journal.record('m1', 'A')
+    receipt = build_receipt('m1', ['A', 'B'], 'failed', received_at=time.time() - 1, journal=journal)
+    assert group_statuses(receipt) == {'A': 'sent', 'B': 'not_sent'}
+    assert receipt['groups'][0]['latency'] > 0
+
+
+@pytest.mark.parametrize('status', [SCHEDULED, EXPIRED])
+def test_unsent_outcomes_are_not_reported_as_sent(tmp_path, status):
+    journal = DeliveryJournal(str(tmp_path / 'journal.jsonl'))
+    receipt = build_receipt('m1', ['A', 'B'], status, journal=journal)
+    assert receipt['status'] == status
+    assert group_statuses(receipt) == {'A': status, 'B': status}
+
+
+def test_without_journal_delivered_implies_sent():
+    assert group_statuses(build_receipt('m1', ['A'], 'delivered')) == {'A': 'sent'}
+    assert group_statuses(build_receipt('m1', ['A'], 'failed')) == {'A': 'not_sent'}
+
+
+@pytest.fixture
+def broker():
+    broker = fakebroker.FakeBroker()
+    fakebroker.install(broker)
+    broker.declare('replies')
+    return broker
+
+
+def published(broker, queue):
+    return [receipt for message in broker.queues[queue].messages for receipt in json.loads(message.body)]
+
+
+def test_receipts_spooled_during_outage_are_published_after_restart(broker, tmp_path):
+    path = str(tmp_path / 'receipts.jsonl')
+    down = [True]
+
+    def connect():
+        if down[0]:
+            raise fakebroker.AMQPConnectionError('down')
+        return broker.connect(None)
+
+    properties = fakebroker.BasicProperties(reply_to='replies', correlation_id='c1')
+    publisher = ReceiptPublisher(connect, path, batch_size=2, flush_interval=0.05, reconnect_delay=0.05)
+    publisher.start()
+    for i in range(3):
+        publisher.report(f'm{i}', ['A'], 'delivered', properties, time.time())
+    time.sleep(0.2)
+    publisher.stop()
+    assert published(broker, 'replies') == []
+
+    down[0] = False
+    publisher = ReceiptPublisher(connect, path, batch_size=2, flush_interval=0.05)
+    publisher.start()
+    deadline = time.monotonic() + 5
+    while len(published(broker, 'replies')) < 3 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    publisher.stop()
+    receipts = published(broker, 'replies')
+    assert [receipt['message_id'] for receipt in receipts] == ['m0', 'm1', 'm2']
+    assert {receipt['correlation_id'] for receipt in receipts} == {'c1'}
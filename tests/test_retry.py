@@ -0,0 +1,42 @@
+import pytest
+
+import fakebroker
+from retry import RetryPolicy
+
+
+def confirm_channel(broker):
+    channel = broker.connect(None).channel()
+    channel.confirm_delivery()
+    return channel
+
+
+def test_route_copies_headers_and_publishes_to_delay_queue():
+    broker = fakebroker.FakeBroker()
+    policy = RetryPolicy('notices', base_delay=1, max_attempts=3, levels=2)
+    channel = confirm_channel(broker)
+    policy.declare(channel)
+    original = {'trace': 'abc'}
+    properties = fakebroker.BasicProperties(message_id='m1', headers=original)
+
+    assert policy.route(channel, properties, b'{}', 'boom') == 'retry.notices.0'
+    assert properties.headers is original and original == {'trace': 'abc'}
+    message = broker.queues['retry.notices.0'].messages[0]
+    assert message.properties.headers['x-retry-count'] == 1
+    assert message.properties.headers['trace'] == 'abc'
+
+
+def test_route_dead_letters_after_max_attempts():
+    broker = fakebroker.FakeBroker()
+    policy = RetryPolicy('notices', max_attempts=2)
+    channel = confirm_channel(broker)
+    policy.declare(channel)
+    broker.declare(policy.dlx_queue)
+    properties = fakebroker.BasicProperties(headers={'x-retry-count': 1})
+    assert policy.route(channel, properties, b'{}', 'boom') == 'dlx.notices'
+
+
+def test_route_raises_when_target_queue_is_missing():
+    broker = fakebroker.FakeBroker()
+    policy = RetryPolicy('notices')
+    with pytest.raises(fakebroker.UnroutableError):
+        policy.route(confirm_channel(broker), fakebroker.BasicProperties(), b'{}', 'boom', retry=False)
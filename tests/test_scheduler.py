@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+
+import pytest
+
+import processer
+from driver import HeadlessDriver
+from journal import DeliveryJournal
+from model import Notice
+from scheduler import GroupBatchScheduler
+
+COMPONENT = {'search_area': (10, 10), 'choose_area': (20, 20), 'msg_area': (40, 40)}
+
+
+def notice(key, groups, text=None):
+    return Notice.from_dict({'groupName': groups, 'message': text or f'text-{key}'},
+                            SimpleNamespace(message_id=key, priority=None))
+
+
+class Recorder:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.sends = []
+
+    def __call__(self, group, texts):
+        if group in self.fail:
+            raise RuntimeError(f'{group} 发送失败')
+        self.sends.append((group, list(texts)))
+
+
+def submit_all(scheduler, notices):
+    results = {}
+    for data in notices:
+        results.setdefault(data.key, [])
+        scheduler.submit(data, SimpleNamespace(message_id=data.key), results[data.key].append)
+    return results
+
+
+def test_each_group_opened_once_per_batch():
+    sender = Recorder()
+    scheduler = GroupBatchScheduler(sender)
+    results = submit_all(scheduler, [notice('m1', ['A', 'B']), notice('m2', ['B']), notice('m3', ['A', 'C'])])
+    scheduler.flush()
+    assert sorted(group for group, _ in sender.sends) == ['A', 'B', 'C']
+    assert dict(sender.sends)['A'] == ['text-m1', 'text-m3']
+    assert results == {'m1': [True], 'm2': [True], 'm3': [True]}
+
+
+def test_same_key_in_one_batch_is_sent_once():
+    sender = Recorder()
+    scheduler = GroupBatchScheduler(sender)
+    calls = []
+    first, copy = notice('m1', ['A', 'B']), notice('m1', ['B', 'C'])
+    scheduler.submit(first, None, lambda result: calls.append(('first', result)))
+    scheduler.submit(copy, None, lambda result: calls.append(('copy', result)))
+    scheduler.flush()
+    sent = [(group, text) for group, texts in sender.sends for text in texts]
+    assert sorted(sent) == [('A', 'text-m1'), ('B', 'text-m1'), ('C', 'text-m1')]
+    assert sorted(calls) == [('copy', True), ('first', True)]
+
+
+def test_failed_group_retries_only_unsent_groups(tmp_path):
+    journal = DeliveryJournal(str(tmp_path / 'journal.jsonl'))
+    scheduler = GroupBatchScheduler(Recorder(fail={'B'}), journal=journal)
+    results = submit_all(scheduler, [notice('m1', ['A', 'B'])])
+    scheduler.flush()
+    assert results['m1'] == [None]
+    assert journal.done_groups('m1') == {'A'}
+    journal.close()
+
+    # 重启后重新投递：只发送上次失败的群
+    journal = DeliveryJournal(str(tmp_path / 'journal.jsonl'))
+    sender = Recorder()
+    scheduler = GroupBatchScheduler(sender, journal=journal)
+    results = submit_all(scheduler, [notice('m1', ['A', 'B'])])
+    scheduler.flush()
+    assert sender.sends == [('B', ['text-m1'])]
+    assert results['m1'] == [True]
+    assert scheduler.metrics['groups_skipped'] == 1
+
+
+def test_group_completed_after_submit_is_not_sent_again(tmp_path):
+    journal = DeliveryJournal(str(tmp_path / 'journal.jsonl'))
+    sender = Recorder()
+    scheduler = GroupBatchScheduler(sender, journal=journal)
+    results = submit_all(scheduler, [notice('m1', ['A', 'B'])])
+    journal.record('m1', 'A')  # 另一条投递路径在缓冲期间完成了该群
+    scheduler.flush()
+    assert sender.sends == [('B', ['text-m1'])]
+    assert results['m1'] == [True]
+
+
+@pytest.fixture
+def headless():
+    driver = HeadlessDriver()
+    processer.set_driver(driver)
+    yield driver
+    processer.set_driver(None)
+
+
+def test_batch_on_headless_driver_switches_chat_once_per_group(headless):
+    scheduler = GroupBatchScheduler(lambda group, texts: processer.process_group(group, texts, COMPONENT))
+    results = submit_all(scheduler, [notice(f'm{i}', ['A', 'B']) for i in range(5)])
+    scheduler.flush()
+    assert all(result == [True] for result in results.values())
+    # 每个群: 粘贴一次群名 + 5 条消息
+    assert headless.count('paste') == 2 * (1 + 5)
+    assert scheduler.metrics['chat_switches'] == 2
@@ -0,0 +1,94 @@
+import pytest
+
+import processer
+import session as session_module
+from driver import HeadlessDriver
+from session import ChatSession
+
+COMPONENT = {'search_area': (10, 10), 'choose_area': (20, 20), 'msg_area': (40, 40)}
+
+
+class FakeClock:
+    def __init__(self):
+        self.time = 100.0
+
+    def __call__(self):
+        return self.time
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(session_module.time, 'monotonic', clock)
+    return clock
+
+
+def test_selected_group_is_current_until_ttl(clock):
+    session = ChatSession(ttl=30)
+    session.select('A')
+    assert session.is_current('A')
+    assert not session.is_current('B')
+    clock.time += 20
+    session.touch()
+    clock.time += 20
+    assert session.is_current('A')  # touch 刷新了使用时间
+    clock.time += 31
+    assert not session.is_current('A')
+    assert session.current is None
+    assert session.metrics['invalidations'] == {'timeout': 1}
+    assert (session.metrics['hits'], session.metrics['misses']) == (2, 2)
+
+
+def test_focus_change_invalidates(clock):
+    focus = {'token': ('WeCom', (0, 0))}
+    session = ChatSession(focus_probe=lambda: focus['token'])
+    session.select('A')
+    focus['token'] = ('Other', (0, 0))
+    assert not session.is_current('A')
+    assert session.metrics['invalidations'] == {'focus_lost': 1}
+
+
+def test_failing_probe_does_not_break_session(clock):
+    def probe():
+        raise RuntimeError('no display')
+
+    session = ChatSession(focus_probe=probe)
+    session.select('A')
+    assert session.is_current('A')
+
+
+def test_invalidate_without_current_is_noop():
+    session = ChatSession()
+    session.invalidate('send_failed')
+    assert session.metrics['invalidations'] == {}
+
+
+@pytest.fixture
+def headless():
+    driver = HeadlessDriver()
+    processer.set_driver(driver)
+    yield driver
+    processer.set_driver(None)
+
+
+def test_process_group_reuses_open_chat(headless):
+    session = ChatSession()
+    processer.process_group('A', ['1'], COMPONENT, session=session)
+    searched = headless.count('paste')
+    processer.process_group('A', ['2'], COMPONENT, session=session)
+    assert headless.count('paste') - searched == 1  # 只粘贴消息，不再搜索群名
+    assert session.metrics['hits'] == 1
+
+
+def test_send_failure_invalidates_session(headless, monkeypatch):
+    session = ChatSession()
+    processer.process_group('A', ['1'], COMPONENT, session=session)
+
+    def broken(*args, **kwargs):
+        raise RuntimeError('粘贴失败')
+
+    monkeypatch.setattr(headless, 'paste', broken)
+    with pytest.raises(RuntimeError):
+        processer.process_group('A', ['2'], COMPONENT, session=session)
+    assert session.current is None
+    assert session.metrics['invalidations'] == {'send_failed': 1}
@@ -0,0 +1,182 @@
+import json
+import os
+
+from sources import HttpSource, LocalIngest, SpoolSource
+
+
+class FakeExecutor:
+    """记录提交的投递，由测试决定何时完成；超过 capacity 时拒绝"""
+
+    def __init__(self, capacity=100, backlog=0):
+        self.capacity = capacity
+        self.pending = backlog
+        self.submitted = []
+
+    def backlog(self):
+        return self.pending
+
+    def submit(self, data, properties, on_done, hold=False):
+        if self.pending >= self.capacity:
+            return False
+        self.pending += 1
+        self.submitted.append((data, on_done))
+        return True
+
+    def finish(self, index, result=True):
+        self.pending -= 1
+        self.submitted[index][1](result)
+
+
+def line(key):
+    return json.dumps({'groupName': ['A'], 'message': key}, ensure_ascii=False) + '\n'
+
+
+def make_spool(tmp_path, executor, **kwargs):
+    ingest = LocalIngest('spool', executor, dead_letter=str(tmp_path / 'dead_letter.jsonl'))
+    return SpoolSource(ingest, str(tmp_path / 'spool.jsonl'), **kwargs)
+
+
+def read_all(source):
+    while source._read_line():
+        pass
+
+
+def saved_offset(source):
+    source._save_checkpoint()
+    with open(source.checkpoint_path, encoding='utf-8') as f:
+        return json.load(f)['offset']
+
+
+def test_checkpoint_advances_only_over_completed_prefix(tmp_path):
+    (tmp_path / 'spool.jsonl').write_text(line('m1') + line('m2'), encoding='utf-8')
+    executor = FakeExecutor()
+    source = make_spool(tmp_path, executor)
+    assert source._open()
+    read_all(source)
+    assert [data.text for data, _ in executor.submitted] == ['m1', 'm2']
+    executor.finish(1)
+    assert saved_offset(source) == 0  # 第一行尚未完成
+    executor.finish(0)
+    assert saved_offset(source) == os.path.getsize(tmp_path / 'spool.jsonl')
+    source.stop()
+
+
+def test_restart_resumes_after_checkpoint(tmp_path):
+    path = tmp_path / 'spool.jsonl'
+    path.write_text(line('m1'), encoding='utf-8')
+    executor = FakeExecutor()
+    source = make_spool(tmp_path, executor)
+    source._open()
+    read_all(source)
+    executor.finish(0)
+    source.stop()
+
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line('m2'))
+    executor = FakeExecutor()
+    source = make_spool(tmp_path, executor)
+    source._open()
+    read_all(source)
+    assert [data.text for data, _ in executor.submitted] == ['m2']
+    source.stop()
+
+
+def test_full_executor_rereads_line_later(tmp_path):
+    (tmp_path / 'spool.jsonl').write_text(line('m1') + line('m2'), encoding='utf-8')
+    executor = FakeExecutor(capacity=1)
+    source = make_spool(tmp_path, executor)
+    source._open()
+    assert source._read_line() is True
+    assert source._read_line() is None
+    executor.finish(0)
+    assert source._read_line() is True
+    assert [data.text for data, _ in executor.submitted] == ['m1', 'm2']
+    source.stop()
+
+
+def test_rotation_switches_after_inflight_lines_complete(tmp_path):
+    path = tmp_path / 'spool.jsonl'
+    path.write_text(line('m1'), encoding='utf-8')
+    executor = FakeExecutor()
+    source = make_spool(tmp_path, executor)
+    source._open()
+    read_all(source)
+    os.rename(path, tmp_path / 'spool.jsonl.1')
+    path.write_text(line('m2'), encoding='utf-8')
+    assert not source._rotated()  # 旧文件还有在途行
+    executor.finish(0)
+    assert source._rotated()
+    source._open()
+    read_all(source)
+    assert [data.text for data, _ in executor.submitted] == ['m1', 'm2']
+    assert source.metrics['rotations'] >= 1
+    source.stop()
+
+
+def test_truncated_file_is_read_from_start(tmp_path):
+    path = tmp_path / 'spool.jsonl'
+    path.write_text(line('m1') + line('m2'), encoding='utf-8')
+    executor = FakeExecutor()
+    source = make_spool(tmp_path, executor)
+    source._open()
+    read_all(source)
+    path.write_text(line('m3'), encoding='utf-8')
+    assert source._rotated()
+    read_all(source)
+    assert [data.text for data, _ in executor.submitted] == ['m1', 'm2', 'm3']
+    source.stop()
+
+
+def test_overlong_and_invalid_lines_go_to_dead_letter(tmp_path):
+    (tmp_path / 'spool.jsonl').write_text('x' * 100 + '\n' + '{"groupName": []}\n' + line('m1'),
+                                          encoding='utf-8')
+    executor = FakeExecutor()
+    source = make_spool(tmp_path, executor, max_line_bytes=50)
+    source._open()
+    read_all(source)
+    assert [data.text for data, _ in executor.submitted] == ['m1']
+    with open(tmp_path / 'dead_letter.jsonl', encoding='utf-8') as f:
+        reasons = [json.loads(record)['reason'] for record in f]
+    assert reasons[0] == '行超过 50 字节'
+    assert len(reasons) == 2
+    source.stop()
+
+
+def make_http(tmp_path, executor):
+    ingest = LocalIngest('http', executor, high_water=5, dead_letter=str(tmp_path / 'dead_letter.jsonl'))
+    return HttpSource(ingest, max_batch=3)
+
+
+def notice(key):
+    return {'groupName': ['A'], 'message': key}
+
+
+def test_http_accepts_batch(tmp_path):
+    executor = FakeExecutor()
+    status, body = make_http(tmp_path, executor).accept([notice('m1'), notice('m2')])
+    assert status == 202 and body['accepted'] == 2
+    assert len(executor.submitted) == 2
+
+
+def test_http_rejects_invalid_batch_without_submitting(tmp_path):
+    executor = FakeExecutor()
+    source = make_http(tmp_path, executor)
+    status, body = source.accept([notice('m1'), {'groupName': ['A']}])
+    assert status == 400 and body['errors'][0]['index'] == 1
+    assert source.accept([notice(f'm{i}') for i in range(4)])[0] == 400
+    assert executor.submitted == []
+
+
+def test_http_throttles_when_backlogged(tmp_path):
+    executor = FakeExecutor(backlog=4)
+    source = make_http(tmp_path, executor)
+    status, body = source.accept([notice('m1'), notice('m2')])
+    assert status == 429 and body['accepted'] == 0
+    assert executor.submitted == []
+
+
+def test_http_reports_unaccepted_tail_when_queue_fills(tmp_path):
+    executor = FakeExecutor(capacity=1)
+    status, body = make_http(tmp_path, executor).accept([notice('m1'), notice('m2'), notice('m3')])
+    assert status == 503
+    assert (body['accepted'], body['rejected']) == (1, [1, 2])
@@ -0,0 +1,87 @@
+import json
+import time
+from types import SimpleNamespace
+
+from executor import GuiExecutor
+from model import Notice
+from timers import TimerHeap
+
+
+class Receipts:
+    def __init__(self):
+        self.reports = []
+
+    @staticmethod
+    def status(result):
+        return {True: 'delivered', None: 'failed'}.get(result, 'rejected')
+
+    def report(self, key, groups, status, properties, received_at):
+        self.reports.append((key, status))
+
+
+def notice(key='m1', send_at=None):
+    data = {'groupName': ['拍卖群01'], 'message': 'hello', 'sendAt': send_at or time.time() + 60}
+    return Notice.from_dict(data, SimpleNamespace(message_id=key))
+
+
+def make_due(heap, key):
+    """把已计划的消息改到现在到期"""
+    heap.entries[key]['sendAt'] = time.time() - 1
+    heap._push(heap.entries[key]['sendAt'], key)
+
+
+def test_redelivered_defer_is_scheduled_once(tmp_path):
+    heap = TimerHeap(str(tmp_path / 'scheduled.jsonl'))
+    first = notice()
+    assert heap.defer(first, 'm1')
+    assert heap.defer(Notice.from_dict(first.to_dict(), SimpleNamespace(message_id='m1')), 'm1')
+    assert len(heap) == 1
+    assert heap.metrics['duplicates'] == 1
+
+    make_due(heap, 'm1')
+    assert heap.pop_due()[0] == 'm1'
+    assert heap.pop_due() is None
+
+
+def test_schedule_survives_restart(tmp_path):
+    path = str(tmp_path / 'scheduled.jsonl')
+    heap = TimerHeap(path)
+    heap.defer(notice('m1'), 'm1')
+    heap.defer(notice('m2'), 'm2')
+    heap.complete('m1')
+    heap.close()
+    assert list(TimerHeap(path).entries) == ['m2']
+
+
+def test_failed_timer_is_dead_lettered_after_max_attempts(tmp_path):
+    dead_letter = tmp_path / 'dead_letter.jsonl'
+    heap = TimerHeap(str(tmp_path / 'scheduled.jsonl'), retry_delay=0, max_attempts=3,
+                     dead_letter=str(dead_letter))
+    calls = []
+
+    def handler(data, properties):
+        calls.append(data.key)
+        return None
+
+    executor = GuiExecutor(handler, timers=heap)
+    executor.receipts = receipts = Receipts()
+    heap.defer(notice('m1'), 'm1')
+    make_due(heap, 'm1')
+    executor._fire_due()
+
+    assert calls == ['m1'] * 3
+    assert len(heap) == 0
+    assert receipts.reports == [('m1', 'failed')]
+    record = json.loads(dead_letter.read_text(encoding='utf-8'))
+    assert record['source'] == 'timers' and record['key'] == 'm1'
+
+
+def test_fired_timer_reports_delivery(tmp_path):
+    heap = TimerHeap(str(tmp_path / 'scheduled.jsonl'))
+    executor = GuiExecutor(lambda data, properties: True, timers=heap)
+    executor.receipts = receipts = Receipts()
+    heap.defer(notice('m1'), 'm1')
+    make_due(heap, 'm1')
+    executor._fire_due()
+    assert receipts.reports == [('m1', 'delivered')]
+    assert len(heap) == 0
@@ -0,0 +1,76 @@
+import ssl
+from types import SimpleNamespace
+
+import pytest
+
+import fakebroker
+
+
+@pytest.fixture
+def main(monkeypatch):
+    module = fakebroker.install(fakebroker.FakeBroker())
+    import main
+    monkeypatch.setattr(main, 'pika', module)
+    return main
+
+
+def make_consumer(main, **ssl_config):
+    return main.SSLRabbitMQConsumer({'host': 'fake-broker', 'ssl': ssl_config})
+
+
+def test_wrap_socket_offers_remembered_session(main, monkeypatch):
+    offered = []
+
+    def wrap_socket(self, sock, *args, session=None, **kwargs):
+        offered.append(session)
+        return SimpleNamespace(session=f'session-{len(offered)}', session_reused=session is not None)
+
+    monkeypatch.setattr(ssl.SSLContext, 'wrap_socket', wrap_socket)
+    context = main.ResumableSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.wrap_socket(object())
+    assert context.remember_session() is False
+    context.wrap_socket(object())
+    assert context.remember_session() is True
+    assert offered == [None, 'session-1']
+    assert context.resume_session == 'session-2'
+
+
+def test_remember_session_without_handshake(main):
+    context = main.ResumableSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    assert context.remember_session() is False
+    context._last_socket = SimpleNamespace()  # 握手失败的套接字没有会话属性
+    assert context.remember_session() is False
+
+
+def test_each_connection_purpose_has_its_own_context(main):
+    consumer = make_consumer(main)
+    first = consumer._create_ssl_context('consumer')
+    assert isinstance(first, main.ResumableSSLContext)
+    assert consumer._create_ssl_context('consumer') is first
+    assert consumer._create_ssl_context('receipts') is not first
+    parameters = consumer.connection_parameters('receipts')
+    assert parameters.ssl_options.context is consumer._ssl_contexts['receipts']
+
+
+def test_disabled_ssl_connects_in_plain_text(main):
+    consumer = make_consumer(main, enabled=False)
+    assert consumer._create_ssl_context() is None
+    assert consumer.connection_parameters().ssl_options is None
+    connection, resumed = consumer.open_connection()
+    assert connection.is_open and not resumed
+
+
+def test_failed_context_is_not_retried(main):
+    consumer = make_consumer(main, ca_certs='/nonexistent/ca.pem')
+    assert consumer._create_ssl_context() is None
+    assert consumer._ssl_contexts['consumer'] is False
+    assert consumer._create_ssl_context() is None
+
+
+def test_resumed_handshake_is_counted(main, monkeypatch):
+    monkeypatch.setattr(main.ResumableSSLContext, 'remember_session', lambda self: True)
+    consumer = make_consumer(main)
+    before = consumer.metrics['tls_resumed']
+    assert consumer.connect()
+    assert consumer.metrics['tls_resumed'] == before + 1
+    consumer.connection.close()
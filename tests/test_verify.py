@@ -0,0 +1,100 @@
+import threading
+
+import processer
+from driver import HeadlessDriver
+from verify import ChatVerifier, phash
+
+
+class FakeImage:
+    """标题区域截图：pixels 为完整像素，thumbnail 为缩成 9x8 灰度后的像素"""
+
+    def __init__(self, pixels: bytes, thumbnail: bytes):
+        self.pixels = pixels
+        self.thumbnail = thumbnail
+
+    def convert(self, mode):
+        return self
+
+    def resize(self, size):
+        return FakeImage(self.thumbnail, self.thumbnail)
+
+    def tobytes(self):
+        return self.pixels
+
+
+class FakeVerifier(ChatVerifier):
+    def __init__(self, titles, **kwargs):
+        super().__init__(reader=object(), **kwargs)
+        self.titles = titles
+        self.runs = []
+
+    def _ocr(self, image):
+        self.runs.append(image)
+        return self.titles[image.pixels]
+
+
+# 两个群的标题只差一个数字，缩成 9x8 后完全相同
+THUMBNAIL = bytes(range(72))
+HEADER_01 = FakeImage(b'header-01', THUMBNAIL)
+HEADER_02 = FakeImage(b'header-02', THUMBNAIL)
+TITLES = {b'header-01': '拍卖群01', b'header-02': '拍卖群02'}
+
+
+def test_same_dhash_does_not_reuse_other_chat_text():
+    assert phash(HEADER_01) == phash(HEADER_02)
+    verifier = FakeVerifier(TITLES)
+    assert verifier.verify('拍卖群01', HEADER_01)
+    assert not verifier.verify('拍卖群01', HEADER_02)
+    assert len(verifier.runs) == 2
+
+
+def test_exact_cache_hit_skips_ocr():
+    verifier = FakeVerifier(TITLES)
+    assert verifier.verify('拍卖群01', HEADER_01)
+    assert verifier.verify('拍卖群01', HEADER_01)
+    assert len(verifier.runs) == 1
+    assert verifier.metrics['cache_hits'] >= 1
+
+
+def test_near_hit_mismatch_is_recognized_again():
+    verifier = FakeVerifier(TITLES, max_distance=4)
+    assert verifier.verify('拍卖群01', HEADER_01)
+    # 感知哈希相同，缓存给出 拍卖群01，与目标不一致时重新识别
+    assert verifier.verify('拍卖群02', HEADER_02)
+    assert len(verifier.runs) == 2
+    assert verifier.metrics['cache_rechecks'] >= 1
+
+
+def test_cache_is_bounded_under_concurrent_reads():
+    titles = {f'header-{i}'.encode(): f'群{i}' for i in range(64)}
+    verifier = FakeVerifier(titles, cache_size=8)
+
+    def check(offset):
+        for i in range(64):
+            index = (i + offset) % 64
+            image = FakeImage(f'header-{index}'.encode(), bytes([index]) * 72)
+            assert verifier.verify(f'群{index}', image)
+
+    threads = [threading.Thread(target=check, args=(n * 7,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(verifier._cache) <= 8
+
+
+def test_missing_header_area_warns_once(monkeypatch, caplog):
+    component = {'search_area': (10, 10), 'choose_area': (20, 20), 'msg_area': (40, 40)}
+    verifier = FakeVerifier(TITLES)
+    processer.set_driver(HeadlessDriver())
+    processer.set_verifier(verifier)
+    monkeypatch.setattr(processer, '_header_warned', False)
+    try:
+        with caplog.at_level('WARNING', logger='Processer'):
+            processer.open_chat('拍卖群01', component)
+            processer.open_chat('拍卖群02', component)
+    finally:
+        processer.set_verifier(None)
+        processer.set_driver(None)
+    assert len([record for record in caplog.records if 'header_area' in record.getMessage()]) == 1
+    assert verifier.runs == []
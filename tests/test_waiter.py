@@ -0,0 +1,72 @@
+import pytest
+
+import processer
+from driver import HeadlessDriver
+from waiter import NotReady, ReadinessWaiter
+
+
+class FakeScreen:
+    """按模拟时钟返回帧：frames(t) 给出 t 时刻区域的内容"""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.time = 0.0
+
+    def grab(self, region):
+        return self.frames(self.time)
+
+    def sleep(self, seconds):
+        self.time += seconds
+
+
+def make_waiter(screen, **kwargs):
+    return ReadinessWaiter(screen.grab, clock=lambda: screen.time, sleep=screen.sleep, **kwargs)
+
+
+def test_ready_once_region_changes_and_settles():
+    screen = FakeScreen(lambda t: 'after' if t >= 0.1 else 'before')
+    waiter = make_waiter(screen)
+    assert waiter.wait('search', (0, 0, 10, 10), 'before')
+    assert screen.time < 0.3
+    assert waiter.metrics['ready'] == 1
+
+
+def test_flickering_region_times_out_and_require_raises():
+    screen = FakeScreen(lambda t: int(t * 1000))
+    waiter = make_waiter(screen, default_timeout=0.5)
+    assert not waiter.wait('search', (0, 0, 10, 10), 'before')
+    assert waiter.metrics['timeouts'] == 1
+    with pytest.raises(NotReady):
+        waiter.require('search', (0, 0, 10, 10), 'before')
+
+
+def test_unchanged_region_not_released_before_settle():
+    screen = FakeScreen(lambda t: 'same')
+    waiter = make_waiter(screen, settle=0.5)
+    # 历史上该步很快，无变化时也不能早于原固定等待放行
+    for _ in range(10):
+        waiter._record('select', 0.05)
+    assert waiter.wait('select', (0, 0, 10, 10), 'same')
+    assert screen.time >= 0.5
+    assert waiter.metrics['unchanged'] == 1
+
+
+def test_open_chat_takes_search_baseline_after_clear():
+    driver = HeadlessDriver()
+    waiter = ReadinessWaiter(driver.screenshot, clock=driver.now, sleep=driver.sleep)
+    processer.set_driver(driver)
+    original = processer.waiter
+    processer.waiter = waiter
+    try:
+        component = {'search_area': (10, 10), 'choose_area': (20, 20), 'header_area': (30, 30)}
+        processer.open_chat('拍卖群01', component)
+    finally:
+        processer.waiter = original
+        processer.set_driver(None)
+    names = [name for _, name, _ in driver.actions if name != 'screenshot']
+    assert names == ['click', 'hotkey', 'press', 'paste', 'click']
+    # 粘贴群名前清空的渲染已经落定
+    paste_at = next(at for at, name, _ in driver.actions if name == 'paste')
+    press_at = next(at for at, name, _ in driver.actions if name == 'press')
+    assert paste_at >= press_at + driver.latency['press'] + driver.latency['render']
+    assert waiter.metrics['timeouts'] == 0
@@ -0,0 +1,99 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import fakebroker
+from workers import StageWorkerPool
+
+QUEUE = 'test.autoscale'
+
+
+def wait_until(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_pool_resizes_within_bounds():
+    pool = StageWorkerPool(min_workers=2, max_workers=4)
+    pool.start()
+    assert pool.resize(10) == 4
+    assert wait_until(lambda: len(pool.threads) == 4)
+    assert pool.resize(0) == 2
+    assert wait_until(lambda: len(pool.threads) == 2)
+    pool.stop()
+    assert pool.threads == []
+
+
+def test_queued_tasks_run_before_retire_and_errors_are_counted():
+    pool = StageWorkerPool(min_workers=1, max_workers=1)
+    gate = threading.Event()
+    done = []
+    pool.start()
+    pool.submit(gate.wait)
+    for i in range(3):
+        pool.submit(done.append, i)
+    pool.submit(lambda: 1 / 0)
+    assert pool.pending() >= 3
+    gate.set()
+    pool.stop()
+    assert done == [0, 1, 2]
+    assert pool.metrics['completed'] == 5
+    assert pool.metrics['errors'] == 1
+
+
+@pytest.fixture
+def broker():
+    return fakebroker.FakeBroker()
+
+
+@pytest.fixture
+def consumer(broker, monkeypatch):
+    module = fakebroker.install(broker)
+    import main
+    monkeypatch.setattr(main, 'pika', module)
+    consumer = main.SSLRabbitMQConsumer({
+        'host': 'fake-broker',
+        'ssl': {'enabled': False},
+        'listener': {'concurrency': 1, 'max_concurrency': 4, 'prefetch_count': 1, 'scale_step': 10}
+    })
+    assert consumer.connect()
+    broker.declare(QUEUE)
+    consumer.queue_name = QUEUE
+    consumer._io_thread = threading.get_ident()
+    consumer._consuming = True
+    consumer._scale_to(1)
+    yield consumer
+    consumer._consuming = False
+    consumer.connection.close()
+
+
+def backlog(broker, consumer, depth, local=0):
+    for _ in range(depth):
+        broker.publish(QUEUE, b'{}')
+    consumer.executor = SimpleNamespace(backlog=lambda: local)
+
+
+def test_autoscale_adds_channels_with_queue_depth(broker, consumer):
+    backlog(broker, consumer, 25)
+    consumer._autoscale()
+    assert consumer.active_consumers == 4  # 1 + ceil(25 / 10)
+    assert len(consumer.consumer_tags) == 4
+
+
+def test_autoscale_shrinks_one_step_at_a_time(broker, consumer):
+    consumer._scale_to(4)
+    backlog(broker, consumer, 0)
+    consumer._autoscale()
+    assert consumer.active_consumers == 3
+    assert len(consumer.channels) == 4  # 缩容只取消消费者，不关闭通道
+    assert len(consumer.consumer_tags) == 3
+
+
+def test_autoscale_holds_when_gui_backlog_is_high(broker, consumer):
+    backlog(broker, consumer, 50, local=consumer.default_config['executor']['high_water'])
+    consumer._autoscale()
+    assert consumer.active_consumers == 1
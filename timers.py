@@ -0,0 +1,190 @@
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from model import Notice, is_expired
+
+logger = logging.getLogger("Timers")
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scheduled.jsonl')
+
+
+class TimerHeap:
+    """
+    定时发送的最小堆，持久化为追加式 JSONL(add/done 记录)
+    未到 sendAt 的消息落盘后即可确认，到期时由 GUI 线程取出与实时消息合并处理；
+    入堆/出堆均为 O(log n)，重启后从文件恢复；发送失败 max_attempts 次后转入死信文件
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, retry_delay: float = 60,
+                 lead_time: float = 0.5, max_attempts: int = 5, dead_letter: Optional[str] = None):
+        self.path = path
+        self.retry_delay = retry_delay
+        self.lead_time = lead_time  # sendAt 距现在不足该值时直接按实时消息处理
+        self.max_attempts = max_attempts
+        self.dead_letter_path = dead_letter
+        self.heap: List[Tuple[float, int, str]] = []
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._seq = 0
+        self._lines = 0
+        self._lock = threading.Lock()
+
+        # 统计
+        self.metrics = {
+            'scheduled': 0,
+            'fired': 0,
+            'expired': 0,
+            'rescheduled': 0,
+            'duplicates': 0,
+            'dead_lettered': 0
+        }
+
+        self._load()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                self._lines += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('op') == 'add':
+                    self.entries[record['id']] = record
+                elif record.get('op') == 'done':
+                    self.entries.pop(record['id'], None)
+        for key, record in self.entries.items():
+            self._push(record['sendAt'], key)
+        logger.info(f"已加载定时消息: {len(self.entries)} 条")
+
+    def _push(self, send_at: float, key: str):
+        self._seq += 1
+        heapq.heappush(self.heap, (send_at, self._seq, key))
+
+    def _append(self, record: Dict[str, Any], sync: bool):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+        self._lines += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+    def defer(self, notice: Notice, key: str, properties=None) -> bool:
+        """
+        sendAt 在将来则持久化入堆并返回True(调用方随后确认原投递)；回执路由信息随记录保存
+        同键同 sendAt 的消息已在堆中(重投递的副本)时不再入堆，避免到期后发送两次
+        """
+        send_at = notice.send_at
+        if send_at is None or send_at - time.time() <= self.lead_time:
+            return False
+        record = {'op': 'add', 'id': key, 'sendAt': send_at, 'requested': send_at, 'data': notice.to_dict(),
+                  'attempts': 0, 'reply_to': getattr(properties, 'reply_to', None),
+                  'correlation_id': getattr(properties, 'correlation_id', None)}
+        with self._lock:
+            existing = self.entries.get(key)
+            if existing is not None and existing.get('requested', existing['sendAt']) == send_at:
+                self.metrics['duplicates'] += 1
+                logger.info(f"定时消息已在计划中，忽略重复投递: {key}")
+                return True
+            self._append(record, sync=True)
+            self.entries[key] = record
+            self._push(send_at, key)
+        self.metrics['scheduled'] += 1
+        logger.info(f"⏰ 定时消息已保存: {key} @ {datetime.fromtimestamp(send_at):%Y-%m-%d %H:%M:%S}")
+        return True
+
+    def next_due_in(self) -> Optional[float]:
+        """距最近一条到期还有多少秒，堆为空返回None"""
+        with self._lock:
+            while self.heap:
+                send_at, _, key = self.heap[0]
+                record = self.entries.get(key)
+                if record is None or record['sendAt'] != send_at:
+                    heapq.heappop(self.heap)  # 已完成或已改期的旧条目
+                    continue
+                return max(0.0, send_at - time.time())
+        return None
+
+    def pop_due(self) -> Optional[Tuple[str, Notice, Any]]:
+        """取出一条到期消息: (key, notice, properties)；已过期的也会返回，由调用方 expire"""
+        due_in = self.next_due_in()
+        if due_in is None or due_in > 0:
+            return None
+        with self._lock:
+            _, _, key = heapq.heappop(self.heap)
+            record = self.entries[key]
+        properties = SimpleNamespace(message_id=key, headers=None, priority=None, timestamp=None,
+                                     reply_to=record.get('reply_to'),
+                                     correlation_id=record.get('correlation_id'))
+        return key, Notice.from_dict(record['data'], properties), properties
+
+    def expire(self, key: str):
+        """到期时已过 expireAt，丢弃"""
+        logger.warning(f"定时消息已过期，丢弃: {key}")
+        self.metrics['expired'] += 1
+        self.complete(key)
+
+    def complete(self, key: str):
+        """发送完成，删除记录"""
+        with self._lock:
+            if self.entries.pop(key, None) is None:
+                return
+            self._append({'op': 'done', 'id': key}, sync=False)
+            if self._lines > 2 * len(self.entries) + 1000:
+                self._compact()
+
+    def reschedule(self, key: str) -> bool:
+        """发送失败，延后 retry_delay 秒重试；已失败 max_attempts 次时转入死信并返回False"""
+        with self._lock:
+            record = self.entries.get(key)
+            if record is None:
+                return False
+            attempts = record.get('attempts', 0) + 1
+            if attempts < self.max_attempts:
+                record = dict(record, sendAt=time.time() + self.retry_delay, attempts=attempts)
+                self._append(record, sync=True)
+                self.entries[key] = record
+                self._push(record['sendAt'], key)
+                self.metrics['rescheduled'] += 1
+                return True
+        self._dead_letter(record, f'定时发送重试{attempts}次后仍失败')
+        self.complete(key)
+        return False
+
+    def _dead_letter(self, record: Dict[str, Any], reason: str):
+        """追加写入死信文件(与本地输入的死信格式相同)，便于人工处理后重新投递"""
+        self.metrics['dead_lettered'] += 1
+        logger.error(f"定时消息转入死信: {record['id']} ({reason})")
+        if not self.dead_letter_path:
+            return
+        line = json.dumps({'at': time.strftime('%Y-%m-%d %H:%M:%S'), 'source': 'timers', 'reason': reason,
+                           'key': record['id'], 'notice': record['data']}, ensure_ascii=False, default=str)
+        with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+    def _compact(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in self.entries.values():
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._lines = len(self.entries)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,206 @@
+import difflib
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from lazy import is_available, lazy_import
+from metrics import registry
+
+numpy = lazy_import('numpy')
+easyocr = lazy_import('easyocr')
+
+logger = logging.getLogger("Verifier")
+
+# 聊天标题中与群名无关的部分：成员数 "(23)"、外部群标记 "@微信" 等
+_TITLE_NOISE = re.compile(r'[\(（]\d+[\)）]$|@\S+$')
+_SPACES = re.compile(r'\s+')
+_DIGITS = re.compile(r'\d+')
+
+
+class ChatMismatch(RuntimeError):
+    """打开的聊天不是目标群，放弃本次发送"""
+
+
+def phash(image) -> int:
+    """
+    区域图像的感知哈希(dHash, 64位)：缩成 9x8 灰度图，逐行比较相邻像素亮度
+    同一标题的轻微渲染差异(光标闪烁、抗锯齿)哈希距离很小
+    """
+    pixels = image.convert('L').resize((9, 8)).tobytes()
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def digest(image) -> bytes:
+    """区域图像像素的精确摘要，作为识别缓存的键；标题只差一个数字时 dHash 可能相同，摘要不会"""
+    return hashlib.blake2b(image.tobytes(), digest_size=16).digest()
+
+
+def normalize_title(text: str) -> str:
+    """去掉空白和成员数等后缀，便于与群名比较"""
+    text = _SPACES.sub('', text or '')
+    return _TITLE_NOISE.sub('', text)
+
+
+def similarity(title: str, group: str) -> float:
+    """
+    标题与群名的相似度(0~1)，标题包含完整群名时视为1
+    编号不同的群(如 拍卖群01/拍卖群02)只差一个字符，数字部分必须完全一致，否则视为0
+    """
+    title, group = normalize_title(title), normalize_title(group)
+    if not title or not group:
+        return 0.0
+    if group in title:
+        return 1.0
+    if _DIGITS.findall(title) != _DIGITS.findall(group):
+        return 0.0
+    return difflib.SequenceMatcher(None, title, group).ratio()
+
+
+class ChatVerifier:
+    """
+    发送前的聊天标题校验
+    选中搜索结果后只截取聊天标题小区域做 OCR，与目标群名模糊匹配，不一致则不粘贴；
+    OCR 模型延迟加载并常驻，识别结果按区域像素摘要缓存，同一标题重复校验不再推理；
+    max_distance > 0 时感知哈希相近的区域也复用缓存，但相近的标题可能是另一个群，
+    缓存结果与目标群不一致时会重新识别一次，默认只做精确匹配；
+    标题区域单行文字，只做识别不做文字检测，CPU 推理控制在每次校验的耗时预算内
+    """
+
+    def __init__(self, languages: Iterable[str] = ('ch_sim', 'en'), threshold: float = 0.8,
+                 budget: float = 0.3, cache_size: int = 256, max_distance: int = 0,
+                 gpu: bool = False, reader=None):
+        self.languages = list(languages)
+        self.threshold = threshold
+        self.budget = budget
+        self.cache_size = cache_size
+        self.max_distance = max_distance
+        self.gpu = gpu
+        self._reader = reader
+        self._lock = threading.Lock()
+        # 多个桌面的发送线程共用同一个校验器
+        self._cache_lock = threading.Lock()
+        self._cache: 'OrderedDict[bytes, Tuple[int, str]]' = OrderedDict()
+
+        # 统计
+        self.metrics = registry.state('verify', {
+            'checks': 0,
+            'matched': 0,
+            'mismatched': 0,
+            'cache_hits': 0,
+            'cache_rechecks': 0,
+            'ocr_runs': 0,
+            'over_budget': 0
+        })
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'ChatVerifier':
+        return cls(languages=config.get('languages', ('ch_sim', 'en')),
+                   threshold=config.get('threshold', 0.8),
+                   budget=config.get('budget', 0.3),
+                   cache_size=config.get('cache_size', 256),
+                   max_distance=config.get('max_distance', 0),
+                   gpu=config.get('gpu', False))
+
+    @staticmethod
+    def available() -> bool:
+        """OCR 依赖是否已安装"""
+        return is_available('easyocr') and is_available('numpy')
+
+    def reader(self):
+        """OCR 模型，首次使用时加载并常驻"""
+        if self._reader is None:
+            with self._lock:
+                if self._reader is None:
+                    start = time.perf_counter()
+                    self._reader = easyocr.Reader(self.languages, gpu=self.gpu, verbose=False)
+                    logger.info(f"OCR 模型已加载，耗时 {time.perf_counter() - start:.1f}秒")
+        return self._reader
+
+    def warm(self) -> threading.Thread:
+        """后台加载模型并做一次推理预热，避免首个校验承担加载耗时"""
+        def _warm():
+            try:
+                self._recognize(numpy.zeros((32, 160, 3), dtype=numpy.uint8))
+            except Exception as e:
+                logger.error(f"OCR 预热失败: {e}")
+
+        thread = threading.Thread(target=_warm, name="OCR-Warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def _recognize(self, array) -> str:
+        """整块区域作为一行文字识别，跳过文字检测阶段"""
+        height, width = array.shape[:2]
+        texts = self.reader().recognize(array, horizontal_list=[[0, width, 0, height]],
+                                        free_list=[], detail=0)
+        return ''.join(texts)
+
+    def _ocr(self, image) -> str:
+        return self._recognize(numpy.asarray(image.convert('RGB')))
+
+    def _lookup(self, key: bytes, hashed: Optional[int]) -> Optional[str]:
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+                return entry[1]
+            if hashed is None:
+                return None
+            for cached, text in self._cache.values():
+                if bin(cached ^ hashed).count('1') <= self.max_distance:
+                    return text
+        return None
+
+    def _store(self, key: bytes, hashed: Optional[int], text: str):
+        with self._cache_lock:
+            self._cache[key] = (hashed or 0, text)
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def read(self, image, cached: bool = True) -> Tuple[str, bool]:
+        """识别标题区域文字，返回 (文字, 是否来自缓存)；cached=False 时跳过缓存重新识别"""
+        key = digest(image)
+        hashed = phash(image) if self.max_distance > 0 else None
+        if cached:
+            text = self._lookup(key, hashed)
+            if text is not None:
+                self.metrics['cache_hits'] += 1
+                return text, True
+
+        start = time.perf_counter()
+        text = self._ocr(image)
+        elapsed = time.perf_counter() - start
+        registry.observe('ocr', elapsed)
+        self.metrics['ocr_runs'] += 1
+        if elapsed > self.budget:
+            self.metrics['over_budget'] += 1
+            logger.warning(f"OCR 耗时 {elapsed:.3f}秒，超出预算 {self.budget}秒")
+
+        self._store(key, hashed, text)
+        return text, False
+
+    def verify(self, group: str, image) -> bool:
+        """标题区域是否为目标群，缓存的识别结果不一致时重新识别确认"""
+        self.metrics['checks'] += 1
+        title, hit = self.read(image)
+        score = similarity(title, group)
+        if score < self.threshold and hit:
+            self.metrics['cache_rechecks'] += 1
+            title, _ = self.read(image, cached=False)
+            score = similarity(title, group)
+        if score >= self.threshold:
+            self.metrics['matched'] += 1
+            return True
+        self.metrics['mismatched'] += 1
+        logger.warning(f"聊天标题与目标群不一致: 识别为 {title!r}，目标 {group!r} (相似度 {score:.2f})")
+        return False
@@ -0,0 +1,154 @@
+import hashlib
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger("Waiter")
+
+Region = Tuple[int, int, int, int]  # (left, top, width, height)
+
+
+def region_around(point, width: int, height: int) -> Region:
+    """以坐标点为中心的矩形区域"""
+    return int(point[0] - width / 2), int(point[1] - height / 2), width, height
+
+
+class NotReady(TimeoutError):
+    """界面在超时内没有就绪，放弃本次操作"""
+
+
+class ReadinessWaiter:
+    """
+    就绪驱动的等待引擎
+    每一步操作后轮询一小块屏幕区域，区域变化并稳定即视为就绪，立即执行下一步；
+    区域始终未变化时不早于原固定等待(settle)放行，该步历来更慢时等到其 p95；
+    按步骤记录耗时分位数，超时随之自适应。
+    grab(region) 返回可比较的帧数据，测试时可替换为假屏幕源
+    """
+
+    def __init__(self, grab: Callable[[Region], Any],
+                 poll_interval: float = 0.03,
+                 stable_frames: int = 2,
+                 default_timeout: float = 2.0,
+                 min_timeout: float = 0.3,
+                 max_timeout: float = 5.0,
+                 settle: float = 0.5,  # 原固定等待时长
+                 fallback_delay: float = 0.5,
+                 history: int = 100,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.grab = grab
+        self.poll_interval = poll_interval
+        self.stable_frames = stable_frames
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.settle = settle
+        self.fallback_delay = fallback_delay
+        self.history = history
+        self.clock = clock
+        self.sleep = sleep
+        self.latencies: Dict[str, deque] = {}
+
+        # 统计
+        self.metrics = {
+            'waits': 0,
+            'ready': 0,
+            'unchanged': 0,
+            'timeouts': 0,
+            'fallbacks': 0
+        }
+
+    def snapshot(self, region: Optional[Region]):
+        """截取区域帧，区域为空时返回None"""
+        if region is None:
+            return None
+        frame = self.grab(region)
+        if isinstance(frame, (bytes, bytearray)):
+            return hashlib.md5(frame).digest()
+        if hasattr(frame, 'tobytes'):
+            return hashlib.md5(frame.tobytes()).digest()
+        return frame
+
+    def percentile(self, step: str, q: float) -> Optional[float]:
+        """步骤耗时的分位数，样本不足时返回None"""
+        samples = self.latencies.get(step)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def timeout_for(self, step: str) -> float:
+        """根据历史 p95 自适应的超时"""
+        samples = self.latencies.get(step)
+        if not samples or len(samples) < 5:
+            return self.default_timeout
+        return min(self.max_timeout, max(self.min_timeout, self.percentile(step, 95) * 2))
+
+    def settle_for(self, step: str) -> float:
+        """区域一直无变化时的放行时间：不早于 settle，该步通常更慢时等到历史 p95"""
+        p95 = self.percentile(step, 95)
+        return self.settle if p95 is None else min(self.max_timeout, max(self.settle, p95))
+
+    def _record(self, step: str, latency: float):
+        samples = self.latencies.get(step)
+        if samples is None:
+            samples = self.latencies[step] = deque(maxlen=self.history)
+        samples.append(latency)
+
+    def wait(self, step: str, region: Optional[Region], baseline=None) -> bool:
+        """等待区域相对 baseline 变化并稳定，超时返回False"""
+        self.metrics['waits'] += 1
+        if region is None:
+            # 未配置检测区域，退回固定等待
+            self.metrics['fallbacks'] += 1
+            self.sleep(self.fallback_delay)
+            return True
+
+        start = self.clock()
+        settle = self.settle_for(step)
+        timeout = max(self.timeout_for(step), settle)
+        changed = False
+        previous = None
+        stable = 0
+
+        while True:
+            frame = self.snapshot(region)
+            elapsed = self.clock() - start
+            if not changed and frame != baseline:
+                changed = True
+            if changed:
+                stable = stable + 1 if frame == previous else 1
+                if stable >= self.stable_frames:
+                    self._record(step, elapsed)
+                    self.metrics['ready'] += 1
+                    return True
+            elif elapsed >= settle:
+                self.metrics['unchanged'] += 1
+                return True
+            if elapsed >= timeout:
+                logger.warning(f"等待超时: {step} ({timeout:.2f}秒)")
+                self.metrics['timeouts'] += 1
+                return False
+            previous = frame
+            self.sleep(self.poll_interval)
+
+    def require(self, step: str, region: Optional[Region], baseline=None):
+        """同 wait，超时抛出 NotReady"""
+        if not self.wait(step, region, baseline):
+            raise NotReady(f"界面未就绪: {step}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取等待统计和各步骤耗时分位数"""
+        metrics = self.metrics.copy()
+        metrics['steps'] = {
+            step: {
+                'p50': self.percentile(step, 50),
+                'p95': self.percentile(step, 95),
+                'timeout': self.timeout_for(step)
+            }
+            for step in self.latencies
+        }
+        return metrics
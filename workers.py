@@ -0,0 +1,93 @@
+import itertools
+import logging
+import queue
+import threading
+from typing import Callable
+
+logger = logging.getLogger("StageWorkers")
+
+_RETIRE = object()
+
+
+class StageWorkerPool:
+    """
+    GUI 之前各阶段(解码、校验、去重、定时判断、入队)的线程池
+    线程数在 min_workers 与 max_workers 之间伸缩，缩容时在已排队任务之后退出；
+    任务不直接操作通道，确认一律切回连接线程执行
+    """
+
+    def __init__(self, min_workers: int = 1, max_workers: int = 10, name: str = 'Stage-Worker'):
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.name = name
+        self.queue: queue.Queue = queue.Queue()
+        self.size = 0  # 目标线程数
+        self.threads = []
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+
+        # 统计
+        self.metrics = {
+            'submitted': 0,
+            'completed': 0,
+            'errors': 0,
+            'workers': 0
+        }
+
+    def start(self):
+        """按下限启动线程"""
+        self.resize(self.min_workers)
+
+    def resize(self, workers: int) -> int:
+        """调整线程数，返回调整后的目标值"""
+        workers = min(self.max_workers, max(self.min_workers, workers))
+        with self._lock:
+            delta = workers - self.size
+            self.size = workers
+            for _ in range(delta):
+                thread = threading.Thread(target=self._run, name=f"{self.name}-{next(self._seq)}", daemon=True)
+                self.threads.append(thread)
+                thread.start()
+            for _ in range(-delta):
+                self.queue.put(_RETIRE)
+            self.metrics['workers'] = workers
+        if delta:
+            logger.info(f"阶段线程数调整为 {workers}")
+        return workers
+
+    def pending(self) -> int:
+        """排队中的任务数"""
+        return self.queue.qsize()
+
+    def submit(self, fn: Callable, *args):
+        """提交任务，队列长度由各通道预取数约束"""
+        self.metrics['submitted'] += 1
+        self.queue.put((fn, args))
+
+    def stop(self, timeout: float = 5):
+        """处理完已排队任务后停止所有线程"""
+        with self._lock:
+            for _ in range(self.size):
+                self.queue.put(_RETIRE)
+            self.size = 0
+            threads, self.threads = self.threads, []
+        for thread in threads:
+            thread.join(timeout=timeout)
+        logger.info("阶段线程池已停止")
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _RETIRE:
+                break
+            fn, args = item
+            try:
+                fn(*args)
+            except Exception as e:
+                self.metrics['errors'] += 1
+                logger.error(f"阶段任务异常: {e}")
+            self.metrics['completed'] += 1
+        with self._lock:
+            current = threading.current_thread()
+            if current in self.threads:
+                self.threads.remove(current)